@@ -21,23 +21,47 @@ Watchlist file format (one ticker per line, # for comments):
 """
 
 import argparse
+import gzip
+import hashlib
 import json
 import os
 import re
+import shutil
 import sys
-import time
-import webbrowser
 import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from functools import partial
-from http.server import HTTPServer, BaseHTTPRequestHandler, ThreadingHTTPServer
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 from urllib.parse import urlparse, parse_qs
-from dataclasses import dataclass, field, asdict
+from dataclasses import dataclass, asdict
 from typing import Optional
 
+import lxml.html
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import requests_cache
+except ImportError:
+    requests_cache = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Charts only; yfinance (and pandas with it) stays lazy so terminal runs don't pay for it
+try:
+    import plotly
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+except ImportError:
+    plotly = go = make_subplots = None
 
 
 # ─── Constants ────────────────────────────────────────────────────────────────
@@ -51,6 +75,40 @@ HEADERS = {
     )
 }
 
+# Indexed by data["is_consolidated"]
+_CONS_LABEL = ("Standalone", "Consolidated")
+
+# Patterns used on every fetch / peer row, compiled once
+_RE_COMPANY_ID = re.compile(rb'/api/company/(\d+)/')
+_RE_PEER_TICKER = re.compile(r'/company/([^/]+)/')
+_RE_TICKER_SYMBOL = re.compile(r'^[A-Z0-9&]+$')
+_RE_NON_ALNUM = re.compile(r'[^a-z0-9]')
+_RE_NON_FILENAME = re.compile(r'[^\w.&-]')
+
+# Max simultaneous HTTP requests to screener.in across all worker threads
+MAX_CONCURRENT_FETCHES = 4
+_FETCH_SLOTS = threading.BoundedSemaphore(MAX_CONCURRENT_FETCHES)
+
+# Fundamentals only change quarterly, so re-runs within this window hit the disk cache
+CACHE_PATH = str(Path(__file__).parent / "screener_cache.sqlite")
+CACHE_EXPIRY_SECS = 6 * 3600
+
+# One keep-alive pool shared by every fetch; retries 429/5xx honouring Retry-After
+if requests_cache is not None:
+    _SESSION = requests_cache.CachedSession(
+        CACHE_PATH, expire_after=CACHE_EXPIRY_SECS,
+        allowable_codes=(200,), stale_if_error=True,
+    )
+else:
+    _SESSION = requests.Session()
+_SESSION.headers.update(HEADERS)
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16, pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=1.5, raise_on_status=False,
+                      status_forcelist=[429, 502, 503, 504],
+                      respect_retry_after_header=True),
+))
+
 # ─── Color codes for terminal ────────────────────────────────────────────────
 
 class C:
@@ -74,34 +132,37 @@ class C:
 
 # ─── Number Formatting ──────────────────────────────────────────────────────
 
+_NUMBER_BLANKS = frozenset(("", "-", "—", "N/A"))
+
+
 def parse_number(text: str) -> float:
     """Parse Indian number format: '1,23,456' -> 123456.0"""
-    if not text or text.strip() in ("", "-", "—", "N/A"):
+    if not text:
+        return 0.0
+    text = text.strip()
+    if text in _NUMBER_BLANKS:
         return 0.0
-    text = text.strip().replace(",", "").replace("%", "").replace("₹", "")
     try:
-        return float(text)
+        return float(text.replace(",", "").replace("%", "").replace("₹", ""))
     except ValueError:
         return 0.0
 
 
+# Reports and panes format the same handful of figures repeatedly (revenue, profit, equity...)
+@lru_cache(maxsize=4096)
 def fmt_indian(value: float) -> str:
     """Format number with Indian comma system."""
-    s = f"{int(abs(value)):,}"
-    parts = s.split(",")
-    if len(parts) <= 2:
-        return s
-    last = parts[-1]
-    mid_num = "".join(parts[:-1])
-    indian_parts = []
-    while len(mid_num) > 2:
-        indian_parts.insert(0, mid_num[-2:])
-        mid_num = mid_num[:-2]
-    if mid_num:
-        indian_parts.insert(0, mid_num)
-    return ",".join(indian_parts) + "," + last
+    digits = str(int(abs(value)))
+    if len(digits) <= 3:
+        return digits
+    head, tail = digits[:-3], digits[-3:]
+    lead = len(head) % 2
+    groups = [head[:lead]] if lead else []
+    groups.extend(head[i:i + 2] for i in range(lead, len(head), 2))
+    return ",".join(groups) + "," + tail
 
 
+@lru_cache(maxsize=4096)
 def fmt_cr(value: float) -> str:
     """Format value in Crores with Indian notation."""
     abs_val = abs(value)
@@ -148,6 +209,18 @@ TICKER_MAP = {
     "LTIM": "MINDTREE",
 }
 
+def _http_get(url: str, headers: dict = None, timeout: int = 30) -> requests.Response:
+    """GET a URL on the shared session while holding a screener.in request slot."""
+    with _FETCH_SLOTS:
+        return _SESSION.get(url, headers=headers, timeout=timeout)
+
+
+def _parse_html(resp: requests.Response) -> lxml.html.HtmlElement:
+    """Build an lxml tree straight from the response bytes, skipping the str decode."""
+    parser = lxml.html.HTMLParser(encoding=resp.encoding or "utf-8")
+    return lxml.html.fromstring(resp.content, parser=parser)
+
+
 def fetch_full_company_data(ticker: str, consolidated: bool = True) -> dict:
     """
     Master fetch: scrape ALL available data from screener.in for a company.
@@ -157,41 +230,41 @@ def fetch_full_company_data(ticker: str, consolidated: bool = True) -> dict:
     suffix = "consolidated/" if consolidated else ""
     url = f"{SCREENER_BASE}/{screener_ticker}/{suffix}"
 
-    import time as _time
-    for attempt in range(3):
-        resp = requests.get(url, headers=HEADERS, timeout=30)
-        if resp.status_code == 429:
-            wait = 3 * (attempt + 1)
-            print(f"   ⏳ Rate-limited, retrying in {wait}s...")
-            _time.sleep(wait)
-            continue
-        break
+    resp = _http_get(url)
 
     if resp.status_code == 404:
         url = f"{SCREENER_BASE}/{ticker.upper()}/"
-        resp = requests.get(url, headers=HEADERS, timeout=30)
+        resp = _http_get(url)
 
     if resp.status_code != 200:
         raise ValueError(f"Failed to fetch data for {ticker}: HTTP {resp.status_code}")
 
-    soup = BeautifulSoup(resp.text, "html.parser")
+    # One lxml tree serves every section parser below
+    tree = _parse_html(resp)
 
     # If consolidated has no data, fall back
     if consolidated and suffix:
-        test_pl = _parse_table_section(soup, "profit-loss")
-        if not test_pl.get("periods"):
+        if not _has_periods(tree, "profit-loss"):
             url = f"{SCREENER_BASE}/{ticker.upper()}/"
-            resp = requests.get(url, headers=HEADERS, timeout=30)
+            resp = _http_get(url)
             if resp.status_code == 200:
-                soup = BeautifulSoup(resp.text, "html.parser")
+                tree = _parse_html(resp)
 
     company_name = ""
-    h1 = soup.find("h1")
-    if h1:
-        company_name = h1.get_text(strip=True)
+    h1 = _first(tree, "//h1")
+    if h1 is not None:
+        company_name = _text(h1)
 
     is_consolidated = "consolidated" in resp.url
-    company_id = _extract_company_id(resp.text)
+    company_id = _extract_company_id(resp.content)
+
+    # Segment names and expense split come from two independent API calls
+    segments, expense_breakdown = [], {}
+    if company_id:
+        with ThreadPoolExecutor(max_workers=2) as ex:
+            seg_future = ex.submit(_fetch_segments, company_id, is_consolidated)
+            exp_future = ex.submit(_fetch_expense_breakdown, company_id, is_consolidated)
+            segments, expense_breakdown = seg_future.result(), exp_future.result()
 
     return {
         "ticker": ticker.upper(),
@@ -200,108 +273,148 @@ def fetch_full_company_data(ticker: str, consolidated: bool = True) -> dict:
         "company_id": company_id,
         "url": resp.url,
         "fetched_at": datetime.now().isoformat(),
-        "about": _parse_about(soup),
-        "top_ratios": _parse_top_ratios(soup),
-        "pros_cons": _parse_pros_cons(soup),
-        "compounded_growth": _parse_compounded_growth(soup),
-        "profit_loss": _parse_table_section(soup, "profit-loss"),
-        "quarterly": _parse_table_section(soup, "quarters"),
-        "balance_sheet": _parse_table_section(soup, "balance-sheet"),
-        "cash_flow": _parse_table_section(soup, "cash-flow"),
-        "ratios": _parse_table_section(soup, "ratios"),
-        "shareholding": _parse_shareholding(soup),
-        "peers": _parse_peers(soup),
-        "documents": _parse_documents(soup),
-        "segments": _fetch_segments(company_id, is_consolidated) if company_id else [],
-        "expense_breakdown": _fetch_expense_breakdown(company_id, is_consolidated) if company_id else {},
+        "about": _parse_about(tree),
+        "top_ratios": _parse_top_ratios(tree),
+        "pros_cons": _parse_pros_cons(tree),
+        "compounded_growth": _parse_compounded_growth(tree),
+        "profit_loss": _parse_table_section(tree, "profit-loss"),
+        "quarterly": _parse_table_section(tree, "quarters"),
+        "balance_sheet": _parse_table_section(tree, "balance-sheet"),
+        "cash_flow": _parse_table_section(tree, "cash-flow"),
+        "ratios": _parse_table_section(tree, "ratios"),
+        "shareholding": _parse_shareholding(tree),
+        "peers": _parse_peers(tree),
+        "documents": _parse_documents(tree),
+        "segments": segments,
+        "expense_breakdown": expense_breakdown,
     }
 
 
-def _extract_company_id(html: str) -> str:
-    m = re.search(r'/api/company/(\d+)/', html)
-    return m.group(1) if m else ""
+def fetch_many(tickers: list, consolidated: bool = True, max_workers: int = 4) -> dict:
+    """
+    Fetch several companies concurrently.
+    Returns {ticker: data dict or Exception} so one bad ticker doesn't sink the batch.
+    """
+    results = {}
+    if not tickers:
+        return results
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tickers)))) as ex:
+        futures = {ex.submit(fetch_full_company_data, t, consolidated): t for t in tickers}
+        for done, fut in enumerate(as_completed(futures), 1):
+            t = futures[fut]
+            try:
+                results[t] = fut.result()
+            except Exception as e:
+                results[t] = e
+            print(f"{C.GREY}   [{done}/{len(tickers)}] {t}{C.RESET}")
+    return results
+
+
+def _extract_company_id(html: bytes) -> str:
+    m = _RE_COMPANY_ID.search(html)
+    return m.group(1).decode() if m else ""
+
+
+def _has_class(name: str) -> str:
+    """XPath predicate matching an element whose class list contains `name`."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
 
+def _text(el) -> str:
+    """Stripped text of an element (same result as BeautifulSoup's get_text(strip=True))."""
+    return "".join(t.strip() for t in el.xpath(".//text()"))
 
-def _parse_about(soup: BeautifulSoup) -> str:
+
+def _first(el, path: str):
+    """First XPath match under `el`, or None."""
+    found = el.xpath(path)
+    return found[0] if found else None
+
+
+def _parse_about(tree: lxml.html.HtmlElement) -> str:
     """Extract company description."""
-    about = soup.find("div", class_="about")
-    if about:
+    about = _first(tree, f"//div[{_has_class('about')}]")
+    if about is not None:
         # Find the main text paragraph (before the Key Points section)
-        for p in about.find_all(["p", "div"]):
-            text = p.get_text(strip=True)
+        for p in about.xpath(".//p | .//div"):
+            text = _text(p)
             if len(text) > 40 and "Key Points" not in text and "Market Cap" not in text:
                 return text
     return ""
 
 
-def _parse_top_ratios(soup: BeautifulSoup) -> dict:
+def _parse_top_ratios(tree: lxml.html.HtmlElement) -> dict:
     """Parse the key ratios from the top card."""
     ratios = {}
     # Method 1: company-ratios list
-    for li in soup.select(".company-ratios li"):
-        name_span = li.find("span", class_="name")
-        if not name_span:
-            spans = li.find_all("span")
-            name = spans[0].get_text(strip=True) if spans else ""
+    for li in tree.xpath(f"//*[{_has_class('company-ratios')}]//li"):
+        name_span = _first(li, f".//span[{_has_class('name')}]")
+        if name_span is None:
+            spans = li.xpath(".//span")
+            name = _text(spans[0]) if spans else ""
         else:
-            name = name_span.get_text(strip=True)
+            name = _text(name_span)
         if not name:
             continue
         # Get ALL number spans (e.g., High/Low has two)
-        number_spans = li.find_all("span", class_="number")
+        number_spans = li.xpath(f".//span[{_has_class('number')}]")
         if number_spans:
-            val = "/".join(s.get_text(strip=True) for s in number_spans)
+            val = "/".join(_text(s) for s in number_spans)
         else:
-            spans = li.find_all("span")
-            val = spans[1].get_text(strip=True) if len(spans) >= 2 else ""
+            spans = li.xpath(".//span")
+            val = _text(spans[1]) if len(spans) >= 2 else ""
         ratios[name] = val
 
     # Method 2 fallback: #top-ratios
     if not ratios:
-        for li in soup.select("#top-ratios li"):
-            name_el = li.find("span", class_="name")
-            number_spans = li.find_all("span", class_="number")
-            if name_el and number_spans:
-                val = "/".join(s.get_text(strip=True) for s in number_spans)
-                ratios[name_el.get_text(strip=True)] = val
+        for li in tree.xpath("//*[@id='top-ratios']//li"):
+            name_el = _first(li, f".//span[{_has_class('name')}]")
+            number_spans = li.xpath(f".//span[{_has_class('number')}]")
+            if name_el is not None and number_spans:
+                val = "/".join(_text(s) for s in number_spans)
+                ratios[_text(name_el)] = val
 
     return ratios
 
 
-def _parse_pros_cons(soup: BeautifulSoup) -> dict:
+def _parse_pros_cons(tree: lxml.html.HtmlElement) -> dict:
     """Parse machine-generated pros and cons."""
     pros = []
     cons = []
-    pros_div = soup.find("div", class_="pros")
-    if pros_div:
-        for li in pros_div.find_all("li"):
-            text = li.get_text(strip=True)
+    pros_div = _first(tree, f"//div[{_has_class('pros')}]")
+    if pros_div is not None:
+        for li in pros_div.xpath(".//li"):
+            text = _text(li)
             if text:
                 pros.append(text)
-    cons_div = soup.find("div", class_="cons")
-    if cons_div:
-        for li in cons_div.find_all("li"):
-            text = li.get_text(strip=True)
+    cons_div = _first(tree, f"//div[{_has_class('cons')}]")
+    if cons_div is not None:
+        for li in cons_div.xpath(".//li"):
+            text = _text(li)
             if text:
                 cons.append(text)
     return {"pros": pros, "cons": cons}
 
 
-def _parse_compounded_growth(soup: BeautifulSoup) -> dict:
+def _parse_compounded_growth(tree: lxml.html.HtmlElement) -> dict:
     """Parse compounded growth tables (Sales, Profit, Stock Price CAGR, ROE)."""
     result = {}
-    for tbl in soup.find_all("table", class_="ranges-table"):
-        rows = tbl.find_all("tr")
+    # The ranges tables sit under the P&L section; only scan the whole page if they move
+    ranges = f".//table[{_has_class('ranges-table')}]"
+    section = _first(tree, "//section[@id='profit-loss']")
+    tables = section.xpath(ranges) if section is not None else []
+    for tbl in tables or tree.xpath(ranges):
+        rows = tbl.xpath(".//tr")
         if not rows:
             continue
         # First row is the category header
-        header_cell = rows[0].find(["th", "td"])
-        if not header_cell:
+        header_cell = _first(rows[0], ".//th | .//td")
+        if header_cell is None:
             continue
-        category = header_cell.get_text(strip=True)
+        category = _text(header_cell)
         values = {}
         for row in rows[1:]:
-            cells = [c.get_text(strip=True) for c in row.find_all(["th", "td"])]
+            cells = [_text(c) for c in row.xpath(".//th | .//td")]
             if len(cells) >= 2:
                 key = cells[0].rstrip(":")
                 values[key] = cells[1]
@@ -310,54 +423,50 @@ def _parse_compounded_growth(soup: BeautifulSoup) -> dict:
     return result
 
 
-def _parse_table_section(soup: BeautifulSoup, section_id: str) -> dict:
+def _section_rows(tree: lxml.html.HtmlElement, section_id: str) -> list:
+    """Cell text of every row in the first table of <section id=section_id>."""
+    table = _first(tree, f"//section[@id='{section_id}']//table")
+    if table is None:
+        return []
+    return [[_text(c) for c in row.xpath(".//th | .//td")] for row in table.xpath(".//tr")]
+
+
+def _has_periods(tree: lxml.html.HtmlElement, section_id: str) -> bool:
+    """Cheap probe: does the section's header row carry any period labels?"""
+    return tree.xpath(
+        f"boolean((//section[@id='{section_id}']//table)[1]"
+        f"/descendant::tr[1]/*[self::th or self::td][position() > 1][normalize-space()])"
+    )
+
+
+def _parse_table_section(tree: lxml.html.HtmlElement, section_id: str) -> dict:
     """Parse any tabular section (P&L, BS, CF, Ratios)."""
-    section = soup.find("section", id=section_id)
-    if not section:
-        return {}
-    table = section.find("table")
-    if not table:
-        return {}
-    rows = table.find_all("tr")
+    rows = _section_rows(tree, section_id)
     if not rows:
         return {}
 
-    header_cells = rows[0].find_all(["th", "td"])
-    periods = []
-    for cell in header_cells[1:]:
-        text = cell.get_text(strip=True)
-        if text:
-            periods.append(text)
+    periods = [text for text in rows[0][1:] if text]
 
     result = {"periods": periods, "rows": {}}
-    for row in rows[1:]:
-        cells = row.find_all(["th", "td"])
+    for cells in rows[1:]:
         if not cells:
             continue
-        label = cells[0].get_text(strip=True).rstrip("+").strip()
+        label = cells[0].rstrip("+").strip()
         if not label:
             continue
-        values = [cell.get_text(strip=True) for cell in cells[1:]]
-        result["rows"][label] = values
+        result["rows"][label] = cells[1:]
     return result
 
 
-def _parse_shareholding(soup: BeautifulSoup) -> dict:
+def _parse_shareholding(tree: lxml.html.HtmlElement) -> dict:
     """Parse shareholding pattern."""
-    section = soup.find("section", id="shareholding")
-    if not section:
-        return {}
-    table = section.find("table")
-    if not table:
-        return {}
-    rows = table.find_all("tr")
+    rows = _section_rows(tree, "shareholding")
     if not rows:
         return {}
 
-    header = [c.get_text(strip=True) for c in rows[0].find_all(["th", "td"])]
+    header = rows[0]
     data = {}
-    for row in rows[1:]:
-        cells = [c.get_text(strip=True) for c in row.find_all(["th", "td"])]
+    for cells in rows[1:]:
         if cells:
             label = cells[0].rstrip("+").strip()
             data[label] = cells[1:]
@@ -365,52 +474,49 @@ def _parse_shareholding(soup: BeautifulSoup) -> dict:
     return {"periods": header[1:], "data": data}
 
 
-def _parse_peers(soup: BeautifulSoup) -> list:
+def _parse_peers(tree: lxml.html.HtmlElement) -> list:
     """Parse peer comparison table."""
-    section = soup.find("section", id="peers")
-    if not section:
+    table = _first(tree, "//section[@id='peers']//table")
+    if table is None:
         return []
-    table = section.find("table")
-    if not table:
-        return []
-    rows = table.find_all("tr")
+    rows = table.xpath(".//tr")
     if not rows:
         return []
 
-    headers = [c.get_text(strip=True) for c in rows[0].find_all(["th", "td"])]
+    headers = [_text(c) for c in rows[0].xpath(".//th | .//td")]
     peers = []
     for row in rows[1:]:
-        cells = [c.get_text(strip=True) for c in row.find_all(["th", "td"])]
+        cells = [_text(c) for c in row.xpath(".//th | .//td")]
         if cells and len(cells) >= 2:
             peer = {}
             for i, h in enumerate(headers):
                 if i < len(cells):
                     peer[h] = cells[i]
             # Also capture the link to get ticker
-            link = row.find("a", href=True)
-            if link:
-                href = link["href"]
-                m = re.search(r'/company/([^/]+)/', href)
+            link = _first(row, ".//a[@href]")
+            if link is not None:
+                href = link.get("href")
+                m = _RE_PEER_TICKER.search(href)
                 if m:
                     peer["_ticker"] = m.group(1)
             peers.append(peer)
     return peers
 
 
-def _parse_documents(soup: BeautifulSoup) -> dict:
+def _parse_documents(tree: lxml.html.HtmlElement) -> dict:
     """Parse documents section — annual reports, concall links, BSE filings."""
-    section = soup.find("section", id="documents")
-    if not section:
+    section = _first(tree, "//section[@id='documents']")
+    if section is None:
         return {}
 
     annual_reports = []
     concalls = []
     filings = []
 
-    for li in section.find_all("li"):
-        text = li.get_text(strip=True)
-        link = li.find("a", href=True)
-        href = link["href"] if link else ""
+    for li in section.xpath(".//li"):
+        text = _text(li)
+        link = _first(li, ".//a[@href]")
+        href = link.get("href") if link is not None else ""
 
         entry = {"text": text[:200], "url": href}
 
@@ -435,21 +541,18 @@ def _fetch_segments(company_id: str, consolidated: bool = True) -> list:
     params = "?consolidated=true" if consolidated else ""
     url = f"https://www.screener.in/api/segments/{company_id}/profit-loss/1/{params}"
     try:
-        resp = requests.get(url, headers={**HEADERS, "X-Requested-With": "XMLHttpRequest"}, timeout=10)
+        resp = _http_get(url, headers={"X-Requested-With": "XMLHttpRequest"}, timeout=10)
         if resp.status_code != 200:
             return []
-        soup = BeautifulSoup(resp.text, "html.parser")
-        sales_body = soup.find("tbody", attrs={"data-segment-line": "Sales"})
-        if not sales_body:
-            return []
-        inner_table = sales_body.find("table")
-        if not inner_table:
+        tree = _parse_html(resp)
+        inner_table = _first(tree, '(//tbody[@data-segment-line="Sales"])[1]//table')
+        if inner_table is None:
             return []
         segments = []
         skip = {"Sales", "Less: Intersegment", "Unallocated",
                 "Reconciling Items", "Reconciline Items"}
-        for tr in inner_table.find_all("tr"):
-            cells = [td.get_text(strip=True) for td in tr.find_all("td")]
+        for tr in inner_table.xpath(".//tr"):
+            cells = [_text(td) for td in tr.xpath(".//td")]
             if cells and cells[0] and cells[0] not in skip:
                 segments.append(cells[0])
         return segments
@@ -464,10 +567,10 @@ def _fetch_expense_breakdown(company_id: str, consolidated: bool = True) -> dict
         params += "&consolidated"
     url = f"https://www.screener.in/api/company/{company_id}/schedules/{params}"
     try:
-        resp = requests.get(url, headers={**HEADERS, "X-Requested-With": "XMLHttpRequest"}, timeout=10)
+        resp = _http_get(url, headers={"X-Requested-With": "XMLHttpRequest"}, timeout=10)
         if resp.status_code != 200:
             return {}
-        data = json.loads(resp.text)
+        data = orjson.loads(resp.content) if orjson else json.loads(resp.content)
         result = {}
         for key, val in data.items():
             if not isinstance(val, dict):
@@ -487,7 +590,33 @@ def _fetch_expense_breakdown(company_id: str, consolidated: bool = True) -> dict
 # ANALYSIS ENGINE
 # ═══════════════════════════════════════════════════════════════════════════════
 
-def analyze(data: dict) -> dict:
+@dataclass(slots=True)
+class Analysis:
+    """Result of analyze(): headline metrics plus per-statement breakdowns."""
+    market_cap: float
+    current_price: float
+    pe: float
+    pb: float
+    book_value: float
+    div_yield: float
+    roce: float
+    roe: float
+    face_value: float
+    high_52w: float
+    low_52w: float
+    pl_analysis: dict
+    qtr_analysis: dict
+    bs_analysis: dict
+    cf_analysis: dict
+    sh_analysis: dict
+    growth: dict
+    valuation: dict
+    quality: dict
+    technical: dict
+    flags: dict
+
+
+def analyze(data: dict) -> Analysis:
     """
     Run comprehensive analysis on fetched data.
     Returns structured analysis with scores, flags, and insights.
@@ -520,10 +649,10 @@ def analyze(data: dict) -> dict:
     pb = current_price / book_value if book_value > 0 else 0
 
     # ── P&L trend analysis ──
-    pl_analysis = _analyze_pl_trend(pl)
-    qtr_analysis = _analyze_quarterly_trend(quarters)
-    bs_analysis = _analyze_balance_sheet(bs)
-    cf_analysis = _analyze_cash_flow(cf)
+    pl_analysis = _analyze_pl_trend(pl, _index_rows(pl))
+    qtr_analysis = _analyze_quarterly_trend(quarters, _index_rows(quarters))
+    bs_analysis = _analyze_balance_sheet(bs, _index_rows(bs))
+    cf_analysis = _analyze_cash_flow(cf, _index_rows(cf))
     sh_analysis = _analyze_shareholding(sh)
 
     # ── Compounded growth parsing ──
@@ -544,50 +673,58 @@ def analyze(data: dict) -> dict:
     flags = _generate_flags(pe, pb, roe, roce, div_yield, pl_analysis, bs_analysis,
                             cf_analysis, sh_analysis, growth_parsed, qtr_analysis)
 
-    return {
-        "market_cap": market_cap,
-        "current_price": current_price,
-        "pe": pe,
-        "pb": pb,
-        "book_value": book_value,
-        "div_yield": div_yield,
-        "roce": roce,
-        "roe": roe,
-        "face_value": face_value,
-        "high_52w": high_52w,
-        "low_52w": low_52w,
-        "pl_analysis": pl_analysis,
-        "qtr_analysis": qtr_analysis,
-        "bs_analysis": bs_analysis,
-        "cf_analysis": cf_analysis,
-        "sh_analysis": sh_analysis,
-        "growth": growth_parsed,
-        "valuation": valuation,
-        "quality": quality,
-        "technical": technical,
-        "flags": flags,
-    }
+    return Analysis(
+        market_cap=market_cap,
+        current_price=current_price,
+        pe=pe,
+        pb=pb,
+        book_value=book_value,
+        div_yield=div_yield,
+        roce=roce,
+        roe=roe,
+        face_value=face_value,
+        high_52w=high_52w,
+        low_52w=low_52w,
+        pl_analysis=pl_analysis,
+        qtr_analysis=qtr_analysis,
+        bs_analysis=bs_analysis,
+        cf_analysis=cf_analysis,
+        sh_analysis=sh_analysis,
+        growth=growth_parsed,
+        valuation=valuation,
+        quality=quality,
+        technical=technical,
+        flags=flags,
+    )
+
 
+def _index_rows(section: dict) -> dict:
+    """Lowercased row label -> raw values; built once per section in analyze()."""
+    index = {}
+    for key, vals in section.get("rows", {}).items():
+        index.setdefault(key.strip().lower(), vals)
+    return index
 
-def _get_row_values(section: dict, label: str, n: int = 5) -> list:
-    """Get last N numeric values for a row label from a table section."""
-    rows = section.get("rows", {})
-    for key, vals in rows.items():
-        if label.lower() in key.lower():
-            # Take last N values
-            recent = vals[-n:] if len(vals) >= n else vals
-            return [parse_number(v) for v in recent]
+
+def _row_numbers(vals: list, n: int, nonzero: bool) -> list:
+    """Parse the last N cells; with `nonzero`, an all-zero row counts as missing."""
+    nums = [parse_number(v) for v in vals[-n:]]
+    return nums if not nonzero or any(nums) else []
+
+
+def _get_row_values(index: dict, label: str, n: int = 5, nonzero: bool = False) -> list:
+    """Get last N numeric values for the first row whose label contains `label`."""
+    label = label.lower()
+    for key, vals in index.items():
+        if label in key:
+            return _row_numbers(vals, n, nonzero)
     return []
 
 
-def _get_exact_row_values(section: dict, label: str, n: int = 5) -> list:
+def _get_exact_row_values(index: dict, label: str, n: int = 5, nonzero: bool = False) -> list:
     """Exact match version."""
-    rows = section.get("rows", {})
-    for key, vals in rows.items():
-        if key.strip().lower() == label.lower():
-            recent = vals[-n:] if len(vals) >= n else vals
-            return [parse_number(v) for v in recent]
-    return []
+    vals = index.get(label.lower())
+    return _row_numbers(vals, n, nonzero) if vals is not None else []
 
 
 def _cagr(start: float, end: float, years: int) -> float:
@@ -597,46 +734,42 @@ def _cagr(start: float, end: float, years: int) -> float:
     return ((end / start) ** (1 / years) - 1) * 100
 
 
+def _cagr_window(values: list, years: int) -> float:
+    """CAGR over the trailing `years` periods of a history, 0 if too short."""
+    return _cagr(values[-years - 1], values[-1], years) if len(values) > years else 0
+
+
 def _yoy_change(values: list) -> list:
     """Compute YoY % changes from a list of values."""
-    changes = []
-    for i in range(1, len(values)):
-        if values[i - 1] > 0:
-            changes.append((values[i] / values[i - 1] - 1) * 100)
-        else:
-            changes.append(0)
-    return changes
+    return [(cur / prev - 1) * 100 if prev > 0 else 0
+            for prev, cur in zip(values, values[1:])]
 
 
-def _analyze_pl_trend(pl: dict) -> dict:
+def _analyze_pl_trend(pl: dict, rows: dict) -> dict:
     """Analyze P&L trends over available years."""
     if not pl.get("periods"):
         return {}
 
     # Banks use "Revenue" not "Sales"; try both
-    sales = _get_row_values(pl, "Sales", 12)
-    is_bank = False
-    if not sales or all(v == 0 for v in sales):
-        sales = _get_exact_row_values(pl, "Revenue", 12)
-        is_bank = True
-    if not sales or all(v == 0 for v in sales):
-        sales = _get_row_values(pl, "Total Income", 12)
+    sales = _get_row_values(rows, "Sales", 12, nonzero=True)
+    is_bank = not sales
+    sales = (sales
+             or _get_exact_row_values(rows, "Revenue", 12, nonzero=True)
+             or _get_row_values(rows, "Total Income", 12))
 
-    net_profit = _get_row_values(pl, "Net Profit", 12)
+    net_profit = _get_row_values(rows, "Net Profit", 12)
 
     # Margin: OPM for standard, Financing Margin for banks
-    opm_vals = _get_row_values(pl, "OPM", 12)
-    if (not opm_vals or all(v == 0 for v in opm_vals)):
-        opm_vals = _get_row_values(pl, "Financing Margin", 12)
-
-    eps_vals = _get_row_values(pl, "EPS", 12)
-    op_profit = _get_row_values(pl, "Operating Profit", 12)
-    if not op_profit or all(v == 0 for v in op_profit):
-        op_profit = _get_row_values(pl, "Financing Profit", 12)
-    expenses = _get_row_values(pl, "Expenses", 12)
-    interest = _get_exact_row_values(pl, "Interest", 12)
-    depreciation = _get_row_values(pl, "Depreciation", 12)
-    dividend_payout = _get_row_values(pl, "Dividend Payout", 12)
+    opm_vals = (_get_row_values(rows, "OPM", 12, nonzero=True)
+                or _get_row_values(rows, "Financing Margin", 12))
+
+    eps_vals = _get_row_values(rows, "EPS", 12)
+    op_profit = (_get_row_values(rows, "Operating Profit", 12, nonzero=True)
+                 or _get_row_values(rows, "Financing Profit", 12))
+    expenses = _get_row_values(rows, "Expenses", 12)
+    interest = _get_exact_row_values(rows, "Interest", 12)
+    depreciation = _get_row_values(rows, "Depreciation", 12)
+    dividend_payout = _get_row_values(rows, "Dividend Payout", 12)
 
     # Revenue trend
     sales_yoy = _yoy_change(sales)
@@ -648,16 +781,16 @@ def _analyze_pl_trend(pl: dict) -> dict:
 
     # CAGR
     n_years = len(sales)
-    sales_cagr_3y = _cagr(sales[-4], sales[-1], 3) if len(sales) >= 4 else 0
-    sales_cagr_5y = _cagr(sales[-6], sales[-1], 5) if len(sales) >= 6 else 0
-    profit_cagr_3y = _cagr(net_profit[-4], net_profit[-1], 3) if len(net_profit) >= 4 else 0
-    profit_cagr_5y = _cagr(net_profit[-6], net_profit[-1], 5) if len(net_profit) >= 6 else 0
+    sales_cagr_3y = _cagr_window(sales, 3)
+    sales_cagr_5y = _cagr_window(sales, 5)
+    profit_cagr_3y = _cagr_window(net_profit, 3)
+    profit_cagr_5y = _cagr_window(net_profit, 5)
 
     # Margin trend (expanding or contracting?)
     margin_trend = "stable"
     if len(opm_vals) >= 3:
-        recent_avg = sum(opm_vals[-2:]) / 2
-        older_avg = sum(opm_vals[-4:-2]) / 2 if len(opm_vals) >= 4 else opm_vals[0]
+        recent_avg = (opm_vals[-2] + opm_vals[-1]) / 2
+        older_avg = (opm_vals[-4] + opm_vals[-3]) / 2 if len(opm_vals) >= 4 else opm_vals[0]
         if recent_avg > older_avg + 2:
             margin_trend = "expanding"
         elif recent_avg < older_avg - 2:
@@ -692,20 +825,17 @@ def _analyze_pl_trend(pl: dict) -> dict:
     }
 
 
-def _analyze_quarterly_trend(qtr: dict) -> dict:
+def _analyze_quarterly_trend(qtr: dict, rows: dict) -> dict:
     """Analyze quarterly P&L trends."""
     if not qtr.get("periods"):
         return {}
 
-    sales = _get_row_values(qtr, "Sales", 8)
-    if not sales or all(v == 0 for v in sales):
-        sales = _get_exact_row_values(qtr, "Revenue", 8)
-    if not sales or all(v == 0 for v in sales):
-        sales = _get_row_values(qtr, "Total Income", 8)
-    net_profit = _get_row_values(qtr, "Net Profit", 8)
-    opm_vals = _get_row_values(qtr, "OPM", 8)
-    if not opm_vals or all(v == 0 for v in opm_vals):
-        opm_vals = _get_row_values(qtr, "Financing Margin", 8)
+    sales = (_get_row_values(rows, "Sales", 8, nonzero=True)
+             or _get_exact_row_values(rows, "Revenue", 8, nonzero=True)
+             or _get_row_values(rows, "Total Income", 8))
+    net_profit = _get_row_values(rows, "Net Profit", 8)
+    opm_vals = (_get_row_values(rows, "OPM", 8, nonzero=True)
+                or _get_row_values(rows, "Financing Margin", 8))
     periods = qtr["periods"][-8:]
 
     # Quarter-over-quarter
@@ -723,8 +853,8 @@ def _analyze_quarterly_trend(qtr: dict) -> dict:
     # Beat/miss trend (are recent quarters improving?)
     improving = False
     if len(opm_vals) >= 4:
-        recent_avg = sum(opm_vals[-2:]) / 2
-        old_avg = sum(opm_vals[-4:-2]) / 2
+        recent_avg = (opm_vals[-2] + opm_vals[-1]) / 2
+        old_avg = (opm_vals[-4] + opm_vals[-3]) / 2
         improving = recent_avg > old_avg
 
     return {
@@ -742,20 +872,20 @@ def _analyze_quarterly_trend(qtr: dict) -> dict:
     }
 
 
-def _analyze_balance_sheet(bs: dict) -> dict:
+def _analyze_balance_sheet(bs: dict, rows: dict) -> dict:
     """Analyze balance sheet strength."""
     if not bs.get("periods"):
         return {}
 
-    equity = _get_row_values(bs, "Equity Capital", 5)
-    reserves = _get_row_values(bs, "Reserves", 5)
-    borrowings = _get_row_values(bs, "Borrowings", 5)
-    total_liabilities = _get_row_values(bs, "Total Liabilities", 5)
-    fixed_assets = _get_row_values(bs, "Fixed Assets", 5)
-    cwip = _get_row_values(bs, "CWIP", 5)
-    investments = _get_row_values(bs, "Investments", 5)
-    other_assets = _get_row_values(bs, "Other Assets", 5)
-    total_assets = _get_row_values(bs, "Total Assets", 5)
+    equity = _get_row_values(rows, "Equity Capital", 5)
+    reserves = _get_row_values(rows, "Reserves", 5)
+    borrowings = _get_row_values(rows, "Borrowings", 5)
+    total_liabilities = _get_row_values(rows, "Total Liabilities", 5)
+    fixed_assets = _get_row_values(rows, "Fixed Assets", 5)
+    cwip = _get_row_values(rows, "CWIP", 5)
+    investments = _get_row_values(rows, "Investments", 5)
+    other_assets = _get_row_values(rows, "Other Assets", 5)
+    total_assets = _get_row_values(rows, "Total Assets", 5)
 
     # Latest values
     equity_latest = equity[-1] if equity else 0
@@ -790,15 +920,15 @@ def _analyze_balance_sheet(bs: dict) -> dict:
     }
 
 
-def _analyze_cash_flow(cf: dict) -> dict:
+def _analyze_cash_flow(cf: dict, rows: dict) -> dict:
     """Analyze cash flows."""
     if not cf.get("periods"):
         return {}
 
-    cfo = _get_row_values(cf, "Operating Activity", 5)
-    cfi = _get_row_values(cf, "Investing Activity", 5)
-    cff = _get_row_values(cf, "Financing Activity", 5)
-    net_cf = _get_row_values(cf, "Net Cash Flow", 5)
+    cfo = _get_row_values(rows, "Operating Activity", 5)
+    cfi = _get_row_values(rows, "Investing Activity", 5)
+    cff = _get_row_values(rows, "Financing Activity", 5)
+    net_cf = _get_row_values(rows, "Net Cash Flow", 5)
 
     cfo_latest = cfo[-1] if cfo else 0
     cfi_latest = cfi[-1] if cfi else 0
@@ -833,12 +963,13 @@ def _analyze_shareholding(sh: dict) -> dict:
     if not sh:
         return {}
 
-    data = sh.get("data", {})
+    rows = _index_rows({"rows": sh.get("data", {})})
     periods = sh.get("periods", [])
 
     def parse_row(label):
-        for key, vals in data.items():
-            if label.lower() in key.lower():
+        label = label.lower()
+        for key, vals in rows.items():
+            if label in key:
                 return [parse_number(v) for v in vals]
         return []
 
@@ -852,10 +983,10 @@ def _analyze_shareholding(sh: dict) -> dict:
     def trend(values, n=4):
         if len(values) < n:
             return "insufficient_data"
-        recent = values[-n:]
-        if recent[-1] > recent[0] + 0.5:
+        first, last = values[-n], values[-1]
+        if last > first + 0.5:
             return "increasing"
-        elif recent[-1] < recent[0] - 0.5:
+        elif last < first - 0.5:
             return "decreasing"
         return "stable"
 
@@ -984,24 +1115,27 @@ def _score_quality(roe, roce, pl_analysis, bs_analysis, cf_analysis, growth) ->
         details.append("Low ROCE (<10%)")
 
     # Revenue growth consistency
-    if pl_analysis.get("sales_cagr_5y", 0) > 15:
+    sales_cagr_5y = pl_analysis.get("sales_cagr_5y", 0)
+    if sales_cagr_5y > 15:
         score += 10
         details.append("Strong 5Y revenue CAGR >15%")
-    elif pl_analysis.get("sales_cagr_5y", 0) > 10:
+    elif sales_cagr_5y > 10:
         score += 7
 
     # Profit growth
-    if pl_analysis.get("profit_cagr_5y", 0) > 15:
+    profit_cagr_5y = pl_analysis.get("profit_cagr_5y", 0)
+    if profit_cagr_5y > 15:
         score += 10
         details.append("Strong 5Y profit CAGR >15%")
-    elif pl_analysis.get("profit_cagr_5y", 0) > 10:
+    elif profit_cagr_5y > 10:
         score += 7
 
     # Margin trend
-    if pl_analysis.get("margin_trend") == "expanding":
+    margin_trend = pl_analysis.get("margin_trend")
+    if margin_trend == "expanding":
         score += 8
         details.append("Margins expanding")
-    elif pl_analysis.get("margin_trend") == "contracting":
+    elif margin_trend == "contracting":
         score -= 5
         details.append("Margins contracting")
 
@@ -1063,8 +1197,8 @@ def _assess_technical(price, high_52w, low_52w, sh_analysis) -> dict:
     if high_52w > 0 and low_52w > 0:
         range_52w = high_52w - low_52w
         pos_in_range = (price - low_52w) / range_52w if range_52w > 0 else 0.5
-        pct_from_high = ((price - high_52w) / high_52w * 100) if high_52w > 0 else 0
-        pct_from_low = ((price - low_52w) / low_52w * 100) if low_52w > 0 else 0
+        pct_from_high = (price - high_52w) / high_52w * 100
+        pct_from_low = (price - low_52w) / low_52w * 100
 
         if pos_in_range > 0.9:
             signals.append(("Near 52W High — Momentum strong", "bullish"))
@@ -1156,9 +1290,10 @@ def _generate_flags(pe, pb, roe, roce, div_yield, pl, bs, cf, sh, growth, qtr) -
         red.append(f"Profits declining ({pg_3y:.0f}%)")
 
     # Margins
-    if pl.get("margin_trend") == "expanding":
+    margin_trend = pl.get("margin_trend")
+    if margin_trend == "expanding":
         green.append("Operating margins expanding")
-    elif pl.get("margin_trend") == "contracting":
+    elif margin_trend == "contracting":
         red.append("Operating margins contracting")
 
     opm = pl.get("opm_latest", 0)
@@ -1176,9 +1311,10 @@ def _generate_flags(pe, pb, roe, roce, div_yield, pl, bs, cf, sh, growth, qtr) -
     elif de > 2:
         red.append(f"High debt (D/E {de:.2f})")
 
-    if bs.get("debt_trend") == "increasing":
+    debt_trend = bs.get("debt_trend")
+    if debt_trend == "increasing":
         amber.append("Debt increasing over time")
-    elif bs.get("debt_trend") == "decreasing":
+    elif debt_trend == "decreasing":
         green.append("Debt reducing")
 
     # Cash flow
@@ -1188,9 +1324,10 @@ def _generate_flags(pe, pb, roe, roce, div_yield, pl, bs, cf, sh, growth, qtr) -
     elif cfo_consistency < 0.6:
         red.append("Inconsistent operating cash flow")
 
-    if cf.get("fcf_latest", 0) > 0:
+    fcf_latest = cf.get("fcf_latest", 0)
+    if fcf_latest > 0:
         green.append("Positive free cash flow")
-    elif cf.get("fcf_latest", 0) < 0:
+    elif fcf_latest < 0:
         amber.append("Negative free cash flow")
 
     # Dividends
@@ -1199,14 +1336,16 @@ def _generate_flags(pe, pb, roe, roce, div_yield, pl, bs, cf, sh, growth, qtr) -
 
     # Shareholding
     if sh:
-        if sh.get("promoter_latest", 0) > 60:
-            green.append(f"High promoter holding ({sh['promoter_latest']:.1f}%)")
-        elif sh.get("promoter_latest", 0) < 25:
-            amber.append(f"Low promoter holding ({sh['promoter_latest']:.1f}%)")
+        promoter = sh.get("promoter_latest", 0)
+        if promoter > 60:
+            green.append(f"High promoter holding ({promoter:.1f}%)")
+        elif promoter < 25:
+            amber.append(f"Low promoter holding ({promoter:.1f}%)")
 
-        if sh.get("fii_trend") == "increasing":
+        fii_trend = sh.get("fii_trend")
+        if fii_trend == "increasing":
             green.append("FIIs increasing stake")
-        elif sh.get("fii_trend") == "decreasing":
+        elif fii_trend == "decreasing":
             amber.append("FIIs reducing stake")
 
         if sh.get("promoter_trend") == "decreasing":
@@ -1215,10 +1354,11 @@ def _generate_flags(pe, pb, roe, roce, div_yield, pl, bs, cf, sh, growth, qtr) -
     # Quarterly
     if qtr.get("improving_margins"):
         green.append("Quarterly margins improving")
-    if qtr.get("profit_yoy_q", 0) > 20:
-        green.append(f"Latest quarter profit up {qtr['profit_yoy_q']:.0f}% YoY")
-    elif qtr.get("profit_yoy_q", 0) < -15:
-        red.append(f"Latest quarter profit down {qtr['profit_yoy_q']:.0f}% YoY")
+    profit_yoy_q = qtr.get("profit_yoy_q", 0)
+    if profit_yoy_q > 20:
+        green.append(f"Latest quarter profit up {profit_yoy_q:.0f}% YoY")
+    elif profit_yoy_q < -15:
+        red.append(f"Latest quarter profit down {profit_yoy_q:.0f}% YoY")
 
     return {"green": green, "red": red, "amber": amber}
 
@@ -1227,238 +1367,263 @@ def _generate_flags(pe, pb, roe, roce, div_yield, pl, bs, cf, sh, growth, qtr) -
 # TERMINAL OUTPUT — Beautiful CLI Report
 # ═══════════════════════════════════════════════════════════════════════════════
 
-def print_report(data: dict, analysis: dict, brief: bool = False):
+REPORT_WIDTH = 74
+_SPARK_BLOCKS = " ▁▂▃▄▅▆▇█"
+_TRAFFIC = (C.RED, C.YELLOW, C.GREEN)
+_BAR_FULL = "█" * 64  # sliced for the stacked shareholding bar
+_REPORT_RATIO_LABELS = ("Debtor Days", "Inventory Days", "Days Payable",
+                        "Cash Conversion Cycle", "Working Capital Days", "ROCE %")
+_GRADE_ANSI = {
+    "A+": C.GREEN, "A": C.GREEN, "B+": C.YELLOW,
+    "B": C.YELLOW, "C": C.RED, "D": C.RED,
+}
+# Valuation signals never use "caution", so one table serves both signal lists
+_SIGNAL_ANSI = {
+    "bullish": f"{C.GREEN}▲", "bearish": f"{C.RED}▼",
+    "caution": f"{C.YELLOW}⚠", "neutral": f"{C.YELLOW}●",
+    "info": f"{C.GREY}ℹ",
+}
+
+
+def _color3(value: float, lo: float, hi: float) -> str:
+    """RED up to `lo`, YELLOW up to `hi`, GREEN above — for higher-is-better metrics."""
+    return _TRAFFIC[(value > lo) + (value > hi)]
+
+
+@lru_cache(maxsize=None)
+def _report_header(text: str, bg: str = C.BG_BLU) -> str:
+    """Centred section banner; titles are a fixed set, so each is built once."""
+    padded = f" {text} ".center(REPORT_WIDTH)
+    return f"\n{bg}{C.WHITE}{C.BOLD}{padded}{C.RESET}"
+
+
+def _sparkline(values: list) -> str:
+    """Tiny in-line sparkline."""
+    if not values or len(values) < 2:
+        return ""
+    mn, mx = min(values), max(values)
+    rng = mx - mn if mx != mn else 1
+    return "".join(_SPARK_BLOCKS[min(8, int((v - mn) / rng * 8))] for v in values)
+
+
+def print_report(data: dict, analysis: Analysis, brief: bool = False):
     """Print a rich terminal report."""
+    sys.stdout.write("\n".join(_report_lines(data, analysis, brief)) + "\n")
+
+
+def _report_lines(data: dict, analysis: Analysis, brief: bool = False) -> list:
+    """Lines of the terminal report, written out by print_report in one go."""
     ticker = data["ticker"]
     company = data["company_name"]
-    cons = "Consolidated" if data["is_consolidated"] else "Standalone"
+    cons = _CONS_LABEL[bool(data["is_consolidated"])]
     ratios = data["top_ratios"]
     a = analysis
+    out = []
+    emit = out.append
 
-    W = 74  # report width
+    W = REPORT_WIDTH
+    header = _report_header
 
     def hr(char="─"):
         return C.GREY + char * W + C.RESET
 
-    def header(text, bg=C.BG_BLU):
-        padded = f" {text} ".center(W)
-        return f"\n{bg}{C.WHITE}{C.BOLD}{padded}{C.RESET}"
-
     def kv(key, val, color=C.WHITE, width=22):
         return f"  {C.GREY}{key:<{width}}{C.RESET} {color}{val}{C.RESET}"
 
-    def spark(values, width=20):
-        """Tiny in-line sparkline."""
-        if not values or len(values) < 2:
-            return ""
-        mn, mx = min(values), max(values)
-        rng = mx - mn if mx != mn else 1
-        blocks = " ▁▂▃▄▅▆▇█"
-        return "".join(blocks[min(8, int((v - mn) / rng * 8))] for v in values)
-
     # ═══════ HEADER ═══════
-    print("\n" + "═" * W)
+    emit("\n" + "═" * W)
     title = f"  {company}  ({ticker})"
-    pe_str = f"PE {a['pe']:.1f}" if a["pe"] > 0 else "PE N/A"
-    grade = a["quality"]["grade"]
-    grade_color = {
-        "A+": C.GREEN, "A": C.GREEN, "B+": C.YELLOW,
-        "B": C.YELLOW, "C": C.RED, "D": C.RED,
-    }.get(grade, C.WHITE)
-    print(f"{C.BOLD}{C.CYAN}{title}{C.RESET}")
-    print(f"  {C.GREY}{cons} · {data.get('fetched_at', '')[:10]}{C.RESET}")
+    pe_str = f"PE {a.pe:.1f}" if a.pe > 0 else "PE N/A"
+    grade = a.quality["grade"]
+    grade_color = _GRADE_ANSI.get(grade, C.WHITE)
+    emit(f"{C.BOLD}{C.CYAN}{title}{C.RESET}")
+    emit(f"  {C.GREY}{cons} · {data.get('fetched_at', '')[:10]}{C.RESET}")
     if data.get("about"):
         # Truncate about to 2 lines
         about = data["about"]
         if len(about) > 140:
             about = about[:137] + "..."
-        print(f"  {C.DIM}{about}{C.RESET}")
-    print("═" * W)
+        emit(f"  {C.DIM}{about}{C.RESET}")
+    emit("═" * W)
 
     # ═══════ SCORECARD ═══════
-    print(header("SCORECARD", C.BG_BLU))
-    val_score = a["valuation"]["score"]
-    val_verdict = a["valuation"]["verdict"]
-    qual_score = a["quality"]["score"]
+    emit(header("SCORECARD", C.BG_BLU))
+    val_score = a.valuation["score"]
+    val_verdict = a.valuation["verdict"]
+    qual_score = a.quality["score"]
 
     val_color = C.GREEN if val_score >= 60 else C.YELLOW if val_score >= 40 else C.RED
     qual_color = C.GREEN if qual_score >= 60 else C.YELLOW if qual_score >= 40 else C.RED
 
-    print(f"  {C.BOLD}Quality Grade:{C.RESET}  {grade_color}{C.BOLD} {grade} {C.RESET}  "
-          f"({qual_color}{qual_score}/100{C.RESET})    "
-          f"{C.BOLD}Valuation:{C.RESET}  {val_color}{val_verdict}{C.RESET}  "
-          f"({val_color}{val_score}/100{C.RESET})")
+    emit(f"  {C.BOLD}Quality Grade:{C.RESET}  {grade_color}{C.BOLD} {grade} {C.RESET}  "
+         f"({qual_color}{qual_score}/100{C.RESET})    "
+         f"{C.BOLD}Valuation:{C.RESET}  {val_color}{val_verdict}{C.RESET}  "
+         f"({val_color}{val_score}/100{C.RESET})")
 
     # ═══════ KEY METRICS ═══════
-    print(header("KEY METRICS"))
+    emit(header("KEY METRICS"))
     col1 = [
-        ("Market Cap", fmt_cr(a["market_cap"]), C.WHITE),
-        ("Current Price", f"₹{a['current_price']:,.0f}", C.WHITE),
-        ("52W High / Low", f"₹{a['high_52w']:,.0f} / ₹{a['low_52w']:,.0f}", C.WHITE),
-        ("Stock P/E", f"{a['pe']:.1f}" if a["pe"] > 0 else "N/A", C.CYAN),
-        ("P/B Ratio", f"{a['pb']:.2f}" if a["pb"] > 0 else "N/A", C.CYAN),
+        ("Market Cap", fmt_cr(a.market_cap), C.WHITE),
+        ("Current Price", f"₹{a.current_price:,.0f}", C.WHITE),
+        ("52W High / Low", f"₹{a.high_52w:,.0f} / ₹{a.low_52w:,.0f}", C.WHITE),
+        ("Stock P/E", f"{a.pe:.1f}" if a.pe > 0 else "N/A", C.CYAN),
+        ("P/B Ratio", f"{a.pb:.2f}" if a.pb > 0 else "N/A", C.CYAN),
     ]
     col2 = [
-        ("Book Value", f"₹{a['book_value']:,.0f}" if a["book_value"] > 0 else "N/A", C.WHITE),
-        ("Dividend Yield", f"{a['div_yield']:.2f}%", C.GREEN if a["div_yield"] > 1 else C.WHITE),
-        ("Face Value", f"₹{a['face_value']:.0f}", C.GREY),
-        ("ROCE", f"{a['roce']:.1f}%", C.GREEN if a["roce"] > 15 else C.YELLOW if a["roce"] > 10 else C.RED),
-        ("ROE", f"{a['roe']:.1f}%", C.GREEN if a["roe"] > 15 else C.YELLOW if a["roe"] > 10 else C.RED),
+        ("Book Value", f"₹{a.book_value:,.0f}" if a.book_value > 0 else "N/A", C.WHITE),
+        ("Dividend Yield", f"{a.div_yield:.2f}%", C.GREEN if a.div_yield > 1 else C.WHITE),
+        ("Face Value", f"₹{a.face_value:.0f}", C.GREY),
+        ("ROCE", f"{a.roce:.1f}%", _color3(a.roce, 10, 15)),
+        ("ROE", f"{a.roe:.1f}%", _color3(a.roe, 10, 15)),
     ]
 
     for (k1, v1, c1), (k2, v2, c2) in zip(col1, col2):
         left = f"  {C.GREY}{k1:<20}{C.RESET} {c1}{v1:<18}{C.RESET}"
         right = f" {C.GREY}{k2:<18}{C.RESET} {c2}{v2}{C.RESET}"
-        print(left + right)
+        emit(left + right)
 
     # 52W position bar
-    tech = a["technical"]
+    tech = a.technical
     pos = tech["pos_in_52w_range"]
     bar_len = 30
     filled = int(pos * bar_len)
     bar = f"{'█' * filled}{'░' * (bar_len - filled)}"
     bar_color = C.GREEN if pos > 0.6 else C.RED if pos < 0.3 else C.YELLOW
-    print(f"\n  {C.GREY}52W Range:{C.RESET}  {C.RED}Low{C.RESET} {bar_color}{bar}{C.RESET} {C.GREEN}High{C.RESET}  ({pos * 100:.0f}%)")
+    emit(f"\n  {C.GREY}52W Range:{C.RESET}  {C.RED}Low{C.RESET} {bar_color}{bar}{C.RESET} {C.GREEN}High{C.RESET}  ({pos * 100:.0f}%)")
 
     if brief:
         # Brief mode — just show flags and exit
-        _print_flags(a["flags"])
-        print()
-        return
+        out.extend(_flag_lines(a.flags))
+        emit("")
+        return out
 
     # ═══════ P&L SUMMARY ═══════
-    pl = a["pl_analysis"]
+    pl = a.pl_analysis
     if pl:
         is_bank = pl.get("is_bank", False)
         margin_label = "Financing Margin" if is_bank else "OPM"
-        print(header("PROFIT & LOSS"))
-        print(kv("Revenue (Latest FY)", fmt_cr(pl["sales_latest"]), C.WHITE))
-        print(kv("Net Profit", fmt_cr(pl["net_profit_latest"]),
-                  C.GREEN if pl["net_profit_latest"] > 0 else C.RED))
-        print(kv("EPS", f"₹{pl['eps_latest']:.1f}", C.WHITE))
-        print(kv(margin_label, f"{pl['opm_latest']:.0f}%",
-                  C.GREEN if pl["opm_latest"] > 20 else C.YELLOW if pl["opm_latest"] > 10 else C.RED))
-        print(kv("NPM", f"{pl['npm_latest']:.1f}%",
-                  C.GREEN if pl["npm_latest"] > 15 else C.YELLOW if pl["npm_latest"] > 8 else C.RED))
-        print(kv("Margin Trend", pl["margin_trend"].title(),
-                  C.GREEN if pl["margin_trend"] == "expanding" else
-                  C.RED if pl["margin_trend"] == "contracting" else C.YELLOW))
+        emit(header("PROFIT & LOSS"))
+        emit(kv("Revenue (Latest FY)", fmt_cr(pl["sales_latest"]), C.WHITE))
+        emit(kv("Net Profit", fmt_cr(pl["net_profit_latest"]),
+                 C.GREEN if pl["net_profit_latest"] > 0 else C.RED))
+        emit(kv("EPS", f"₹{pl['eps_latest']:.1f}", C.WHITE))
+        emit(kv(margin_label, f"{pl['opm_latest']:.0f}%",
+                 _color3(pl["opm_latest"], 10, 20)))
+        emit(kv("NPM", f"{pl['npm_latest']:.1f}%",
+                 _color3(pl["npm_latest"], 8, 15)))
+        emit(kv("Margin Trend", pl["margin_trend"].title(),
+                 C.GREEN if pl["margin_trend"] == "expanding" else
+                 C.RED if pl["margin_trend"] == "contracting" else C.YELLOW))
 
         # Revenue sparkline
         if pl.get("sales_history"):
-            sp = spark(pl["sales_history"])
-            print(f"\n  {C.GREY}Revenue Trend:{C.RESET}  {C.CYAN}{sp}{C.RESET}  "
-                  f"({len(pl['sales_history'])}Y)")
+            sp = _sparkline(pl["sales_history"])
+            emit(f"\n  {C.GREY}Revenue Trend:{C.RESET}  {C.CYAN}{sp}{C.RESET}  "
+                 f"({len(pl['sales_history'])}Y)")
         if pl.get("profit_history"):
-            sp = spark(pl["profit_history"])
+            sp = _sparkline(pl["profit_history"])
             color = C.GREEN if pl["profit_history"][-1] > pl["profit_history"][0] else C.RED
-            print(f"  {C.GREY}Profit Trend: {C.RESET}  {color}{sp}{C.RESET}  "
-                  f"({len(pl['profit_history'])}Y)")
+            emit(f"  {C.GREY}Profit Trend: {C.RESET}  {color}{sp}{C.RESET}  "
+                 f"({len(pl['profit_history'])}Y)")
 
     # ═══════ GROWTH ═══════
-    growth = a["growth"]
+    growth = a.growth
     if growth:
-        print(header("GROWTH"))
+        emit(header("GROWTH"))
         for category, vals in growth.items():
             short_cat = (category.replace("Compounded ", "")
                                  .replace("Stock Price CAGR", "Stock CAGR")
                                  .replace("Return on Equity", "ROE Trend"))
             parts = []
             for period, val in vals.items():
-                color = C.GREEN if val > 10 else C.YELLOW if val > 0 else C.RED
+                color = _color3(val, 0, 10)
                 parts.append(f"{period}: {color}{val:+.0f}%{C.RESET}")
-            print(f"  {C.GREY}{short_cat:<20}{C.RESET} {' · '.join(parts)}")
+            emit(f"  {C.GREY}{short_cat:<20}{C.RESET} {' · '.join(parts)}")
 
     # ═══════ QUARTERLY TREND ═══════
-    qtr = a["qtr_analysis"]
+    qtr = a.qtr_analysis
     if qtr and qtr.get("periods"):
-        print(header("QUARTERLY TREND"))
-        print(kv("Latest Q Revenue", fmt_cr(qtr["sales_latest_q"]), C.WHITE))
-        print(kv("Latest Q Profit", fmt_cr(qtr["profit_latest_q"]),
-                  C.GREEN if qtr["profit_latest_q"] > 0 else C.RED))
-        print(kv("Revenue YoY", fmt_pct(qtr["sales_yoy_q"]),
-                  C.GREEN if qtr["sales_yoy_q"] > 0 else C.RED))
-        print(kv("Profit YoY", fmt_pct(qtr["profit_yoy_q"]),
-                  C.GREEN if qtr["profit_yoy_q"] > 0 else C.RED))
-        print(kv("OPM Latest Q", f"{qtr['opm_latest_q']:.0f}%",
-                  C.GREEN if qtr["opm_latest_q"] > 20 else C.YELLOW))
-        print(kv("Margin Improving?",
-                  "Yes ✓" if qtr["improving_margins"] else "No ✗",
-                  C.GREEN if qtr["improving_margins"] else C.RED))
+        emit(header("QUARTERLY TREND"))
+        emit(kv("Latest Q Revenue", fmt_cr(qtr["sales_latest_q"]), C.WHITE))
+        emit(kv("Latest Q Profit", fmt_cr(qtr["profit_latest_q"]),
+                 C.GREEN if qtr["profit_latest_q"] > 0 else C.RED))
+        emit(kv("Revenue YoY", fmt_pct(qtr["sales_yoy_q"]),
+                 C.GREEN if qtr["sales_yoy_q"] > 0 else C.RED))
+        emit(kv("Profit YoY", fmt_pct(qtr["profit_yoy_q"]),
+                 C.GREEN if qtr["profit_yoy_q"] > 0 else C.RED))
+        emit(kv("OPM Latest Q", f"{qtr['opm_latest_q']:.0f}%",
+                 C.GREEN if qtr["opm_latest_q"] > 20 else C.YELLOW))
+        emit(kv("Margin Improving?",
+                 "Yes ✓" if qtr["improving_margins"] else "No ✗",
+                 C.GREEN if qtr["improving_margins"] else C.RED))
 
         # Mini quarterly table
         if qtr.get("sales_history") and qtr.get("profit_history"):
-            periods = qtr["periods"]
-            sales_q = qtr["sales_history"]
-            profit_q = qtr["profit_history"]
-            n = min(len(periods), len(sales_q), len(profit_q), 6)
-            if n >= 2:
-                print(f"\n  {C.GREY}{'Quarter':<12}", end="")
-                for p in periods[-n:]:
-                    print(f"{p:>12}", end="")
-                print(C.RESET)
-                print(f"  {'Revenue':<12}", end="")
-                for v in sales_q[-n:]:
-                    print(f"{C.CYAN}{fmt_indian(v):>12}{C.RESET}", end="")
-                print()
-                print(f"  {'Net Profit':<12}", end="")
-                for v in profit_q[-n:]:
-                    color = C.GREEN if v > 0 else C.RED
-                    print(f"{color}{fmt_indian(v):>12}{C.RESET}", end="")
-                print()
+            # Last (up to) 6 quarters, aligned from the most recent end of each series
+            tail = list(zip(reversed(qtr["periods"]), reversed(qtr["sales_history"]),
+                            reversed(qtr["profit_history"])))[5::-1]
+            if len(tail) >= 2:
+                head_cells, rev_cells, pat_cells = [], [], []
+                for p, sv, pv in tail:
+                    head_cells.append(f"{p:>12}")
+                    rev_cells.append(f"{C.CYAN}{fmt_indian(sv):>12}{C.RESET}")
+                    pat_cells.append(f"{C.GREEN if pv > 0 else C.RED}{fmt_indian(pv):>12}{C.RESET}")
+                emit(f"\n  {C.GREY}{'Quarter':<12}{''.join(head_cells)}{C.RESET}")
+                emit(f"  {'Revenue':<12}{''.join(rev_cells)}")
+                emit(f"  {'Net Profit':<12}{''.join(pat_cells)}")
 
     # ═══════ BALANCE SHEET ═══════
-    bsa = a["bs_analysis"]
+    bsa = a.bs_analysis
     if bsa:
-        print(header("BALANCE SHEET"))
-        print(kv("Shareholder Equity", fmt_cr(bsa["shareholder_equity"]), C.WHITE))
-        print(kv("Total Borrowings", fmt_cr(bsa["borrowings"]),
-                  C.GREEN if bsa["de_ratio"] < 0.5 else C.RED))
-        print(kv("Total Assets", fmt_cr(bsa["total_assets"]), C.WHITE))
+        emit(header("BALANCE SHEET"))
+        emit(kv("Shareholder Equity", fmt_cr(bsa["shareholder_equity"]), C.WHITE))
+        emit(kv("Total Borrowings", fmt_cr(bsa["borrowings"]),
+                 C.GREEN if bsa["de_ratio"] < 0.5 else C.RED))
+        emit(kv("Total Assets", fmt_cr(bsa["total_assets"]), C.WHITE))
         de_color = C.GREEN if bsa["de_ratio"] < 0.5 else C.YELLOW if bsa["de_ratio"] < 1 else C.RED
-        print(kv("Debt/Equity Ratio", f"{bsa['de_ratio']:.2f}", de_color))
-        print(kv("Debt Trend", bsa["debt_trend"].title(),
-                  C.GREEN if bsa["debt_trend"] == "decreasing" else
-                  C.RED if bsa["debt_trend"] == "increasing" else C.YELLOW))
+        emit(kv("Debt/Equity Ratio", f"{bsa['de_ratio']:.2f}", de_color))
+        emit(kv("Debt Trend", bsa["debt_trend"].title(),
+                 C.GREEN if bsa["debt_trend"] == "decreasing" else
+                 C.RED if bsa["debt_trend"] == "increasing" else C.YELLOW))
         if bsa.get("cwip_latest", 0) > 0:
-            print(kv("CWIP", fmt_cr(bsa["cwip_latest"]), C.GREY))
+            emit(kv("CWIP", fmt_cr(bsa["cwip_latest"]), C.GREY))
 
     # ═══════ CASH FLOW ═══════
-    cfa = a["cf_analysis"]
+    cfa = a.cf_analysis
     if cfa:
-        print(header("CASH FLOW"))
-        print(kv("CFO (Latest)", fmt_cr(cfa["cfo_latest"]),
-                  C.GREEN if cfa["cfo_latest"] > 0 else C.RED))
-        print(kv("CFI (Latest)", fmt_cr(cfa["cfi_latest"]),
-                  C.RED if cfa["cfi_latest"] < 0 else C.GREEN))
-        print(kv("CFF (Latest)", fmt_cr(cfa["cff_latest"]), C.WHITE))
-        print(kv("Free Cash Flow", fmt_cr(cfa["fcf_latest"]),
-                  C.GREEN if cfa["fcf_latest"] > 0 else C.RED))
-        print(kv("CFO Positive Years",
-                  f"{int(cfa['cfo_consistency'] * cfa['total_years'])}/{cfa['total_years']}",
-                  C.GREEN if cfa["cfo_consistency"] >= 1.0 else C.YELLOW))
+        emit(header("CASH FLOW"))
+        emit(kv("CFO (Latest)", fmt_cr(cfa["cfo_latest"]),
+                 C.GREEN if cfa["cfo_latest"] > 0 else C.RED))
+        emit(kv("CFI (Latest)", fmt_cr(cfa["cfi_latest"]),
+                 C.RED if cfa["cfi_latest"] < 0 else C.GREEN))
+        emit(kv("CFF (Latest)", fmt_cr(cfa["cff_latest"]), C.WHITE))
+        emit(kv("Free Cash Flow", fmt_cr(cfa["fcf_latest"]),
+                 C.GREEN if cfa["fcf_latest"] > 0 else C.RED))
+        emit(kv("CFO Positive Years",
+                 f"{int(cfa['cfo_consistency'] * cfa['total_years'])}/{cfa['total_years']}",
+                 C.GREEN if cfa["cfo_consistency"] >= 1.0 else C.YELLOW))
         if cfa.get("cfo_history"):
-            sp = spark(cfa["cfo_history"])
-            print(f"\n  {C.GREY}CFO Trend:    {C.RESET}  {C.GREEN}{sp}{C.RESET}")
+            sp = _sparkline(cfa["cfo_history"])
+            emit(f"\n  {C.GREY}CFO Trend:    {C.RESET}  {C.GREEN}{sp}{C.RESET}")
         if cfa.get("fcf_history"):
-            sp = spark(cfa["fcf_history"])
+            sp = _sparkline(cfa["fcf_history"])
             color = C.GREEN if cfa["fcf_latest"] > 0 else C.RED
-            print(f"  {C.GREY}FCF Trend:    {C.RESET}  {color}{sp}{C.RESET}")
+            emit(f"  {C.GREY}FCF Trend:    {C.RESET}  {color}{sp}{C.RESET}")
 
     # ═══════ SHAREHOLDING ═══════
-    sha = a["sh_analysis"]
+    sha = a.sh_analysis
     if sha and sha.get("promoter_latest", 0) > 0:
-        print(header("SHAREHOLDING"))
-        print(kv("Promoters", f"{sha['promoter_latest']:.1f}%  ({sha['promoter_trend']})",
-                  C.GREEN if sha["promoter_trend"] != "decreasing" else C.RED))
-        print(kv("FIIs", f"{sha['fii_latest']:.1f}%  ({sha['fii_trend']})",
-                  C.GREEN if sha["fii_trend"] == "increasing" else
-                  C.RED if sha["fii_trend"] == "decreasing" else C.WHITE))
-        print(kv("DIIs", f"{sha['dii_latest']:.1f}%  ({sha['dii_trend']})",
-                  C.GREEN if sha["dii_trend"] == "increasing" else C.WHITE))
-        print(kv("Public", f"{sha['public_latest']:.1f}%", C.GREY))
+        emit(header("SHAREHOLDING"))
+        emit(kv("Promoters", f"{sha['promoter_latest']:.1f}%  ({sha['promoter_trend']})",
+                 C.GREEN if sha["promoter_trend"] != "decreasing" else C.RED))
+        emit(kv("FIIs", f"{sha['fii_latest']:.1f}%  ({sha['fii_trend']})",
+                 C.GREEN if sha["fii_trend"] == "increasing" else
+                 C.RED if sha["fii_trend"] == "decreasing" else C.WHITE))
+        emit(kv("DIIs", f"{sha['dii_latest']:.1f}%  ({sha['dii_trend']})",
+                 C.GREEN if sha["dii_trend"] == "increasing" else C.WHITE))
+        emit(kv("Public", f"{sha['public_latest']:.1f}%", C.GREY))
         if sha.get("n_shareholders_latest", 0) > 0:
-            print(kv("Shareholders", f"{sha['n_shareholders_latest']:,.0f}", C.GREY))
+            emit(kv("Shareholders", f"{sha['n_shareholders_latest']:,.0f}", C.GREY))
 
         # Shareholding bar
         p = sha["promoter_latest"]
@@ -1472,63 +1637,57 @@ def print_report(data: dict, analysis: dict, brief: bool = False):
             bf = int(f_ / total * bar_w)
             bd = int(d / total * bar_w)
             bpub = bar_w - bp - bf - bd
-            print(f"\n  {C.GREEN}{'█' * bp}{C.BLUE}{'█' * bf}{C.CYAN}{'█' * bd}{C.GREY}{'█' * bpub}{C.RESET}")
-            print(f"  {C.GREEN}Promoter{C.RESET}  {C.BLUE}FII{C.RESET}  {C.CYAN}DII{C.RESET}  {C.GREY}Public{C.RESET}")
+            emit("".join(("\n  ", C.GREEN, _BAR_FULL[:bp], C.BLUE, _BAR_FULL[:bf],
+                          C.CYAN, _BAR_FULL[:bd], C.GREY, _BAR_FULL[:bpub], C.RESET)))
+            emit(f"  {C.GREEN}Promoter{C.RESET}  {C.BLUE}FII{C.RESET}  {C.CYAN}DII{C.RESET}  {C.GREY}Public{C.RESET}")
 
     # ═══════ SEGMENTS ═══════
     segments = data.get("segments", [])
     if segments:
-        print(header("BUSINESS SEGMENTS"))
+        emit(header("BUSINESS SEGMENTS"))
         for i, seg in enumerate(segments):
-            print(f"  {C.CYAN}●{C.RESET} {seg}")
+            emit(f"  {C.CYAN}●{C.RESET} {seg}")
 
     # ═══════ KEY RATIOS ═══════
     ratios_sec = data.get("ratios", {})
     if ratios_sec.get("rows"):
-        print(header("KEY RATIOS"))
+        emit(header("KEY RATIOS"))
         ratio_rows = ratios_sec["rows"]
-        periods_r = ratios_sec.get("periods", [])
-        for label in ["Debtor Days", "Inventory Days", "Days Payable",
-                       "Cash Conversion Cycle", "Working Capital Days", "ROCE %"]:
-            if label in ratio_rows:
-                vals = ratio_rows[label][-4:]
-                periods_show = periods_r[-4:]
-                parts = []
-                for p, v in zip(periods_show, vals):
-                    parts.append(f"{p[-4:]}: {v}")
-                print(f"  {C.GREY}{label:<28}{C.RESET} {' · '.join(parts)}")
+        years = [p[-4:] for p in ratios_sec.get("periods", [])[-4:]]
+        for label in _REPORT_RATIO_LABELS:
+            vals = ratio_rows.get(label)
+            if vals is not None:
+                parts = " · ".join([f"{y}: {v}" for y, v in zip(years, vals[-4:])])
+                emit(f"  {C.GREY}{label:<28}{C.RESET} {parts}")
 
     # ═══════ VALUATION SIGNALS ═══════
-    print(header("VALUATION SIGNALS"))
-    for signal, sentiment in a["valuation"]["signals"]:
-        icon = {"bullish": f"{C.GREEN}▲", "bearish": f"{C.RED}▼",
-                "neutral": f"{C.YELLOW}●", "info": f"{C.GREY}ℹ"}.get(sentiment, "●")
-        print(f"  {icon} {signal}{C.RESET}")
+    emit(header("VALUATION SIGNALS"))
+    for signal, sentiment in a.valuation["signals"]:
+        icon = _SIGNAL_ANSI.get(sentiment, "●")
+        emit(f"  {icon} {signal}{C.RESET}")
 
     # ═══════ TECHNICAL SIGNALS ═══════
-    print(header("TECHNICAL SIGNALS"))
-    for signal, sentiment in a["technical"]["signals"]:
-        icon = {"bullish": f"{C.GREEN}▲", "bearish": f"{C.RED}▼",
-                "caution": f"{C.YELLOW}⚠", "neutral": f"{C.YELLOW}●",
-                "info": f"{C.GREY}ℹ"}.get(sentiment, "●")
-        print(f"  {icon} {signal}{C.RESET}")
+    emit(header("TECHNICAL SIGNALS"))
+    for signal, sentiment in a.technical["signals"]:
+        icon = _SIGNAL_ANSI.get(sentiment, "●")
+        emit(f"  {icon} {signal}{C.RESET}")
 
     # ═══════ FLAGS ═══════
-    _print_flags(a["flags"])
+    out.extend(_flag_lines(a.flags))
 
     # ═══════ PROS / CONS ═══════
     pc = data.get("pros_cons", {})
     if pc.get("pros") or pc.get("cons"):
-        print(header("SCREENER PROS & CONS"))
+        emit(header("SCREENER PROS & CONS"))
         for p in pc.get("pros", []):
-            print(f"  {C.GREEN}✓{C.RESET} {p}")
+            emit(f"  {C.GREEN}✓{C.RESET} {p}")
         for c_item in pc.get("cons", []):
-            print(f"  {C.RED}✗{C.RESET} {c_item}")
+            emit(f"  {C.RED}✗{C.RESET} {c_item}")
 
     # ═══════ PEERS ═══════
     peers = data.get("peers", [])
     if peers and len(peers) >= 2:
-        print(header("PEER COMPARISON"))
+        emit(header("PEER COMPARISON"))
         # Get headers
         if peers:
             headers = [k for k in peers[0].keys() if not k.startswith("_")]
@@ -1538,8 +1697,8 @@ def print_report(data: dict, analysis: dict, brief: bool = False):
             row_str = f"  {C.GREY}"
             for h in show_cols:
                 row_str += f"{h[:12]:>13}"
-            print(row_str + C.RESET)
-            print(f"  {C.GREY}{'─' * (13 * len(show_cols))}{C.RESET}")
+            emit(row_str + C.RESET)
+            emit(f"  {C.GREY}{'─' * (13 * len(show_cols))}{C.RESET}")
             for peer in peers[:8]:
                 is_self = peer.get("_ticker", "").upper() == data["ticker"]
                 color = C.CYAN + C.BOLD if is_self else C.WHITE
@@ -1548,59 +1707,164 @@ def print_report(data: dict, analysis: dict, brief: bool = False):
                     val = peer.get(h, "")
                     val_str = val[:12] if isinstance(val, str) else str(val)[:12]
                     row_str += f"{val_str:>13}"
-                print(row_str + C.RESET)
+                emit(row_str + C.RESET)
 
     # ═══════ DOCUMENTS ═══════
     docs = data.get("documents", {})
     if docs.get("concalls") or docs.get("annual_reports"):
-        print(header("RECENT DOCUMENTS"))
+        emit(header("RECENT DOCUMENTS"))
         for doc in docs.get("concalls", [])[:3]:
-            print(f"  {C.BLUE}📞{C.RESET} {doc['text'][:65]}")
+            emit(f"  {C.BLUE}📞{C.RESET} {doc['text'][:65]}")
         for doc in docs.get("annual_reports", [])[:3]:
-            print(f"  {C.CYAN}📄{C.RESET} {doc['text'][:65]}")
+            emit(f"  {C.CYAN}📄{C.RESET} {doc['text'][:65]}")
 
     # ═══════ FOOTER ═══════
-    print(f"\n{'═' * W}")
-    print(f"  {C.GREY}Source: screener.in · {data['url']}{C.RESET}")
-    print(f"  {C.GREY}Generated: {datetime.now().strftime('%d %b %Y %H:%M')}{C.RESET}")
-    print(f"{'═' * W}\n")
+    emit(f"\n{'═' * W}")
+    emit(f"  {C.GREY}Source: screener.in · {data['url']}{C.RESET}")
+    emit(f"  {C.GREY}Generated: {datetime.now().strftime('%d %b %Y %H:%M')}{C.RESET}")
+    emit(f"{'═' * W}\n")
+    return out
 
 
-def _print_flags(flags: dict):
-    """Print green/amber/red flags section."""
+def _flag_lines(flags: dict) -> list:
+    """Lines of the green/amber/red flags section."""
+    out = []
+    emit = out.append
     green = flags.get("green", [])
     red = flags.get("red", [])
     amber = flags.get("amber", [])
 
     if green or red or amber:
-        W = 74
-        print(f"\n{C.BG_GRN}{C.WHITE}{C.BOLD}{' GREEN FLAGS '.center(W)}{C.RESET}")
+        emit(_report_header("GREEN FLAGS", C.BG_GRN))
         for f in green:
-            print(f"  {C.GREEN}✓{C.RESET} {f}")
+            emit(f"  {C.GREEN}✓{C.RESET} {f}")
         if not green:
-            print(f"  {C.GREY}None{C.RESET}")
+            emit(f"  {C.GREY}None{C.RESET}")
 
         if amber:
-            print(f"\n{C.BG_YLW}{C.WHITE}{C.BOLD}{' AMBER FLAGS '.center(W)}{C.RESET}")
+            emit(_report_header("AMBER FLAGS", C.BG_YLW))
             for f in amber:
-                print(f"  {C.YELLOW}⚠{C.RESET} {f}")
+                emit(f"  {C.YELLOW}⚠{C.RESET} {f}")
 
-        print(f"\n{C.BG_RED}{C.WHITE}{C.BOLD}{' RED FLAGS '.center(W)}{C.RESET}")
+        emit(_report_header("RED FLAGS", C.BG_RED))
         for f in red:
-            print(f"  {C.RED}✗{C.RESET} {f}")
+            emit(f"  {C.RED}✗{C.RESET} {f}")
         if not red:
-            print(f"  {C.GREY}None{C.RESET}")
+            emit(f"  {C.GREY}None{C.RESET}")
+    return out
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # HTML REPORT
 # ═══════════════════════════════════════════════════════════════════════════════
 
-def generate_html_report(data: dict, analysis: dict, sankey_html: str = "") -> str:
+_REPORT_GRADE_COLOR = {"A+": "#16A34A", "A": "#22C55E", "B+": "#EAB308",
+                       "B": "#F59E0B", "C": "#EF4444", "D": "#DC2626"}
+# sentiment -> (icon, colour)
+_REPORT_SIGNAL_STYLE = {"bullish": ("▲", "#16A34A"), "bearish": ("▼", "#EF4444"),
+                        "caution": ("⚠", "#EAB308"), "neutral": ("●", "#EAB308"),
+                        "info": ("ℹ", "#6B7280")}
+
+_REPORT_CSS = """\
+:root {
+    --green: #16A34A; --red: #EF4444; --amber: #EAB308;
+    --blue: #2563EB; --grey: #6B7280; --light: #F9FAFB;
+    --border: #E5E7EB;
+}
+* { margin:0; padding:0; box-sizing:border-box; }
+body { font-family: 'Segoe UI', -apple-system, sans-serif; background:#F3F4F6; color:#1F2937; }
+.container { max-width:1100px; margin:0 auto; padding:20px; }
+.header { background:linear-gradient(135deg, #1E3A5F, #2563EB); color:white; padding:32px; border-radius:16px; margin-bottom:20px; }
+.header h1 { font-size:28px; margin-bottom:4px; }
+.header .sub { font-size:14px; opacity:0.8; }
+.about { font-size:13px; color:#9CA3AF; margin-top:10px; line-height:1.5; }
+.scorecard { display:flex; gap:16px; margin-bottom:20px; }
+.score-card { flex:1; background:white; border-radius:12px; padding:20px; text-align:center; box-shadow:0 1px 3px rgba(0,0,0,0.1); }
+.score-card .label { font-size:12px; color:var(--grey); text-transform:uppercase; letter-spacing:1px; }
+.score-card .value { font-size:36px; font-weight:800; margin:8px 0; }
+.score-card .desc { font-size:13px; color:var(--grey); }
+.grid { display:grid; grid-template-columns:1fr 1fr; gap:16px; margin-bottom:20px; }
+@media (max-width:768px) { .grid { grid-template-columns:1fr; } }
+.section { background:white; border-radius:12px; padding:20px; box-shadow:0 1px 3px rgba(0,0,0,0.1); margin-bottom:16px; }
+.section h2 { font-size:16px; color:#1E3A5F; margin-bottom:12px; border-bottom:2px solid var(--border); padding-bottom:8px; }
+.metric { display:flex; justify-content:space-between; padding:6px 0; border-bottom:1px solid #F3F4F6; }
+.metric .key { color:var(--grey); font-size:13px; }
+.metric .val { font-weight:600; font-size:14px; }
+.positive { color:var(--green); }
+.negative { color:var(--red); }
+.neutral { color:var(--amber); }
+.flag { padding:6px 12px; margin:4px 0; border-radius:6px; font-size:13px; }
+.flag.green { background:#F0FDF4; color:#166534; border-left:3px solid var(--green); }
+.flag.red { background:#FEF2F2; color:#991B1B; border-left:3px solid var(--red); }
+.flag.amber { background:#FFFBEB; color:#92400E; border-left:3px solid var(--amber); }
+.data-table { width:100%; border-collapse:collapse; font-size:13px; }
+.data-table th { text-align:right; padding:6px 8px; background:#F9FAFB; color:var(--grey); font-size:12px; border-bottom:2px solid var(--border); }
+.data-table td { text-align:right; padding:6px 8px; border-bottom:1px solid #F3F4F6; }
+.data-table td:first-child, .data-table th:first-child { text-align:left; }
+.bar-52w { height:8px; background:#E5E7EB; border-radius:4px; position:relative; margin:10px 0; }
+.bar-52w .fill { height:100%; border-radius:4px; }
+.bar-52w .labels { display:flex; justify-content:space-between; font-size:11px; color:var(--grey); }
+.segment-tag { display:inline-block; background:#EBF5FF; color:#2563EB; padding:4px 12px; border-radius:20px; margin:4px; font-size:13px; }
+.segments { display:flex; flex-wrap:wrap; gap:4px; }
+.doc-item { padding:4px 0; font-size:13px; }
+.doc-item a { color:var(--blue); text-decoration:none; }
+.doc-item a:hover { text-decoration:underline; }
+.pro { color:#166534; padding:3px 0; font-size:13px; }
+.con { color:#991B1B; padding:3px 0; font-size:13px; }
+.footer { text-align:center; color:var(--grey); font-size:12px; padding:20px; }
+.footer a { color:var(--blue); text-decoration:none; }
+.sh-bar { display:flex; height:24px; border-radius:6px; overflow:hidden; margin:10px 0; }
+.sh-bar > div { display:flex; align-items:center; justify-content:center; font-size:11px; color:white; font-weight:600; }
+"""
+
+
+# ─── Fragments shared by the HTML report and the dashboard pane ──────────────
+
+# Shareholding trend → CSS modifier class (leading space so it appends to "val")
+_TREND_CLS = {"increasing": " positive", "decreasing": " negative"}
+
+
+def _generated_stamp() -> str:
+    """Footer timestamp; batch builders compute it once and pass it to every page."""
+    return datetime.now().strftime("%d %b %Y %H:%M")
+
+
+def _signal_divs(signals: list, palette: dict, style: str) -> str:
+    """One coloured line per (signal, sentiment) pair; palette maps sentiment -> (icon, colour)."""
+    parts = []
+    for signal, sentiment in signals:
+        icon, color = palette.get(sentiment, ("●", None))
+        parts.append(f'<div style="color:{color};{style}">{icon} {signal}</div>\n')
+    return "".join(parts)
+
+
+def _peer_rows(peers: list, ticker: str, self_style: str) -> tuple:
+    """(header row, body rows) for the first 10 peers, highlighting the company itself."""
+    headers = [k for k in peers[0].keys() if not k.startswith("_")][:8]
+    header = "<tr>" + "".join(f"<th>{h}</th>" for h in headers) + "</tr>"
+    rows = []
+    for peer in peers[:10]:
+        style = self_style if peer.get("_ticker", "").upper() == ticker else ""
+        cells = "".join(f"<td>{peer.get(h, '')}</td>" for h in headers)
+        rows.append(f"<tr {style}>{cells}</tr>\n")
+    return header, "".join(rows)
+
+
+def _doc_items(docs: dict, n_annual: int) -> str:
+    """Links to the latest three concalls and n_annual annual reports."""
+    return "".join(
+        f'<div class="doc-item">{icon} <a href="{doc["url"]}" target="_blank">{doc["text"][:80]}</a></div>\n'
+        for icon, key, n in (("📞", "concalls", 3), ("📄", "annual_reports", n_annual))
+        for doc in docs.get(key, [])[:n])
+
+
+def generate_html_report(data: dict, analysis: Analysis, sankey_html: str = "",
+                         generated_at: str = None) -> str:
     """Generate a rich HTML screener report."""
+    generated_at = generated_at or _generated_stamp()
     ticker = data["ticker"]
     company = data["company_name"]
-    cons = "Consolidated" if data["is_consolidated"] else "Standalone"
+    cons_label = _CONS_LABEL[bool(data["is_consolidated"])]
     a = analysis
 
     # Utility CSS classes
@@ -1613,51 +1877,38 @@ def generate_html_report(data: dict, analysis: dict, sankey_html: str = "") -> s
         return "neutral"
 
     def flag_html(flags):
-        html = ""
-        for f in flags.get("green", []):
-            html += f'<div class="flag green">✓ {f}</div>\n'
-        for f in flags.get("amber", []):
-            html += f'<div class="flag amber">⚠ {f}</div>\n'
-        for f in flags.get("red", []):
-            html += f'<div class="flag red">✗ {f}</div>\n'
-        return html
-
-    grade = a["quality"]["grade"]
-    grade_color = {"A+": "#16A34A", "A": "#22C55E", "B+": "#EAB308",
-                   "B": "#F59E0B", "C": "#EF4444", "D": "#DC2626"}.get(grade, "#666")
-
-    val_score = a["valuation"]["score"]
+        parts = [f'<div class="flag green">✓ {f}</div>\n' for f in flags.get("green", [])]
+        parts += [f'<div class="flag amber">⚠ {f}</div>\n' for f in flags.get("amber", [])]
+        parts += [f'<div class="flag red">✗ {f}</div>\n' for f in flags.get("red", [])]
+        return "".join(parts)
+
+    grade = a.quality["grade"]
+    grade_color = _REPORT_GRADE_COLOR.get(grade, "#666")
+
+    val_score = a.valuation["score"]
     val_color = "#16A34A" if val_score >= 60 else "#EAB308" if val_score >= 40 else "#EF4444"
 
     # Growth table rows
-    growth_rows = ""
-    for category, vals in a.get("growth", {}).items():
+    growth_parts = []
+    for category, vals in a.growth.items():
         short_cat = (category.replace("Compounded ", "")
                              .replace("Stock Price CAGR", "Stock CAGR")
                              .replace("Return on Equity", "ROE Trend"))
-        cells = ""
-        for period, val in vals.items():
-            color = "#16A34A" if val > 10 else "#EAB308" if val > 0 else "#EF4444"
-            cells += f'<td style="color:{color}; font-weight:600">{val:+.0f}%</td>'
-        growth_rows += f'<tr><td style="color:#6B7280">{short_cat}</td>{cells}</tr>\n'
+        cells = "".join(
+            f'<td style="color:{"#16A34A" if val > 10 else "#EAB308" if val > 0 else "#EF4444"}; '
+            f'font-weight:600">{val:+.0f}%</td>'
+            for val in vals.values())
+        growth_parts.append(f'<tr><td style="color:#6B7280">{short_cat}</td>{cells}</tr>\n')
+    growth_rows = "".join(growth_parts)
 
     # Growth headers
-    growth_headers = ""
-    first_cat = next(iter(a.get("growth", {}).values()), {})
-    for period in first_cat:
-        growth_headers += f'<th>{period}</th>'
-
-    # Shareholding data for chart
-    sha = a.get("sh_analysis", {})
-    sh_data = json.dumps({
-        "promoter": sha.get("promoter_latest", 0),
-        "fii": sha.get("fii_latest", 0),
-        "dii": sha.get("dii_latest", 0),
-        "public": sha.get("public_latest", 0),
-    })
+    first_cat = next(iter(a.growth.values()), {})
+    growth_headers = "".join(f'<th>{period}</th>' for period in first_cat)
+
+    sha = a.sh_analysis
 
     # Quarterly mini-table
-    qtr = a.get("qtr_analysis", {})
+    qtr = a.qtr_analysis
     qtr_rows = ""
     if qtr.get("periods") and qtr.get("sales_history") and qtr.get("profit_history"):
         n = min(len(qtr["periods"]), len(qtr["sales_history"]), len(qtr["profit_history"]), 6)
@@ -1672,33 +1923,16 @@ def generate_html_report(data: dict, analysis: dict, sankey_html: str = "") -> s
             for v in profit_q) + "</tr>"
         qtr_rows = f"{qtr_header}\n{qtr_rev}\n{qtr_pat}"
 
-    # Valuation signals
-    val_signals = ""
-    for signal, sentiment in a["valuation"]["signals"]:
-        icon = {"bullish": "▲", "bearish": "▼", "neutral": "●", "info": "ℹ"}.get(sentiment, "●")
-        color = {"bullish": "#16A34A", "bearish": "#EF4444", "neutral": "#EAB308", "info": "#6B7280"}.get(sentiment)
-        val_signals += f'<div style="color:{color}; margin:4px 0">{icon} {signal}</div>\n'
-
-    # Technical signals
-    tech_signals = ""
-    for signal, sentiment in a["technical"]["signals"]:
-        icon = {"bullish": "▲", "bearish": "▼", "caution": "⚠", "neutral": "●", "info": "ℹ"}.get(sentiment, "●")
-        color = {"bullish": "#16A34A", "bearish": "#EF4444", "caution": "#EAB308",
-                 "neutral": "#EAB308", "info": "#6B7280"}.get(sentiment)
-        tech_signals += f'<div style="color:{color}; margin:4px 0">{icon} {signal}</div>\n'
+    # Valuation / technical signals
+    val_signals = _signal_divs(a.valuation["signals"], _REPORT_SIGNAL_STYLE, " margin:4px 0")
+    tech_signals = _signal_divs(a.technical["signals"], _REPORT_SIGNAL_STYLE, " margin:4px 0")
 
     # Peers table
     peers_html = ""
     peers = data.get("peers", [])
     if peers and len(peers) >= 2:
-        headers = [k for k in peers[0].keys() if not k.startswith("_")][:8]
-        peers_header = "<tr>" + "".join(f"<th>{h}</th>" for h in headers) + "</tr>"
-        peers_body = ""
-        for peer in peers[:10]:
-            is_self = peer.get("_ticker", "").upper() == ticker
-            style = 'style="background:#EBF5FF; font-weight:600"' if is_self else ""
-            cells = "".join(f"<td>{peer.get(h, '')}</td>" for h in headers)
-            peers_body += f"<tr {style}>{cells}</tr>\n"
+        peers_header, peers_body = _peer_rows(
+            peers, ticker, 'style="background:#EBF5FF; font-weight:600"')
         peers_html = f"""
         <div class="section">
             <h2>Peer Comparison</h2>
@@ -1716,12 +1950,7 @@ def generate_html_report(data: dict, analysis: dict, sankey_html: str = "") -> s
     docs_html = ""
     docs = data.get("documents", {})
     if docs.get("concalls") or docs.get("annual_reports"):
-        items = ""
-        for doc in docs.get("concalls", [])[:3]:
-            items += f'<div class="doc-item">📞 <a href="{doc["url"]}" target="_blank">{doc["text"][:80]}</a></div>\n'
-        for doc in docs.get("annual_reports", [])[:3]:
-            items += f'<div class="doc-item">📄 <a href="{doc["url"]}" target="_blank">{doc["text"][:80]}</a></div>\n'
-        docs_html = f'<div class="section"><h2>Recent Documents</h2>{items}</div>'
+        docs_html = f'<div class="section"><h2>Recent Documents</h2>{_doc_items(docs, 3)}</div>'
 
     # Pros/Cons
     pc = data.get("pros_cons", {})
@@ -1732,16 +1961,39 @@ def generate_html_report(data: dict, analysis: dict, sankey_html: str = "") -> s
         pc_html = f'<div class="section"><h2>Screener Pros & Cons</h2>{pros}{cons}</div>'
 
     # 52W bar
-    pos_52w = a["technical"]["pos_in_52w_range"]
+    pos_52w = a.technical["pos_in_52w_range"]
 
     # About
     about_html = ""
     if data.get("about"):
         about_html = f'<p class="about">{data["about"]}</p>'
 
-    pl = a.get("pl_analysis", {})
-    bsa = a.get("bs_analysis", {})
-    cfa = a.get("cf_analysis", {})
+    pl = a.pl_analysis
+    bsa = a.bs_analysis
+    cfa = a.cf_analysis
+
+    # Shareholding bar
+    sh_html = ""
+    promoter = sha.get("promoter_latest", 0) if sha else 0
+    if promoter != 0:
+        fii, dii, public = sha.get("fii_latest", 0), sha.get("dii_latest", 0), sha.get("public_latest", 0)
+        fii_trend = sha.get("fii_trend", "N/A")
+        fii_cls = _TREND_CLS.get(fii_trend, "")
+        sh_html = f'''
+<div class="section">
+    <h2>Shareholding Pattern</h2>
+    <div class="sh-bar">
+        <div style="width:{promoter}%; background:#16A34A">P {promoter:.0f}%</div>
+        <div style="width:{fii}%; background:#2563EB">FII {fii:.0f}%</div>
+        <div style="width:{dii}%; background:#0891B2">DII {dii:.0f}%</div>
+        <div style="width:{public}%; background:#9CA3AF">Pub {public:.0f}%</div>
+    </div>
+    <div class="metric"><span class="key">Promoter Trend</span><span class="val">{sha.get("promoter_trend", "N/A")}</span></div>
+    <div class="metric"><span class="key">FII Trend</span><span class="val{fii_cls}">{fii_trend}</span></div>
+    <div class="metric"><span class="key">DII Trend</span><span class="val">{sha.get("dii_trend", "N/A")}</span></div>
+    <div class="metric"><span class="key">Shareholders</span><span class="val">{sha.get("n_shareholders_latest", 0):,.0f}</span></div>
+</div>
+'''
 
     html = f"""<!DOCTYPE html>
 <html lang="en">
@@ -1750,63 +2002,14 @@ def generate_html_report(data: dict, analysis: dict, sankey_html: str = "") -> s
 <meta name="viewport" content="width=device-width, initial-scale=1.0">
 <title>{company} ({ticker}) — Company Screener</title>
 <style>
-:root {{
-    --green: #16A34A; --red: #EF4444; --amber: #EAB308;
-    --blue: #2563EB; --grey: #6B7280; --light: #F9FAFB;
-    --border: #E5E7EB;
-}}
-* {{ margin:0; padding:0; box-sizing:border-box; }}
-body {{ font-family: 'Segoe UI', -apple-system, sans-serif; background:#F3F4F6; color:#1F2937; }}
-.container {{ max-width:1100px; margin:0 auto; padding:20px; }}
-.header {{ background:linear-gradient(135deg, #1E3A5F, #2563EB); color:white; padding:32px; border-radius:16px; margin-bottom:20px; }}
-.header h1 {{ font-size:28px; margin-bottom:4px; }}
-.header .sub {{ font-size:14px; opacity:0.8; }}
-.about {{ font-size:13px; color:#9CA3AF; margin-top:10px; line-height:1.5; }}
-.scorecard {{ display:flex; gap:16px; margin-bottom:20px; }}
-.score-card {{ flex:1; background:white; border-radius:12px; padding:20px; text-align:center; box-shadow:0 1px 3px rgba(0,0,0,0.1); }}
-.score-card .label {{ font-size:12px; color:var(--grey); text-transform:uppercase; letter-spacing:1px; }}
-.score-card .value {{ font-size:36px; font-weight:800; margin:8px 0; }}
-.score-card .desc {{ font-size:13px; color:var(--grey); }}
-.grid {{ display:grid; grid-template-columns:1fr 1fr; gap:16px; margin-bottom:20px; }}
-@media (max-width:768px) {{ .grid {{ grid-template-columns:1fr; }} }}
-.section {{ background:white; border-radius:12px; padding:20px; box-shadow:0 1px 3px rgba(0,0,0,0.1); margin-bottom:16px; }}
-.section h2 {{ font-size:16px; color:#1E3A5F; margin-bottom:12px; border-bottom:2px solid var(--border); padding-bottom:8px; }}
-.metric {{ display:flex; justify-content:space-between; padding:6px 0; border-bottom:1px solid #F3F4F6; }}
-.metric .key {{ color:var(--grey); font-size:13px; }}
-.metric .val {{ font-weight:600; font-size:14px; }}
-.positive {{ color:var(--green); }}
-.negative {{ color:var(--red); }}
-.neutral {{ color:var(--amber); }}
-.flag {{ padding:6px 12px; margin:4px 0; border-radius:6px; font-size:13px; }}
-.flag.green {{ background:#F0FDF4; color:#166534; border-left:3px solid var(--green); }}
-.flag.red {{ background:#FEF2F2; color:#991B1B; border-left:3px solid var(--red); }}
-.flag.amber {{ background:#FFFBEB; color:#92400E; border-left:3px solid var(--amber); }}
-.data-table {{ width:100%; border-collapse:collapse; font-size:13px; }}
-.data-table th {{ text-align:right; padding:6px 8px; background:#F9FAFB; color:var(--grey); font-size:12px; border-bottom:2px solid var(--border); }}
-.data-table td {{ text-align:right; padding:6px 8px; border-bottom:1px solid #F3F4F6; }}
-.data-table td:first-child, .data-table th:first-child {{ text-align:left; }}
-.bar-52w {{ height:8px; background:#E5E7EB; border-radius:4px; position:relative; margin:10px 0; }}
-.bar-52w .fill {{ height:100%; border-radius:4px; }}
-.bar-52w .labels {{ display:flex; justify-content:space-between; font-size:11px; color:var(--grey); }}
-.segment-tag {{ display:inline-block; background:#EBF5FF; color:#2563EB; padding:4px 12px; border-radius:20px; margin:4px; font-size:13px; }}
-.segments {{ display:flex; flex-wrap:wrap; gap:4px; }}
-.doc-item {{ padding:4px 0; font-size:13px; }}
-.doc-item a {{ color:var(--blue); text-decoration:none; }}
-.doc-item a:hover {{ text-decoration:underline; }}
-.pro {{ color:#166534; padding:3px 0; font-size:13px; }}
-.con {{ color:#991B1B; padding:3px 0; font-size:13px; }}
-.footer {{ text-align:center; color:var(--grey); font-size:12px; padding:20px; }}
-.footer a {{ color:var(--blue); text-decoration:none; }}
-.sh-bar {{ display:flex; height:24px; border-radius:6px; overflow:hidden; margin:10px 0; }}
-.sh-bar > div {{ display:flex; align-items:center; justify-content:center; font-size:11px; color:white; font-weight:600; }}
-</style>
+{_REPORT_CSS}</style>
 </head>
 <body>
 <div class="container">
 
 <div class="header">
     <h1>{company}</h1>
-    <div class="sub">{ticker} · {cons} · {data.get('fetched_at', '')[:10]}</div>
+    <div class="sub">{ticker} · {cons_label} · {data.get('fetched_at', '')[:10]}</div>
     {about_html}
 </div>
 
@@ -1814,38 +2017,38 @@ body {{ font-family: 'Segoe UI', -apple-system, sans-serif; background:#F3F4F6;
     <div class="score-card">
         <div class="label">Quality Grade</div>
         <div class="value" style="color:{grade_color}">{grade}</div>
-        <div class="desc">Score: {a['quality']['score']}/100</div>
+        <div class="desc">Score: {a.quality['score']}/100</div>
     </div>
     <div class="score-card">
         <div class="label">Valuation</div>
-        <div class="value" style="color:{val_color}; font-size:24px">{a['valuation']['verdict']}</div>
+        <div class="value" style="color:{val_color}; font-size:24px">{a.valuation['verdict']}</div>
         <div class="desc">Score: {val_score}/100</div>
     </div>
     <div class="score-card">
         <div class="label">Market Cap</div>
-        <div class="value" style="font-size:22px; color:#1E3A5F">{fmt_cr(a['market_cap'])}</div>
-        <div class="desc">Price: ₹{a['current_price']:,.0f}</div>
+        <div class="value" style="font-size:22px; color:#1E3A5F">{fmt_cr(a.market_cap)}</div>
+        <div class="desc">Price: ₹{a.current_price:,.0f}</div>
     </div>
     <div class="score-card">
         <div class="label">P/E Ratio</div>
-        <div class="value" style="font-size:28px">{a['pe']:.1f}</div>
-        <div class="desc">P/B: {a['pb']:.2f} · Div: {a['div_yield']:.1f}%</div>
+        <div class="value" style="font-size:28px">{a.pe:.1f}</div>
+        <div class="desc">P/B: {a.pb:.2f} · Div: {a.div_yield:.1f}%</div>
     </div>
 </div>
 
 <div class="grid">
 <div class="section">
     <h2>Key Metrics</h2>
-    <div class="metric"><span class="key">Current Price</span><span class="val">₹{a['current_price']:,.0f}</span></div>
-    <div class="metric"><span class="key">52W High / Low</span><span class="val">₹{a['high_52w']:,.0f} / ₹{a['low_52w']:,.0f}</span></div>
-    <div class="metric"><span class="key">Book Value</span><span class="val">₹{a['book_value']:,.0f}</span></div>
-    <div class="metric"><span class="key">ROCE</span><span class="val {'positive' if a['roce']>15 else 'negative' if a['roce']<10 else ''}">{a['roce']:.1f}%</span></div>
-    <div class="metric"><span class="key">ROE</span><span class="val {'positive' if a['roe']>15 else 'negative' if a['roe']<10 else ''}">{a['roe']:.1f}%</span></div>
-    <div class="metric"><span class="key">Dividend Yield</span><span class="val">{a['div_yield']:.2f}%</span></div>
+    <div class="metric"><span class="key">Current Price</span><span class="val">₹{a.current_price:,.0f}</span></div>
+    <div class="metric"><span class="key">52W High / Low</span><span class="val">₹{a.high_52w:,.0f} / ₹{a.low_52w:,.0f}</span></div>
+    <div class="metric"><span class="key">Book Value</span><span class="val">₹{a.book_value:,.0f}</span></div>
+    <div class="metric"><span class="key">ROCE</span><span class="val {'positive' if a.roce>15 else 'negative' if a.roce<10 else ''}">{a.roce:.1f}%</span></div>
+    <div class="metric"><span class="key">ROE</span><span class="val {'positive' if a.roe>15 else 'negative' if a.roe<10 else ''}">{a.roe:.1f}%</span></div>
+    <div class="metric"><span class="key">Dividend Yield</span><span class="val">{a.div_yield:.2f}%</span></div>
     <div class="bar-52w">
         <div class="fill" style="width:{pos_52w*100:.0f}%; background:{'var(--green)' if pos_52w > 0.6 else 'var(--red)' if pos_52w < 0.3 else 'var(--amber)'}"></div>
     </div>
-    <div class="bar-52w labels"><span>₹{a['low_52w']:,.0f}</span><span>₹{a['current_price']:,.0f}</span><span>₹{a['high_52w']:,.0f}</span></div>
+    <div class="bar-52w labels"><span>₹{a.low_52w:,.0f}</span><span>₹{a.current_price:,.0f}</span><span>₹{a.high_52w:,.0f}</span></div>
 </div>
 
 <div class="section">
@@ -1879,21 +2082,7 @@ body {{ font-family: 'Segoe UI', -apple-system, sans-serif; background:#F3F4F6;
 </div>
 
 <!-- Shareholding -->
-{"" if not sha or sha.get("promoter_latest", 0) == 0 else f'''
-<div class="section">
-    <h2>Shareholding Pattern</h2>
-    <div class="sh-bar">
-        <div style="width:{sha.get("promoter_latest",0)}%; background:#16A34A">P {sha.get("promoter_latest",0):.0f}%</div>
-        <div style="width:{sha.get("fii_latest",0)}%; background:#2563EB">FII {sha.get("fii_latest",0):.0f}%</div>
-        <div style="width:{sha.get("dii_latest",0)}%; background:#0891B2">DII {sha.get("dii_latest",0):.0f}%</div>
-        <div style="width:{sha.get("public_latest",0)}%; background:#9CA3AF">Pub {sha.get("public_latest",0):.0f}%</div>
-    </div>
-    <div class="metric"><span class="key">Promoter Trend</span><span class="val">{sha.get("promoter_trend", "N/A")}</span></div>
-    <div class="metric"><span class="key">FII Trend</span><span class="val {'positive' if sha.get("fii_trend")=="increasing" else 'negative' if sha.get("fii_trend")=="decreasing" else ""}">{sha.get("fii_trend", "N/A")}</span></div>
-    <div class="metric"><span class="key">DII Trend</span><span class="val">{sha.get("dii_trend", "N/A")}</span></div>
-    <div class="metric"><span class="key">Shareholders</span><span class="val">{sha.get("n_shareholders_latest", 0):,.0f}</span></div>
-</div>
-'''}
+{sh_html}
 
 <!-- Growth Table -->
 {"" if not growth_rows else f'''
@@ -1930,7 +2119,7 @@ body {{ font-family: 'Segoe UI', -apple-system, sans-serif; background:#F3F4F6;
 
 <div class="section">
     <h2>Flags</h2>
-    {flag_html(a['flags'])}
+    {flag_html(a.flags)}
 </div>
 
 {f'''
@@ -1946,7 +2135,7 @@ body {{ font-family: 'Segoe UI', -apple-system, sans-serif; background:#F3F4F6;
 {docs_html}
 
 <div class="footer">
-    <p>Source: <a href="{data['url']}">screener.in/{ticker}</a> · Generated {datetime.now().strftime('%d %b %Y %H:%M')}</p>
+    <p>Source: <a href="{data['url']}">screener.in/{ticker}</a> · Generated {generated_at}</p>
     <p>Company Screener v1.0 · For informational purposes only. Not investment advice.</p>
 </div>
 </div>
@@ -1960,38 +2149,154 @@ body {{ font-family: 'Segoe UI', -apple-system, sans-serif; background:#F3F4F6;
 # CHARTS & DASHBOARD
 # ═══════════════════════════════════════════════════════════════════════════════
 
-def _generate_charts(data: dict, ticker: str = "") -> dict:
-    """Generate Plotly chart HTML divs for dashboard embedding."""
+# The memo dicts below are shared by --serve request threads and the main() pool;
+# inserts and FIFO evictions go through _cache_put under this lock
+_CACHE_LOCK = threading.Lock()
+
+
+def _cache_put(cache: dict, key, value, max_size: int) -> None:
+    """Store value, evicting the oldest entry first when the cache is full."""
+    with _CACHE_LOCK:
+        if key not in cache and len(cache) >= max_size:
+            cache.pop(next(iter(cache)), None)
+        cache[key] = value
+
+
+# Rendered charts keyed on (ticker, day, digest of chart inputs); --serve re-adds tickers often
+_CHART_CACHE = {}
+_CHART_CACHE_MAX = 128
+_CHART_SECTIONS = ("profit_loss", "quarterly", "ratios", "shareholding", "cash_flow")
+# Income-flow Sankey divs keyed on a digest of the fields the figure is drawn from
+_SANKEY_CACHE = {}
+
+
+# Layout shared by the six fundamentals charts; update_layout copies it, so it is never mutated
+_CHART_LAYOUT = dict(
+    template="plotly_white", height=300,
+    margin=dict(l=50, r=20, t=35, b=50),
+    font=dict(family="Segoe UI, sans-serif", size=11),
+    legend=dict(orientation="h", y=-0.2, x=0.5, xanchor="center"),
+    plot_bgcolor="rgba(0,0,0,0)", paper_bgcolor="rgba(0,0,0,0)",
+)
+
+# Dashboard palette (slightly different from the standalone HTML report's)
+_PANE_GRADE_COLOR = {"A+": "#10B981", "A": "#22C55E", "B+": "#F59E0B",
+                     "B": "#F59E0B", "C": "#EF4444", "D": "#DC2626"}
+_PANE_SIGNAL_STYLE = {"bullish": ("▲", "#10B981"), "bearish": ("▼", "#EF4444"),
+                      "caution": ("⚠", "#F59E0B"), "neutral": ("●", "#F59E0B"),
+                      "info": ("ℹ", "#64748B")}
+
+# yfinance OHLCV history is pickled here so dashboard rebuilds within a day skip the network
+PRICE_CACHE_DIR = Path(__file__).parent / ".yf_cache"
+PRICE_CACHE_EXPIRY_SECS = 24 * 3600
+
+# Max simultaneous yfinance history pulls; every _generate_charts period pool shares these
+MAX_CONCURRENT_HISTORY = 4
+_HISTORY_SLOTS = threading.BoundedSemaphore(MAX_CONCURRENT_HISTORY)
+
+
+def _cached_history(symbol: str, period: str):
+    """yf.Ticker(symbol).history(period), served from PRICE_CACHE_DIR while fresh.
+
+    Network pulls hold one of _HISTORY_SLOTS, so the per-stock period pools of
+    --workers parallel _attach_visuals calls stay within MAX_CONCURRENT_HISTORY.
+    """
+    import pandas as pd
+    import yfinance as yf
+    path = PRICE_CACHE_DIR / f"{_RE_NON_FILENAME.sub('_', symbol)}_{period}.pkl"
     try:
-        import plotly.graph_objects as go
-    except ImportError:
-        return {}
+        if time.time() - path.stat().st_mtime < PRICE_CACHE_EXPIRY_SECS:
+            return pd.read_pickle(path)
+    except Exception:
+        pass  # missing or unreadable — refetch
+    with _HISTORY_SLOTS:
+        hist = yf.Ticker(symbol).history(period=period)
+    if hist is not None and len(hist):
+        try:
+            PRICE_CACHE_DIR.mkdir(exist_ok=True)
+            hist.to_pickle(path)
+        except OSError:
+            pass
+    return hist
+
+
+@lru_cache(maxsize=1)
+def _chart_template() -> dict:
+    """plotly_white as a plain dict, resolved and validated once per process."""
+    import plotly.io as pio
+    return pio.templates[_CHART_LAYOUT["template"]].to_plotly_json()
+
+
+def _new_fig(title: str, **layout):
+    """Empty figure with the shared chart layout.
+
+    Layout validation (mostly re-checking the whole plotly_white template) dominated
+    figure construction, so the template goes in pre-resolved and the layout is taken
+    as-is. Spell layout keys out in full (yaxis_title_text, not yaxis_title): only the
+    validator expands the shorthand. Traces still validate in their own constructors.
+    """
+    return go.Figure(layout={**_CHART_LAYOUT, "template": _chart_template(),
+                             "title_text": title, **layout}, _validate=False)
+
+
+def _bicolor(values, pos: str = "#10B981", neg: str = "#EF4444"):
+    """Green/red per value (>= 0 is green); numpy only pays off on long series like daily bars."""
+    if len(values) >= 32:
+        import numpy as np
+        return np.where(np.asarray(values) >= 0, pos, neg)
+    return [pos if v >= 0 else neg for v in values]
+
+
+def _digest(obj) -> str:
+    """Short stable hash of JSON-able data, used as a render-cache key."""
+    blob = json.dumps(obj, sort_keys=True, default=str)
+    return hashlib.blake2b(blob.encode(), digest_size=16).hexdigest()
+
+
+def _charts_key(data: dict, ticker: str) -> tuple:
+    """Cache key for _generate_charts; the day bucket keeps price charts from going stale."""
+    return ticker, datetime.now().strftime("%Y-%m-%d"), _digest([data.get(k) for k in _CHART_SECTIONS])
+
+
+def _generate_charts(data: dict, ticker: str = "") -> dict:
+    """Generate Plotly chart HTML divs for dashboard embedding (memoized per day)."""
+    key = _charts_key(data, ticker)
+    charts = _CHART_CACHE.get(key)
+    if charts is None:
+        charts, complete = _render_charts(data, ticker)
+        # A price pull that errored is retried next call rather than pinned for the day
+        if charts and complete:
+            _cache_put(_CHART_CACHE, key, charts, _CHART_CACHE_MAX)
+    return dict(charts)
+
+
+def _render_charts(data: dict, ticker: str) -> tuple:
+    """
+    Build every Plotly chart for one stock.
+    Returns (charts, complete); complete is False when a price-history pull raised or
+    came back with no price chart at all (yfinance turns network errors into empty frames).
+    """
+    if go is None:
+        return {}, False
 
     charts = {}
-    L = dict(
-        template="plotly_white", height=300,
-        margin=dict(l=50, r=20, t=35, b=50),
-        font=dict(family="Segoe UI, sans-serif", size=11),
-        legend=dict(orientation="h", y=-0.2, x=0.5, xanchor="center"),
-        plot_bgcolor="rgba(0,0,0,0)", paper_bgcolor="rgba(0,0,0,0)",
-    )
+    complete = True
 
-    def rv(section, label):
-        for key, vals in section.get("rows", {}).items():
-            if label.lower() in key.lower():
+    def rv(rows, label):
+        label = label.lower()
+        for key, vals in rows.items():
+            if label in key:
                 return [parse_number(v) for v in vals]
         return []
 
     # 0. Price charts via yfinance — multiple periods (1y, 3y, 5y, max)
     if ticker:
         try:
-            import yfinance as yf
-            from plotly.subplots import make_subplots
-            # Try NSE first, then BSE
-            yf_obj = None
+            # Try NSE first, then BSE (the probe is cached too, so reruns skip it)
+            symbol = None
             for suffix in [".NS", ".BO"]:
-                yf_obj = yf.Ticker(f"{ticker}{suffix}")
-                test = yf_obj.history(period="5d")
+                symbol = f"{ticker}{suffix}"
+                test = _cached_history(symbol, "5d")
                 if test is not None and len(test) >= 1:
                     break
             period_map = [
@@ -2000,103 +2305,110 @@ def _generate_charts(data: dict, ticker: str = "") -> dict:
                 ("5y", "5 Years"),
                 ("max", "All Time"),
             ]
-            for period_key, period_label in period_map:
-                try:
-                    hist = yf_obj.history(period=period_key)
-                except Exception:
-                    continue
-                if hist is None or len(hist) < 10:
-                    continue
-                fig = make_subplots(rows=2, cols=1, shared_xaxes=True,
-                                    vertical_spacing=0.03,
-                                    row_heights=[0.75, 0.25])
-                fig.add_trace(go.Candlestick(
-                    x=hist.index, open=hist["Open"], high=hist["High"],
-                    low=hist["Low"], close=hist["Close"], name="Price",
-                    increasing_line_color="#10B981", decreasing_line_color="#EF4444",
-                ), row=1, col=1)
-                if len(hist) >= 20:
-                    fig.add_trace(go.Scatter(
-                        x=hist.index, y=hist["Close"].rolling(20).mean(),
-                        name="MA20", line=dict(color="#3B82F6", width=1.2),
-                        mode="lines"), row=1, col=1)
-                if len(hist) >= 50:
-                    fig.add_trace(go.Scatter(
-                        x=hist.index, y=hist["Close"].rolling(50).mean(),
-                        name="MA50", line=dict(color="#F59E0B", width=1.2),
-                        mode="lines"), row=1, col=1)
-                vol_colors = ["#10B981" if c >= o else "#EF4444"
-                              for c, o in zip(hist["Close"], hist["Open"])]
-                fig.add_trace(go.Bar(
-                    x=hist.index, y=hist["Volume"], name="Volume",
-                    marker_color=vol_colors, opacity=0.5,
-                ), row=2, col=1)
-                fig.update_layout(
-                    template="plotly_white", height=420,
-                    margin=dict(l=50, r=20, t=35, b=30),
-                    font=dict(family="Segoe UI, sans-serif", size=11),
-                    legend=dict(orientation="h", y=1.02, x=0.5, xanchor="center"),
-                    plot_bgcolor="rgba(0,0,0,0)", paper_bgcolor="rgba(0,0,0,0)",
-                    title_text=f"{ticker} — {period_label}",
-                    xaxis_rangeslider_visible=False,
-                    yaxis_title="Price (₹)", yaxis2_title="Volume",
-                    showlegend=True,
-                )
-                charts[f"price_{period_key}"] = fig.to_html(full_html=False, include_plotlyjs=False)
+            # The four history pulls are network-bound; overlap them and build figures in order
+            with ThreadPoolExecutor(max_workers=len(period_map)) as pool:
+                pending = [(pk, label, pool.submit(_cached_history, symbol, pk))
+                           for pk, label in period_map]
+                for period_key, period_label, fut in pending:
+                    try:
+                        hist = fut.result()
+                    except Exception:
+                        complete = False
+                        continue
+                    if hist is None or len(hist) < 10:
+                        continue
+                    fig = make_subplots(rows=2, cols=1, shared_xaxes=True,
+                                        vertical_spacing=0.03,
+                                        row_heights=[0.75, 0.25])
+                    fig.add_trace(go.Candlestick(
+                        x=hist.index, open=hist["Open"], high=hist["High"],
+                        low=hist["Low"], close=hist["Close"], name="Price",
+                        increasing_line_color="#10B981", decreasing_line_color="#EF4444",
+                    ), row=1, col=1)
+                    close = hist["Close"]
+                    if len(hist) >= 20:
+                        fig.add_trace(go.Scatter(
+                            x=hist.index, y=close.rolling(20).mean().to_numpy(),
+                            name="MA20", line=dict(color="#3B82F6", width=1.2),
+                            mode="lines"), row=1, col=1)
+                    if len(hist) >= 50:
+                        fig.add_trace(go.Scatter(
+                            x=hist.index, y=close.rolling(50).mean().to_numpy(),
+                            name="MA50", line=dict(color="#F59E0B", width=1.2),
+                            mode="lines"), row=1, col=1)
+                    vol_colors = _bicolor(close.to_numpy() - hist["Open"].to_numpy())
+                    fig.add_trace(go.Bar(
+                        x=hist.index, y=hist["Volume"].to_numpy(), name="Volume",
+                        marker_color=vol_colors, opacity=0.5,
+                    ), row=2, col=1)
+                    fig.update_layout(
+                        template="plotly_white", height=420,
+                        margin=dict(l=50, r=20, t=35, b=30),
+                        font=dict(family="Segoe UI, sans-serif", size=11),
+                        legend=dict(orientation="h", y=1.02, x=0.5, xanchor="center"),
+                        plot_bgcolor="rgba(0,0,0,0)", paper_bgcolor="rgba(0,0,0,0)",
+                        title_text=f"{ticker} — {period_label}",
+                        xaxis_rangeslider_visible=False,
+                        yaxis_title="Price (₹)", yaxis2_title="Volume",
+                        showlegend=True,
+                    )
+                    charts[f"price_{period_key}"] = _figure_html(fig)
+        except ImportError:
+            pass  # yfinance not installed
         except Exception:
-            pass  # yfinance not available or ticker not found
+            complete = False  # Yahoo error: show the fundamentals now, retry prices later
 
     # 1. Annual Revenue & Net Profit
     pl = data.get("profit_loss", {})
     periods = pl.get("periods", [])
-    sales = rv(pl, "sales") or rv(pl, "revenue")
-    profit = rv(pl, "net profit")
+    pl_rows = _index_rows(pl)
+    sales = rv(pl_rows, "sales") or rv(pl_rows, "revenue")
+    profit = rv(pl_rows, "net profit")
     if periods and sales:
         n = min(len(periods), len(sales))
-        fig = go.Figure()
+        fig = _new_fig("Revenue & Net Profit (₹ Cr)", barmode="group")
         fig.add_trace(go.Bar(x=periods[:n], y=sales[:n], name="Revenue", marker_color="#3B82F6"))
         if profit:
             m = min(n, len(profit))
             fig.add_trace(go.Bar(x=periods[:m], y=profit[:m], name="Net Profit", marker_color="#10B981"))
-        fig.update_layout(**L, barmode="group", title_text="Revenue & Net Profit (₹ Cr)")
-        charts["annual_pl"] = fig.to_html(full_html=False, include_plotlyjs=False)
+        charts["annual_pl"] = _figure_html(fig)
 
     # 2. Quarterly Revenue & Profit
     q = data.get("quarterly", {})
     qp = q.get("periods", [])
-    qs = rv(q, "sales") or rv(q, "revenue")
-    qn = rv(q, "net profit")
+    q_rows = _index_rows(q)
+    qs = rv(q_rows, "sales") or rv(q_rows, "revenue")
+    qn = rv(q_rows, "net profit")
     if qp and qs:
         n = min(len(qp), len(qs), 8)
-        fig = go.Figure()
+        fig = _new_fig("Quarterly Revenue & Net Profit (₹ Cr)", barmode="group")
         fig.add_trace(go.Bar(x=qp[-n:], y=qs[-n:], name="Revenue", marker_color="#60A5FA"))
         if qn:
             qn8 = qn[-n:]
             fig.add_trace(go.Bar(x=qp[-n:], y=qn8, name="Net Profit",
-                                 marker_color=["#10B981" if v >= 0 else "#EF4444" for v in qn8]))
-        fig.update_layout(**L, barmode="group", title_text="Quarterly Revenue & Net Profit (₹ Cr)")
-        charts["quarterly"] = fig.to_html(full_html=False, include_plotlyjs=False)
+                                 marker_color=_bicolor(qn8)))
+        charts["quarterly"] = _figure_html(fig)
 
     # 3. Margins
-    opm = rv(pl, "OPM") or rv(pl, "Financing Margin")
+    opm = rv(pl_rows, "OPM") or rv(pl_rows, "Financing Margin")
     if periods and opm and sales and profit:
         n = min(len(periods), len(opm), len(sales), len(profit))
-        npm = [(profit[i] / sales[i] * 100 if sales[i] > 0 else 0) for i in range(n)]
-        fig = go.Figure()
+        npm = [p / s * 100 if s > 0 else 0 for p, s in zip(profit[:n], sales[:n])]
+        fig = _new_fig("Margin Trends (%)", yaxis_title_text="%")
         fig.add_trace(go.Scatter(x=periods[:n], y=opm[:n], name="OPM %", mode="lines+markers",
                                  line=dict(color="#3B82F6", width=2.5)))
         fig.add_trace(go.Scatter(x=periods[:n], y=npm, name="NPM %", mode="lines+markers",
                                  line=dict(color="#10B981", width=2.5)))
-        fig.update_layout(**L, title_text="Margin Trends (%)", yaxis_title="%")
-        charts["margins"] = fig.to_html(full_html=False, include_plotlyjs=False)
+        charts["margins"] = _figure_html(fig)
 
     # 4. ROCE / ROE
     ratios = data.get("ratios", {})
     rp = ratios.get("periods", [])
-    roce = rv(ratios, "ROCE %")
-    roe = rv(ratios, "ROE %")
+    ratio_rows = _index_rows(ratios)
+    roce = rv(ratio_rows, "ROCE %")
+    roe = rv(ratio_rows, "ROE %")
     if rp and (roce or roe):
-        fig = go.Figure()
+        fig = _new_fig("Return Ratios (%)", yaxis_title_text="%")
         if roce:
             nr = min(len(rp), len(roce))
             fig.add_trace(go.Scatter(x=rp[:nr], y=roce[:nr], name="ROCE %", mode="lines+markers",
@@ -2106,33 +2418,32 @@ def _generate_charts(data: dict, ticker: str = "") -> dict:
             fig.add_trace(go.Scatter(x=rp[:nr], y=roe[:nr], name="ROE %", mode="lines+markers",
                                      line=dict(color="#10B981", width=2.5)))
         fig.add_hline(y=15, line_dash="dash", line_color="#9CA3AF", annotation_text="15%")
-        fig.update_layout(**L, title_text="Return Ratios (%)", yaxis_title="%")
-        charts["returns"] = fig.to_html(full_html=False, include_plotlyjs=False)
+        charts["returns"] = _figure_html(fig)
 
     # 5. Shareholding
     sh = data.get("shareholding", {})
     shp = sh.get("periods", [])
     shd = sh.get("data", {})
     if shp and shd:
-        fig = go.Figure()
+        fig = _new_fig("Shareholding Pattern (%)", barmode="stack")
         for color, cat in [("#16A34A", "Promoters"), ("#3B82F6", "FIIs"), ("#0891B2", "DIIs"),
                            ("#9CA3AF", "Public"), ("#8B5CF6", "Government")]:
             vals = [parse_number(v) for v in shd.get(cat, [])]
             if vals:
                 ns = min(len(shp), len(vals))
                 fig.add_trace(go.Bar(x=shp[:ns], y=vals[:ns], name=cat, marker_color=color))
-        fig.update_layout(**L, barmode="stack", title_text="Shareholding Pattern (%)")
-        charts["shareholding"] = fig.to_html(full_html=False, include_plotlyjs=False)
+        charts["shareholding"] = _figure_html(fig)
 
     # 6. Cash Flow
     cf = data.get("cash_flow", {})
     cfp = cf.get("periods", [])
-    cfo = rv(cf, "cash from operating")
-    cfi = rv(cf, "cash from investing")
-    cff = rv(cf, "cash from financing")
+    cf_rows = _index_rows(cf)
+    cfo = rv(cf_rows, "cash from operating")
+    cfi = rv(cf_rows, "cash from investing")
+    cff = rv(cf_rows, "cash from financing")
     if cfp and cfo:
         n = min(len(cfp), len(cfo))
-        fig = go.Figure()
+        fig = _new_fig("Cash Flow Trend (₹ Cr)", barmode="group")
         fig.add_trace(go.Bar(x=cfp[:n], y=cfo[:n], name="Operating", marker_color="#10B981"))
         if cfi:
             fig.add_trace(go.Bar(x=cfp[:min(n, len(cfi))], y=cfi[:min(n, len(cfi))],
@@ -2140,96 +2451,112 @@ def _generate_charts(data: dict, ticker: str = "") -> dict:
         if cff:
             fig.add_trace(go.Bar(x=cfp[:min(n, len(cff))], y=cff[:min(n, len(cff))],
                                  name="Financing", marker_color="#3B82F6"))
-        fig.update_layout(**L, barmode="group", title_text="Cash Flow Trend (₹ Cr)")
-        charts["cashflow"] = fig.to_html(full_html=False, include_plotlyjs=False)
-
-    return charts
+        charts["cashflow"] = _figure_html(fig)
+
+    if ticker and not any(k.startswith("price_") for k in charts):
+        complete = False
+    return charts, complete
+
+
+def _figure_html(fig) -> str:
+    """Chart div plus a deferred Plotly.newPlot call, without going through fig.to_html()."""
+    div_id = uuid.uuid4().hex
+    height = fig.layout.height
+    outer = f"height:{height}px; width:100%;" if height else "height:100%; width:100%;"
+    return (f'<div style="{outer}"><div id="{div_id}" class="plotly-graph-div" '
+            f'style="height:100%; width:100%;"></div>'
+            f'<script type="text/plotly-deferred">(function(f){{Plotly.newPlot("{div_id}", '
+            f'f.data, f.layout, {{"responsive": true}});}})({fig.to_json(validate=False)});</script></div>')
+
+
+def _sankey_html(data: dict, ticker: str) -> str:
+    """Income-flow Sankey div for one stock (memoized); raises if income_sankey can't draw it."""
+    key = _digest([ticker, data["company_name"], data["is_consolidated"], data.get("profit_loss"),
+                   data.get("segments"), data.get("expense_breakdown")])
+    html = _SANKEY_CACHE.get(key)
+    if html is None:
+        # Lazy: income_sankey sets up its own HTTP session, which terminal runs don't need
+        from income_sankey import get_period_data, build_sankey
+        sankey_data = dict(data)
+        sankey_data["annual"] = sankey_data.get("profit_loss", {})
+        pl_sankey = get_period_data(sankey_data, "annual")
+        fig = build_sankey(
+            pl_sankey, data["company_name"], ticker,
+            data["is_consolidated"], "",
+            data.get("segments"), data.get("expense_breakdown"),
+        )
+        html = _figure_html(fig)
+        _cache_put(_SANKEY_CACHE, key, html, _CHART_CACHE_MAX)
+    return html
 
 
 def _defer_plotly(html: str) -> str:
     """Convert inline <script> tags to deferred so they don't auto-execute on page load."""
-    return re.sub(r'<script\b[^>]*>', '<script type="text/plotly-deferred">', html)
+    # Plotly's to_html opens scripts with one of these two literal tags (older / newer releases)
+    deferred = '<script type="text/plotly-deferred">'
+    return html.replace('<script type="text/javascript">', deferred).replace("<script>", deferred)
 
 
-def _build_stock_pane(data: dict, analysis: dict, charts: dict,
-                      sankey_html: str, active: bool = False) -> str:
+def _build_stock_pane(data: dict, analysis: Analysis, charts: dict,
+                      sankey_html: str, active: bool = False, generated_at: str = None) -> str:
     """Build the HTML content for one stock's dashboard tab pane."""
     d = data
+    generated_at = generated_at or _generated_stamp()
     a = analysis
     ticker = d["ticker"]
     company = d["company_name"]
-    cons_label = "Consolidated" if d["is_consolidated"] else "Standalone"
+    cons_label = _CONS_LABEL[bool(d["is_consolidated"])]
     display = "block" if active else "none"
 
-    grade = a["quality"]["grade"]
-    grade_color = {"A+": "#10B981", "A": "#22C55E", "B+": "#F59E0B",
-                   "B": "#F59E0B", "C": "#EF4444", "D": "#DC2626"}.get(grade, "#64748B")
-    val_score = a["valuation"]["score"]
+    grade = a.quality["grade"]
+    grade_color = _PANE_GRADE_COLOR.get(grade, "#64748B")
+    val_score = a.valuation["score"]
     val_color = "#10B981" if val_score >= 60 else "#F59E0B" if val_score >= 40 else "#EF4444"
-    pos_52w = a["technical"]["pos_in_52w_range"]
+    pos_52w = a.technical["pos_in_52w_range"]
     fill_color = "var(--green)" if pos_52w > 0.6 else "var(--red)" if pos_52w < 0.3 else "var(--amber)"
 
     # Pre-compute CSS classes
-    roce_cls = " positive" if a["roce"] > 15 else (" negative" if a["roce"] < 10 else "")
-    roe_cls = " positive" if a["roe"] > 15 else (" negative" if a["roe"] < 10 else "")
+    roce_cls = " positive" if a.roce > 15 else (" negative" if a.roce < 10 else "")
+    roe_cls = " positive" if a.roe > 15 else (" negative" if a.roe < 10 else "")
 
-    pl = a.get("pl_analysis", {})
-    bsa = a.get("bs_analysis", {})
-    cfa = a.get("cf_analysis", {})
+    pl = a.pl_analysis
+    bsa = a.bs_analysis
+    cfa = a.cf_analysis
     np_cls = " positive" if pl.get("net_profit_latest", 0) > 0 else " negative"
-    de_cls = " positive" if bsa.get("de_ratio", 0) < 0.5 else (" negative" if bsa.get("de_ratio", 0) > 1.5 else "")
+    de_ratio = bsa.get("de_ratio", 0)
+    de_cls = " positive" if de_ratio < 0.5 else (" negative" if de_ratio > 1.5 else "")
     cfo_cls = " positive" if cfa.get("cfo_latest", 0) > 0 else " negative"
     fcf_cls = " positive" if cfa.get("fcf_latest", 0) > 0 else " negative"
 
     # Flags
-    flags_html = ""
-    for f_ in a["flags"].get("green", []):
-        flags_html += f'<div class="flag green">✓ {f_}</div>\n'
-    for f_ in a["flags"].get("amber", []):
-        flags_html += f'<div class="flag amber">⚠ {f_}</div>\n'
-    for f_ in a["flags"].get("red", []):
-        flags_html += f'<div class="flag red">✗ {f_}</div>\n'
+    flag_parts = [f'<div class="flag green">✓ {f_}</div>\n' for f_ in a.flags.get("green", [])]
+    flag_parts += [f'<div class="flag amber">⚠ {f_}</div>\n' for f_ in a.flags.get("amber", [])]
+    flag_parts += [f'<div class="flag red">✗ {f_}</div>\n' for f_ in a.flags.get("red", [])]
+    flags_html = "".join(flag_parts)
 
     # Signals
-    val_signals = ""
-    for signal, sentiment in a["valuation"]["signals"]:
-        icon = {"bullish": "▲", "bearish": "▼", "neutral": "●", "info": "ℹ"}.get(sentiment, "●")
-        clr = {"bullish": "#10B981", "bearish": "#EF4444", "neutral": "#F59E0B", "info": "#64748B"}.get(sentiment)
-        val_signals += f'<div style="color:{clr};margin:3px 0;font-size:13px">{icon} {signal}</div>\n'
-
-    tech_signals = ""
-    for signal, sentiment in a["technical"]["signals"]:
-        icon = {"bullish": "▲", "bearish": "▼", "caution": "⚠", "neutral": "●", "info": "ℹ"}.get(sentiment, "●")
-        clr = {"bullish": "#10B981", "bearish": "#EF4444", "caution": "#F59E0B",
-               "neutral": "#F59E0B", "info": "#64748B"}.get(sentiment)
-        tech_signals += f'<div style="color:{clr};margin:3px 0;font-size:13px">{icon} {signal}</div>\n'
+    val_signals = _signal_divs(a.valuation["signals"], _PANE_SIGNAL_STYLE, "margin:3px 0;font-size:13px")
+    tech_signals = _signal_divs(a.technical["signals"], _PANE_SIGNAL_STYLE, "margin:3px 0;font-size:13px")
 
     # Growth table
-    growth_rows = ""
-    growth_headers = ""
-    for category, vals in a.get("growth", {}).items():
+    growth_parts = []
+    for category, vals in a.growth.items():
         short = (category.replace("Compounded ", "").replace("Stock Price CAGR", "Stock CAGR")
                  .replace("Return on Equity", "ROE"))
-        cells = ""
-        for period, val in vals.items():
-            c = "#10B981" if val > 10 else "#F59E0B" if val > 0 else "#EF4444"
-            cells += f'<td style="color:{c};font-weight:600">{val:+.0f}%</td>'
-        growth_rows += f'<tr><td style="color:#64748B">{short}</td>{cells}</tr>\n'
-    first_cat = next(iter(a.get("growth", {}).values()), {})
+        cells = "".join(
+            f'<td style="color:{"#10B981" if val > 10 else "#F59E0B" if val > 0 else "#EF4444"};'
+            f'font-weight:600">{val:+.0f}%</td>'
+            for val in vals.values())
+        growth_parts.append(f'<tr><td style="color:#64748B">{short}</td>{cells}</tr>\n')
+    growth_rows = "".join(growth_parts)
+    first_cat = next(iter(a.growth.values()), {})
     growth_headers = "".join(f'<th>{p}</th>' for p in first_cat)
 
     # Peers
     peers_html = ""
     peers = d.get("peers", [])
     if peers and len(peers) >= 2:
-        hdrs = [k for k in peers[0].keys() if not k.startswith("_")][:8]
-        p_h = "<tr>" + "".join(f"<th>{h}</th>" for h in hdrs) + "</tr>"
-        p_b = ""
-        for peer in peers[:10]:
-            is_self = peer.get("_ticker", "").upper() == ticker
-            st = 'style="background:#EBF5FF;font-weight:600"' if is_self else ""
-            cells = "".join(f"<td>{peer.get(h, '')}</td>" for h in hdrs)
-            p_b += f"<tr {st}>{cells}</tr>\n"
+        p_h, p_b = _peer_rows(peers, ticker, 'style="background:#EBF5FF;font-weight:600"')
         peers_html = f'<div class="section"><h2>Peer Comparison</h2><table class="data-table">{p_h}{p_b}</table></div>'
 
     # Segments
@@ -2242,29 +2569,26 @@ def _build_stock_pane(data: dict, analysis: dict, charts: dict,
     docs_html = ""
     docs = d.get("documents", {})
     if docs.get("concalls") or docs.get("annual_reports"):
-        items = ""
-        for doc in docs.get("concalls", [])[:3]:
-            items += f'<div class="doc-item">📞 <a href="{doc["url"]}" target="_blank">{doc["text"][:80]}</a></div>\n'
-        for doc in docs.get("annual_reports", [])[:2]:
-            items += f'<div class="doc-item">📄 <a href="{doc["url"]}" target="_blank">{doc["text"][:80]}</a></div>\n'
-        docs_html = f'<div class="section"><h2>Recent Documents</h2>{items}</div>'
+        docs_html = f'<div class="section"><h2>Recent Documents</h2>{_doc_items(docs, 2)}</div>'
 
     # Shareholding
-    sha = a.get("sh_analysis", {})
+    sha = a.sh_analysis
     sh_html = ""
-    if sha and sha.get("promoter_latest", 0) > 0:
-        fii_cls = " positive" if sha.get("fii_trend") == "increasing" else (
-            " negative" if sha.get("fii_trend") == "decreasing" else "")
+    promoter = sha.get("promoter_latest", 0) if sha else 0
+    if promoter > 0:
+        fii, dii, public = sha.get("fii_latest", 0), sha.get("dii_latest", 0), sha.get("public_latest", 0)
+        fii_trend = sha.get("fii_trend", "N/A")
+        fii_cls = _TREND_CLS.get(fii_trend, "")
         sh_html = f'''<div class="section">
     <h2>Shareholding Pattern</h2>
     <div class="sh-bar">
-        <div style="width:{sha.get("promoter_latest",0)}%;background:#16A34A">P {sha.get("promoter_latest",0):.0f}%</div>
-        <div style="width:{sha.get("fii_latest",0)}%;background:#3B82F6">FII {sha.get("fii_latest",0):.0f}%</div>
-        <div style="width:{sha.get("dii_latest",0)}%;background:#0891B2">DII {sha.get("dii_latest",0):.0f}%</div>
-        <div style="width:{sha.get("public_latest",0)}%;background:#9CA3AF">Pub {sha.get("public_latest",0):.0f}%</div>
+        <div style="width:{promoter}%;background:#16A34A">P {promoter:.0f}%</div>
+        <div style="width:{fii}%;background:#3B82F6">FII {fii:.0f}%</div>
+        <div style="width:{dii}%;background:#0891B2">DII {dii:.0f}%</div>
+        <div style="width:{public}%;background:#9CA3AF">Pub {public:.0f}%</div>
     </div>
     <div class="metric"><span class="key">Promoter Trend</span><span class="val">{sha.get("promoter_trend","N/A")}</span></div>
-    <div class="metric"><span class="key">FII Trend</span><span class="val{fii_cls}">{sha.get("fii_trend","N/A")}</span></div>
+    <div class="metric"><span class="key">FII Trend</span><span class="val{fii_cls}">{fii_trend}</span></div>
 </div>'''
 
     # Price chart (full-width, with period switcher)
@@ -2274,23 +2598,25 @@ def _build_stock_pane(data: dict, analysis: dict, charts: dict,
         period_labels = {"price_1y": "1Y", "price_3y": "3Y", "price_5y": "5Y", "price_max": "All"}
         # Default to All-time (price_max) if available, else first available
         default_pk = "price_max" if any(pk == "price_max" for pk, _ in price_periods) else price_periods[0][0]
-        btns = ""
-        divs = ""
-        for idx, (pk, phtml) in enumerate(price_periods):
+        btn_parts = []
+        div_parts = []
+        for pk, phtml in price_periods:
             active_cls = " active" if pk == default_pk else ""
             disp = "block" if pk == default_pk else "none"
-            btns += f'<button class="period-btn{active_cls}" data-period="{pk}" onclick="switchPeriod(\'{ticker}\', \'{pk}\')">{period_labels[pk]}</button>'
-            divs += f'<div class="price-period" id="{ticker}-{pk}" style="display:{disp}">{_defer_plotly(phtml)}</div>'
+            btn_parts.append(f'<button class="period-btn{active_cls}" data-period="{pk}" onclick="switchPeriod(\'{ticker}\', \'{pk}\')">{period_labels[pk]}</button>')
+            div_parts.append(f'<div class="price-period" id="{ticker}-{pk}" style="display:{disp}">{_defer_plotly(phtml)}</div>')
+        btns = "".join(btn_parts)
+        divs = "".join(div_parts)
         price_chart_html = f'''<div class="section" style="padding:12px">
     <div class="period-bar" id="pbar-{ticker}">{btns}</div>
     {divs}
 </div>'''
 
     # Charts grid
-    chart_cards = ""
-    for key in ["annual_pl", "quarterly", "margins", "returns", "shareholding", "cashflow"]:
-        if key in charts:
-            chart_cards += f'<div class="chart-card">{_defer_plotly(charts[key])}</div>\n'
+    chart_cards = "".join(
+        f'<div class="chart-card">{_defer_plotly(charts[key])}</div>\n'
+        for key in ["annual_pl", "quarterly", "margins", "returns", "shareholding", "cashflow"]
+        if key in charts)
 
     opm_val = pl.get("opm_latest", 0)
     npm_val = pl.get("npm_latest", 0)
@@ -2302,27 +2628,27 @@ def _build_stock_pane(data: dict, analysis: dict, charts: dict,
         <div class="sub">{ticker} · {cons_label} · {d.get("fetched_at","")[:10]}</div>
     </div>
     <div class="price-block">
-        <div class="price">₹{a["current_price"]:,.0f}</div>
-        <div class="meta">52W: ₹{a["low_52w"]:,.0f} – ₹{a["high_52w"]:,.0f}</div>
+        <div class="price">₹{a.current_price:,.0f}</div>
+        <div class="meta">52W: ₹{a.low_52w:,.0f} – ₹{a.high_52w:,.0f}</div>
     </div>
 </div>
 
 <div class="scorecard">
     <div class="score-card"><div class="label">Quality</div>
         <div class="value" style="color:{grade_color}">{grade}</div>
-        <div class="desc">{a["quality"]["score"]}/100</div></div>
+        <div class="desc">{a.quality["score"]}/100</div></div>
     <div class="score-card"><div class="label">Valuation</div>
-        <div class="value" style="color:{val_color};font-size:20px">{a["valuation"]["verdict"]}</div>
+        <div class="value" style="color:{val_color};font-size:20px">{a.valuation["verdict"]}</div>
         <div class="desc">{val_score}/100</div></div>
     <div class="score-card"><div class="label">Market Cap</div>
-        <div class="value" style="font-size:20px;color:var(--dark)">{fmt_cr(a["market_cap"])}</div>
-        <div class="desc">P/E: {a["pe"]:.1f}</div></div>
+        <div class="value" style="font-size:20px;color:var(--dark)">{fmt_cr(a.market_cap)}</div>
+        <div class="desc">P/E: {a.pe:.1f}</div></div>
     <div class="score-card"><div class="label">ROCE / ROE</div>
-        <div class="value" style="font-size:20px">{a["roce"]:.1f}%</div>
-        <div class="desc">ROE: {a["roe"]:.1f}%</div></div>
+        <div class="value" style="font-size:20px">{a.roce:.1f}%</div>
+        <div class="desc">ROE: {a.roe:.1f}%</div></div>
     <div class="score-card"><div class="label">P/B · Div</div>
-        <div class="value" style="font-size:20px">{a["pb"]:.2f}</div>
-        <div class="desc">Div: {a["div_yield"]:.1f}%</div></div>
+        <div class="value" style="font-size:20px">{a.pb:.2f}</div>
+        <div class="desc">Div: {a.div_yield:.1f}%</div></div>
 </div>
 
 {price_chart_html}
@@ -2334,11 +2660,11 @@ def _build_stock_pane(data: dict, analysis: dict, charts: dict,
 <div class="grid-4">
 <div class="section">
     <h2>Key Metrics</h2>
-    <div class="metric"><span class="key">Price</span><span class="val">₹{a["current_price"]:,.0f}</span></div>
-    <div class="metric"><span class="key">52W H/L</span><span class="val">₹{a["high_52w"]:,.0f} / ₹{a["low_52w"]:,.0f}</span></div>
-    <div class="metric"><span class="key">Book Value</span><span class="val">₹{a["book_value"]:,.0f}</span></div>
-    <div class="metric"><span class="key">ROCE</span><span class="val{roce_cls}">{a["roce"]:.1f}%</span></div>
-    <div class="metric"><span class="key">ROE</span><span class="val{roe_cls}">{a["roe"]:.1f}%</span></div>
+    <div class="metric"><span class="key">Price</span><span class="val">₹{a.current_price:,.0f}</span></div>
+    <div class="metric"><span class="key">52W H/L</span><span class="val">₹{a.high_52w:,.0f} / ₹{a.low_52w:,.0f}</span></div>
+    <div class="metric"><span class="key">Book Value</span><span class="val">₹{a.book_value:,.0f}</span></div>
+    <div class="metric"><span class="key">ROCE</span><span class="val{roce_cls}">{a.roce:.1f}%</span></div>
+    <div class="metric"><span class="key">ROE</span><span class="val{roe_cls}">{a.roe:.1f}%</span></div>
     <div class="bar-52w"><div class="fill" style="width:{pos_52w*100:.0f}%;background:{fill_color}"></div></div>
 </div>
 <div class="section">
@@ -2380,20 +2706,14 @@ def _build_stock_pane(data: dict, analysis: dict, charts: dict,
 {docs_html}
 
 <div class="footer">
-    <p>Source: <a href="{d["url"]}">screener.in/{ticker}</a> · Generated {datetime.now().strftime("%d %b %Y %H:%M")}</p>
+    <p>Source: <a href="{d["url"]}">screener.in/{ticker}</a> · Generated {generated_at}</p>
 </div>
 </div>'''
 
 
-def generate_dashboard(stocks: list, sections: list = None) -> str:
-    """
-    Generate multi-stock tabbed dashboard HTML.
-    stocks: list of dicts with keys: data, analysis, charts, sankey_html
-    sections: optional list of dicts with keys: name, tickers (for accordion grouping)
-              e.g. [{"name": "Nifty 50", "tickers": ["RELIANCE", ...]}, ...]
-    """
-    # ── CSS (plain string — no f-string brace escaping) ──
-    css = """
+# Dashboard stylesheet and script (plain strings — no f-string brace escaping).
+# --html inlines them; --serve links them so the browser caches them across reloads.
+_DASHBOARD_CSS = """
 :root { --green:#10B981; --red:#EF4444; --amber:#F59E0B;
     --blue:#3B82F6; --grey:#64748B; --dark:#0F172A;
     --card:#FFFFFF; --bg:#F1F5F9; --border:#E2E8F0;
@@ -2552,9 +2872,9 @@ body.sidebar-collapsed .sidebar-toggle { left:0; }
 @keyframes spin { to { transform:rotate(360deg); } }
 """
 
-    # ── JavaScript (plain string — no brace escaping) ──
-    js = """
+_DASHBOARD_JS = """
 var _acTimer = null, _acIdx = -1, _acItems = [];
+var _acCache = {};  // lower-cased query -> results, so backspacing doesn't refetch
 var _serverMode = !!(location.protocol === 'http:' || location.protocol === 'https:');
 // Try to detect if we're served by our local API
 if (_serverMode) {
@@ -2564,9 +2884,28 @@ if (_serverMode) {
     }).catch(function() { _serverMode = false; });
 }
 
+// ── Lazy pane rendering ──
+// Only the first pane is live markup; the rest ship as inert <template>s and are
+// moved into the page the first time their tab is opened.
+function ensurePane(ticker) {
+    var pane = document.getElementById('pane-' + ticker);
+    if (pane) return pane;
+    var tmpl = document.getElementById('pane-tmpl-' + ticker);
+    if (!tmpl) return null;
+    document.querySelector('.main-container').appendChild(tmpl.content);
+    tmpl.remove();
+    return document.getElementById('pane-' + ticker);
+}
+
 // ── Lazy chart rendering ──
 function renderCharts(pane) {
-    if (!pane) return;
+    if (!pane || pane.dataset.chartsRendered) return;
+    // Plotly is a deferred script; until it has run, retry once the document is parsed
+    if (!window.Plotly) {
+        document.addEventListener('DOMContentLoaded', function() { renderCharts(pane); }, {once: true});
+        return;
+    }
+    pane.dataset.chartsRendered = '1';
     var deferred = pane.querySelectorAll('script[type="text/plotly-deferred"]');
     deferred.forEach(function(s) {
         var ns = document.createElement('script');
@@ -2575,14 +2914,17 @@ function renderCharts(pane) {
     });
 }
 
+// The visible pane and highlighted button, so switching only touches those two
+var _activePane = null, _activeBtn = null;
 function switchTab(ticker) {
-    document.querySelectorAll('.tab-pane').forEach(function(p) { p.style.display = 'none'; });
-    document.querySelectorAll('.tab-btn').forEach(function(b) { b.classList.remove('active'); });
-    var pane = document.getElementById('pane-' + ticker);
+    if (_activePane) _activePane.style.display = 'none';
+    if (_activeBtn) _activeBtn.classList.remove('active');
+    var pane = ensurePane(ticker);
+    var btn = document.querySelector('.tab-btn[data-ticker="' + ticker + '"]');
     if (pane) pane.style.display = 'block';
-    document.querySelectorAll('.tab-btn').forEach(function(b) {
-        if (b.dataset.ticker === ticker) b.classList.add('active');
-    });
+    if (btn) btn.classList.add('active');
+    _activePane = pane;
+    _activeBtn = btn;
     // Render deferred charts on first view
     if (pane) renderCharts(pane);
     setTimeout(function() {
@@ -2625,19 +2967,27 @@ function toggleSidebar() {
 
 function updateCount() {
     var sub = document.querySelector('.sidebar-header .subtitle');
-    var n = document.querySelectorAll('.tab-pane').length;
+    var n = document.querySelectorAll('.tab-btn').length;
     sub.textContent = n + ' stock' + (n !== 1 ? 's' : '');
 }
 
 // ── localStorage watchlist cache ──
 var _LS_KEY = 'screener_watchlist';
+var _saveTimer = null;
+// Coalesce bursts of adds/deletes into one synchronous localStorage write
 function saveWatchlist() {
+    clearTimeout(_saveTimer);
+    _saveTimer = setTimeout(writeWatchlist, 300);
+}
+function writeWatchlist() {
+    _saveTimer = null;
     var tickers = [];
     document.querySelectorAll('.tab-btn').forEach(function(b) {
         if (b.dataset.ticker) tickers.push(b.dataset.ticker);
     });
     try { localStorage.setItem(_LS_KEY, JSON.stringify(tickers)); } catch(e) {}
 }
+window.addEventListener('pagehide', function() { if (_saveTimer) writeWatchlist(); });
 function getCachedWatchlist() {
     try { return JSON.parse(localStorage.getItem(_LS_KEY) || '[]'); } catch(e) { return []; }
 }
@@ -2649,9 +2999,11 @@ function clearCache() {
 function deleteStock(ticker, evt) {
     evt.stopPropagation();
     var pane = document.getElementById('pane-' + ticker);
+    var tmpl = document.getElementById('pane-tmpl-' + ticker);
     var btn = document.querySelector('.tab-btn[data-ticker="' + ticker + '"]');
     var wasActive = btn && btn.classList.contains('active');
     if (pane) pane.remove();
+    if (tmpl) tmpl.remove();
     if (btn) btn.remove();
     updateCount();
     saveWatchlist();
@@ -2662,17 +3014,17 @@ function deleteStock(ticker, evt) {
     }
 }
 
-function addTabButton(ticker, price, grade, gradeColor) {
-    var list = document.querySelector('.tab-list');
-    var btn = document.createElement('button');
-    btn.className = 'tab-btn';
-    btn.dataset.ticker = ticker;
-    btn.onclick = function() { switchTab(ticker); };
-    btn.innerHTML = '<span class="ticker-name">' + ticker + '</span>' +
+function addTabButton(ticker, price, grade, gradeColor, into) {
+    // Parse in a detached <template> so bulk adds can gather buttons in a fragment
+    var tmpl = document.createElement('template');
+    tmpl.innerHTML =
+        '<button class="tab-btn" data-ticker="' + ticker + '" onclick="switchTab(\\'' + ticker + '\\')">' +
+        '<span class="ticker-name">' + ticker + '</span>' +
         (price ? '<span class="price-sm">' + price + '</span> ' : '') +
         '<span class="grade-badge" style="background:' + (gradeColor||'#64748B') + '">' + (grade||'?') + '</span>' +
-        '<span class="del-btn" onclick="deleteStock(\\'' + ticker + '\\', event)">&times;</span>';
-    list.appendChild(btn);
+        '<span class="del-btn" onclick="deleteStock(\\'' + ticker + '\\', event)">&times;</span></button>';
+    var btn = tmpl.content.firstElementChild;
+    (into || document.querySelector('.tab-list')).appendChild(btn);
     return btn;
 }
 
@@ -2683,16 +3035,21 @@ function addSymbol(singleTicker) {
     hideAC();
     // Support pasting multiple symbols (comma, space, newline, semicolon separated)
     var tickers = raw.split(/[,;\\s\\n]+/).filter(function(t) { return t.length > 0; });
+    // New tabs and panes are gathered off-DOM and attached once after the loop
+    var tabFrag = document.createDocumentFragment();
+    var paneFrag = document.createDocumentFragment();
+    var added = {};
     tickers.forEach(function(ticker) {
         ticker = ticker.replace(/[^A-Z0-9&]/g, '');
-        if (!ticker) return;
+        if (!ticker || added[ticker]) return;
         // Already in dashboard?
-        if (document.getElementById('pane-' + ticker)) {
+        if (document.getElementById('pane-' + ticker) || document.getElementById('pane-tmpl-' + ticker)) {
             switchTab(ticker);
             return;
         }
+        added[ticker] = true;
         // Add loading tab
-        var btn = addTabButton(ticker, '', '?', '#64748B');
+        var btn = addTabButton(ticker, '', '?', '#64748B', tabFrag);
         btn.classList.add('loading');
         // Add loading pane
         var pane = document.createElement('div');
@@ -2700,12 +3057,24 @@ function addSymbol(singleTicker) {
         pane.id = 'pane-' + ticker;
         pane.style.display = 'none';
         pane.innerHTML = '<div class="loading-pane"><div class="spinner"></div><br>Analysing ' + ticker + '...</div>';
-        document.querySelector('.main-container').appendChild(pane);
-        updateCount();
-        // Try live fetch if in server mode
+        paneFrag.appendChild(pane);
+        // Try live fetch if in server mode: tab-button fields first, then the full pane
         if (_serverMode) {
-            fetch('/api/analyze/' + ticker)
+            fetch('/api/analyze/' + ticker + '/meta')
                 .then(function(r) { return r.json(); })
+                .then(function(meta) {
+                    if (meta.error) return meta;
+                    // Update tab button with real data
+                    var tn = btn.querySelector('.ticker-name');
+                    if (tn) tn.textContent = ticker;
+                    var ps = btn.querySelector('.price-sm');
+                    if (ps) ps.textContent = meta.price || '';
+                    var gb = btn.querySelector('.grade-badge');
+                    if (gb) { gb.textContent = meta.grade || '?'; gb.style.background = meta.grade_color || '#64748B'; }
+                    var lp = pane.querySelector('.loading-pane');
+                    if (lp) lp.innerHTML = '<div class="spinner"></div><br>Building charts for ' + ticker + '...';
+                    return fetch('/api/analyze/' + ticker).then(function(r) { return r.json(); });
+                })
                 .then(function(data) {
                     btn.classList.remove('loading');
                     if (data.error) {
@@ -2713,13 +3082,6 @@ function addSymbol(singleTicker) {
                             '<div class="sub">Error: ' + data.error + '</div></div></div>';
                         return;
                     }
-                    // Update tab button with real data
-                    var tn = btn.querySelector('.ticker-name');
-                    if (tn) tn.textContent = ticker;
-                    var ps = btn.querySelector('.price-sm');
-                    if (ps) ps.textContent = data.price || '';
-                    var gb = btn.querySelector('.grade-badge');
-                    if (gb) { gb.textContent = data.grade || '?'; gb.style.background = data.grade_color || '#64748B'; }
                     // Replace pane content
                     pane.outerHTML = data.pane_html;
                     var np = document.getElementById('pane-' + ticker);
@@ -2745,6 +3107,9 @@ function addSymbol(singleTicker) {
                 '<p style="margin-top:8px"><a href="https://www.screener.in/company/' + ticker + '/" target="_blank" style="color:#3B82F6">View on screener.in \u2192</a></p></div>';
         }
     });
+    document.querySelector('.tab-list').appendChild(tabFrag);
+    document.querySelector('.main-container').appendChild(paneFrag);
+    updateCount();
     if (tickers.length === 1) switchTab(tickers[0]);
     input.value = '';
     saveWatchlist();
@@ -2782,7 +3147,6 @@ function highlightAC(idx) {
 
 function handleSymbolInput(e) {
     var input = e.target;
-    var val = input.value.trim();
 
     // Arrow navigation
     if (e.key === 'ArrowDown') {
@@ -2807,19 +3171,22 @@ function handleSymbolInput(e) {
     }
     if (e.key === 'Escape') { hideAC(); return; }
 
-    // Debounced search
+    // Debounced search. keydown fires before the key lands in the input,
+    // so the query is read when the timer fires, not now.
     clearTimeout(_acTimer);
-    if (val.length < 2) { hideAC(); return; }
     _acTimer = setTimeout(function() {
-        if (_serverMode) {
-            fetch('/api/search?q=' + encodeURIComponent(val))
-                .then(function(r) { return r.json(); })
-                .then(function(data) { showAC(data.results || []); })
-                .catch(function() { hideAC(); });
-        } else {
-            // Static mode: no autocomplete
-            hideAC();
-        }
+        var q = input.value.trim().toLowerCase();
+        // Static mode: no autocomplete
+        if (q.length < 2 || !_serverMode) { hideAC(); return; }
+        if (_acCache[q]) { showAC(_acCache[q]); return; }
+        fetch('/api/search?q=' + encodeURIComponent(q))
+            .then(function(r) { return r.json(); })
+            .then(function(data) {
+                if (!data.error) _acCache[q] = data.results || [];
+                // Drop replies that arrive after the user has typed on
+                if (input.value.trim().toLowerCase() === q) showAC(data.results || []);
+            })
+            .catch(function() { hideAC(); });
     }, 250);
 }
 
@@ -2905,18 +3272,47 @@ function toggleSection(id) {
 (function initFirstPane() {
     var first = document.querySelector('.tab-pane[style*=\"display:block\"]') ||
                 document.querySelector('.tab-pane');
+    _activePane = first;
+    _activeBtn = document.querySelector('.tab-btn.active');
     if (first) renderCharts(first);
 })();
 """
 
+_DASHBOARD_ASSET_VERSION = _digest((_DASHBOARD_CSS, _DASHBOARD_JS))[:12]
+
+
+def generate_dashboard(stocks: list, sections: list = None, linked_assets: bool = False) -> str:
+    """
+    Generate multi-stock tabbed dashboard HTML.
+    stocks: list of dicts with keys: data, analysis, charts, sankey_html
+    sections: optional list of dicts with keys: name, tickers (for accordion grouping)
+              e.g. [{"name": "Nifty 50", "tickers": ["RELIANCE", ...]}, ...]
+    linked_assets: reference /dashboard.css, /dashboard.js and a local /plotly.js
+                   instead of inlining the first two and loading Plotly from the CDN
+    """
+    return "".join(_dashboard_chunks(stocks, sections, linked_assets))
+
+
+def _dashboard_chunks(stocks: list, sections: list = None, linked_assets: bool = False):
+    """Yield the dashboard page as head + sidebar, one pane per stock, then the script tail."""
+    plotly_src = "https://cdn.plot.ly/plotly-2.35.2.min.js"
+    if linked_assets:
+        v = _DASHBOARD_ASSET_VERSION
+        style = f'<link rel="stylesheet" href="/dashboard.css?v={v}">'
+        script = f'<script src="/dashboard.js?v={v}"></script>'
+        if plotly is not None:
+            plotly_src = f"/plotly.js?v={plotly.__version__}"
+    else:
+        style = f"<style>{_DASHBOARD_CSS}</style>"
+        script = f"<script>{_DASHBOARD_JS}</script>"
+
     # ── Build tab buttons (grouped by sections if provided) ──
     def _make_tab_btn(s, is_first=False):
         t = s["data"]["ticker"]
         a = s["analysis"]
-        g = a["quality"]["grade"]
-        gc = {"A+": "#10B981", "A": "#22C55E", "B+": "#F59E0B",
-              "B": "#F59E0B", "C": "#EF4444", "D": "#DC2626"}.get(g, "#64748B")
-        price = a.get("current_price", 0)
+        g = a.quality["grade"]
+        gc = _PANE_GRADE_COLOR.get(g, "#64748B")
+        price = a.current_price
         active = " active" if is_first else ""
         return (f'<button class="tab-btn{active}" data-ticker="{t}" '
                 f"onclick=\"switchTab('{t}')\">"
@@ -2929,44 +3325,39 @@ function toggleSection(id) {
     # Index stocks by ticker for section lookup
     stock_by_ticker = {s["data"]["ticker"]: s for s in stocks}
 
-    tab_btns = ""
+    tab_parts = []
     if sections:
         assigned = set()
         for sec_idx, sec in enumerate(sections):
-            sec_id = re.sub(r'[^a-z0-9]', '', sec["name"].lower())
+            sec_id = _RE_NON_ALNUM.sub('', sec["name"].lower())
             sec_tickers = [t for t in sec["tickers"] if t in stock_by_ticker]
             assigned.update(sec_tickers)
-            tab_btns += (f'<div class="section-header" id="sec-hdr-{sec_id}" '
-                         f'onclick="toggleSection(\'{sec_id}\')">' 
-                         f'<span class="chevron">▼</span>{sec["name"]}'
-                         f'<span class="sec-count">{len(sec_tickers)}</span></div>\n')
-            tab_btns += f'<div class="section-body" id="sec-body-{sec_id}" style="max-height:9999px">\n'
+            tab_parts.append(f'<div class="section-header" id="sec-hdr-{sec_id}" '
+                             f'onclick="toggleSection(\'{sec_id}\')">' 
+                             f'<span class="chevron">▼</span>{sec["name"]}'
+                             f'<span class="sec-count">{len(sec_tickers)}</span></div>\n')
+            tab_parts.append(f'<div class="section-body" id="sec-body-{sec_id}" style="max-height:9999px">\n')
             for t in sec_tickers:
                 s = stock_by_ticker[t]
                 is_first = (t == first_ticker)
-                tab_btns += _make_tab_btn(s, is_first)
-            tab_btns += '</div>\n'
+                tab_parts.append(_make_tab_btn(s, is_first))
+            tab_parts.append('</div>\n')
         # Any unassigned stocks go into an "Other" section
         remaining = [s for s in stocks if s["data"]["ticker"] not in assigned]
         if remaining:
-            tab_btns += ('<div class="section-header" id="sec-hdr-other" '
-                         'onclick="toggleSection(\'other\')">' 
-                         '<span class="chevron">▼</span>Other'
-                         f'<span class="sec-count">{len(remaining)}</span></div>\n')
-            tab_btns += '<div class="section-body" id="sec-body-other" style="max-height:9999px">\n'
+            tab_parts.append('<div class="section-header" id="sec-hdr-other" '
+                             'onclick="toggleSection(\'other\')">' 
+                             '<span class="chevron">▼</span>Other'
+                             f'<span class="sec-count">{len(remaining)}</span></div>\n')
+            tab_parts.append('<div class="section-body" id="sec-body-other" style="max-height:9999px">\n')
             for s in remaining:
-                tab_btns += _make_tab_btn(s, s["data"]["ticker"] == first_ticker)
-            tab_btns += '</div>\n'
+                tab_parts.append(_make_tab_btn(s, s["data"]["ticker"] == first_ticker))
+            tab_parts.append('</div>\n')
     else:
         for i, s in enumerate(stocks):
-            tab_btns += _make_tab_btn(s, i == 0)
+            tab_parts.append(_make_tab_btn(s, i == 0))
 
-    # ── Build panes ──
-    panes = ""
-    for i, s in enumerate(stocks):
-        panes += _build_stock_pane(s["data"], s["analysis"],
-                                   s.get("charts", {}), s.get("sankey_html", ""),
-                                   active=(i == 0))
+    tab_btns = "".join(tab_parts)
 
     # ── Title ──
     if len(stocks) == 1:
@@ -2976,14 +3367,14 @@ function toggleSection(id) {
     title += " — Screener Dashboard"
 
     n_stocks = len(stocks)
-    html = f"""<!DOCTYPE html>
+    yield f"""<!DOCTYPE html>
 <html lang="en">
 <head>
 <meta charset="UTF-8">
 <meta name="viewport" content="width=device-width, initial-scale=1.0">
 <title>{title}</title>
-<script src="https://cdn.plot.ly/plotly-2.35.2.min.js" charset="utf-8"></script>
-<style>{css}</style>
+<script defer src="{plotly_src}" charset="utf-8"></script>
+{style}
 </head>
 <body>
 <nav class="sidebar" id="sidebar">
@@ -3001,12 +3392,20 @@ function toggleSection(id) {
 </nav>
 <button class="sidebar-toggle" onclick="toggleSidebar()" title="Toggle sidebar">&#9776;</button>
 <div class="main-container">
-{panes}
+"""
+    # Panes are rendered one at a time so a file writer never holds the whole page.
+    # All but the first are wrapped in <template> so the browser doesn't lay them out until opened.
+    generated_at = _generated_stamp()
+    for i, s in enumerate(stocks):
+        pane = _build_stock_pane(s["data"], s["analysis"],
+                                 s.get("charts", {}), s.get("sankey_html", ""),
+                                 active=(i == 0), generated_at=generated_at)
+        yield pane if i == 0 else f'<template id="pane-tmpl-{s["data"]["ticker"]}">{pane}</template>'
+    yield f"""
 </div>
-<script>{js}</script>
+{script}
 </body>
 </html>"""
-    return html
 
 
 def generate_demo_site(stocks: list, output_dir: str, sections: list = None):
@@ -3026,13 +3425,13 @@ def generate_demo_site(stocks: list, output_dir: str, sections: list = None):
 
     # ── Write per-stock pane fragments ──
     stock_index = []  # [{ticker, name, price, grade, grade_color}, ...]
+    generated_at = _generated_stamp()
     for i, s in enumerate(stocks):
         t = s["data"]["ticker"]
         a = s["analysis"]
-        g = a["quality"]["grade"]
-        gc = {"A+": "#10B981", "A": "#22C55E", "B+": "#F59E0B",
-              "B": "#F59E0B", "C": "#EF4444", "D": "#DC2626"}.get(g, "#64748B")
-        price = a.get("current_price", 0)
+        g = a.quality["grade"]
+        gc = _PANE_GRADE_COLOR.get(g, "#64748B")
+        price = a.current_price
         stock_index.append({
             "ticker": t,
             "name": s["data"]["company_name"],
@@ -3042,7 +3441,8 @@ def generate_demo_site(stocks: list, output_dir: str, sections: list = None):
         })
         # Build pane HTML (active=True so display:block)
         pane_html = _build_stock_pane(
-            s["data"], a, s.get("charts", {}), s.get("sankey_html", ""), active=True)
+            s["data"], a, s.get("charts", {}), s.get("sankey_html", ""), active=True,
+            generated_at=generated_at)
         pane_path = panes_dir / f"{t}.html"
         with open(pane_path, "w", encoding="utf-8") as f:
             f.write(pane_html)
@@ -3068,35 +3468,37 @@ def generate_demo_site(stocks: list, output_dir: str, sections: list = None):
                 f'<span class="grade-badge" style="background:{info["grade_color"]}">{info["grade"]}</span>'
                 f'<span class="del-btn" onclick="removeTab(\'{t}\', event)">&times;</span></button>\n')
 
-    tab_btns = ""
+    tab_parts = []
     if sections:
         assigned = set()
         for sec in sections:
-            sec_id = re.sub(r'[^a-z0-9]', '', sec["name"].lower())
+            sec_id = _RE_NON_ALNUM.sub('', sec["name"].lower())
             sec_tickers = [t for t in sec["tickers"] if t in stock_by_ticker]
             assigned.update(sec_tickers)
-            tab_btns += (f'<div class="section-header" id="sec-hdr-{sec_id}" '
-                         f'onclick="toggleSection(\'{sec_id}\')">'
-                         f'<span class="chevron">▼</span>{sec["name"]}'
-                         f'<span class="sec-count">{len(sec_tickers)}</span></div>\n')
-            tab_btns += f'<div class="section-body" id="sec-body-{sec_id}" style="max-height:9999px">\n'
+            tab_parts.append(f'<div class="section-header" id="sec-hdr-{sec_id}" '
+                             f'onclick="toggleSection(\'{sec_id}\')">'
+                             f'<span class="chevron">▼</span>{sec["name"]}'
+                             f'<span class="sec-count">{len(sec_tickers)}</span></div>\n')
+            tab_parts.append(f'<div class="section-body" id="sec-body-{sec_id}" style="max-height:9999px">\n')
             for info in stock_index:
                 if info["ticker"] in sec_tickers:
-                    tab_btns += _btn_html(info, info["ticker"] == first_ticker)
-            tab_btns += '</div>\n'
+                    tab_parts.append(_btn_html(info, info["ticker"] == first_ticker))
+            tab_parts.append('</div>\n')
         remaining = [info for info in stock_index if info["ticker"] not in assigned]
         if remaining:
-            tab_btns += ('<div class="section-header" id="sec-hdr-other" '
-                         'onclick="toggleSection(\'other\')">'
-                         '<span class="chevron">▼</span>Other'
-                         f'<span class="sec-count">{len(remaining)}</span></div>\n')
-            tab_btns += '<div class="section-body" id="sec-body-other" style="max-height:9999px">\n'
+            tab_parts.append('<div class="section-header" id="sec-hdr-other" '
+                             'onclick="toggleSection(\'other\')">'
+                             '<span class="chevron">▼</span>Other'
+                             f'<span class="sec-count">{len(remaining)}</span></div>\n')
+            tab_parts.append('<div class="section-body" id="sec-body-other" style="max-height:9999px">\n')
             for info in remaining:
-                tab_btns += _btn_html(info, info["ticker"] == first_ticker)
-            tab_btns += '</div>\n'
+                tab_parts.append(_btn_html(info, info["ticker"] == first_ticker))
+            tab_parts.append('</div>\n')
     else:
         for i, info in enumerate(stock_index):
-            tab_btns += _btn_html(info, i == 0)
+            tab_parts.append(_btn_html(info, i == 0))
+
+    tab_btns = "".join(tab_parts)
 
     n_stocks = len(stocks)
     title = "StockScreener — Nifty 50 Dashboard" if n_stocks >= 50 else "StockScreener Dashboard"
@@ -3530,22 +3932,90 @@ document.addEventListener('click', function(e) {
 
 def _load_watchlist(path: str) -> list:
     """Load tickers from a watchlist file (one per line, # comments, blank lines OK)."""
-    tickers = []
     p = Path(path)
     if not p.exists():
         raise FileNotFoundError(f"Watchlist file not found: {path}")
-    with open(p, "r", encoding="utf-8", errors="replace") as f:
-        for line in f:
-            line = line.split("#")[0].strip()  # strip comments
-            if line:
-                tickers.append(line.upper())
-    return tickers
+    text = p.read_text(encoding="utf-8", errors="replace")
+    # Strip comments, drop blank lines
+    return [t.upper() for line in text.splitlines() if (t := line.split("#", 1)[0].strip())]
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # LIVE SERVER MODE
 # ═══════════════════════════════════════════════════════════════════════════════
 
+# /api/analyze payloads keyed on (ticker, day, digest of the fetched data minus fetched_at).
+# A re-add within the page-cache window gets identical data, so the pane is reused as-is;
+# the day bucket matches _charts_key so the embedded price charts don't go stale.
+# A pane is stored only when its chart set was complete (i.e. made it into _CHART_CACHE)
+# and its Sankey either rendered or doesn't apply (no annual P&L), so a transient
+# yfinance/plotly error is retried on the next add.
+_PANE_CACHE = {}
+_PANE_CACHE_MAX = 128
+
+# /api/search results keyed on the lower-cased query, as (monotonic time, results).
+# Autocomplete re-asks the same prefixes as the user types and backspaces.
+_SEARCH_CACHE = {}
+_SEARCH_CACHE_MAX = 512
+SEARCH_CACHE_TTL_SECS = 300
+
+
+# Recently analysed tickers keyed on (ticker, consolidated), as (monotonic time, data, analysis).
+# Lets the pane request reuse the fetch its /meta request just made.
+_ANALYZED = {}
+ANALYZED_TTL_SECS = 60
+
+
+def _fetch_analyzed(ticker: str, consolidated: bool) -> tuple:
+    """(data, analysis) for a ticker, reusing one fetched in the last ANALYZED_TTL_SECS."""
+    key = (ticker, consolidated)
+    hit = _ANALYZED.get(key)
+    if hit is not None and time.monotonic() - hit[0] < ANALYZED_TTL_SECS:
+        return hit[1], hit[2]
+    data = fetch_full_company_data(ticker, consolidated=consolidated)
+    analysis = analyze(data)
+    _cache_put(_ANALYZED, key, (time.monotonic(), data, analysis), _PANE_CACHE_MAX)
+    return data, analysis
+
+
+def _tab_meta(ticker: str, data: dict, analysis: Analysis) -> dict:
+    """Fields the client needs to fill in a sidebar tab button."""
+    g = analysis.quality["grade"]
+    price = analysis.current_price
+    return {
+        "ticker": ticker,
+        "name": data.get("company_name", ticker),
+        "price": f"₹{price:,.0f}" if price else "",
+        "grade": g,
+        "grade_color": _PANE_GRADE_COLOR.get(g, "#64748B"),
+    }
+
+
+# Responses smaller than this go out as-is; gzip's framing would eat most of the saving
+GZIP_MIN_BYTES = 1024
+
+
+@lru_cache(maxsize=8)
+def _gzipped(body: bytes) -> bytes:
+    """gzip a static response body once; bytes cache their hash, so lookups are cheap."""
+    return gzip.compress(body, compresslevel=6)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak If-None-Match comparison (RFC 9110): any listed tag, W/ or not, or "*"."""
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in (t.removeprefix("W/") for t in tags)
+
+
+@lru_cache(maxsize=1)
+def _plotly_js() -> bytes:
+    """plotly.js bundled with the installed plotly package, i.e. the version the figures target."""
+    from plotly.offline import get_plotlyjs
+    return get_plotlyjs().encode("utf-8")
+
+
 class ScreenerHandler(BaseHTTPRequestHandler):
     """Request handler for --serve mode.  Serves the dashboard + REST API."""
 
@@ -3553,22 +4023,43 @@ class ScreenerHandler(BaseHTTPRequestHandler):
         """Quieter logging."""
         print(f"  {C.GREY}{fmt % args}{C.RESET}")
 
-    def _json(self, data, status=200):
-        body = json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
-        self.send_response(status)
-        self.send_header("Content-Type", "application/json; charset=utf-8")
-        self.send_header("Content-Length", str(len(body)))
-        self.end_headers()
-        self.wfile.write(body)
+    def _send(self, body, content_type, status=200, headers=None, static=False):
+        """Write a response, gzipped when the client accepts it and the body is worth it.
 
-    def _html(self, html, status=200):
-        body = html.encode("utf-8")
+        static bodies (the dashboard, CSS/JS, plotly.js) are compressed once and reused.
+        """
+        gz = len(body) >= GZIP_MIN_BYTES and "gzip" in self.headers.get("Accept-Encoding", "")
+        if gz:
+            body = _gzipped(body) if static else gzip.compress(body, compresslevel=5)
         self.send_response(status)
-        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
         self.send_header("Content-Length", str(len(body)))
+        self.send_header("Vary", "Accept-Encoding")
+        if gz:
+            self.send_header("Content-Encoding", "gzip")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
         self.end_headers()
         self.wfile.write(body)
 
+    def _json(self, data, status=200):
+        if orjson:
+            body = orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS)
+        else:
+            body = json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+        self._send(body, "application/json", status)
+
+    def _html(self, html, status=200, headers=None):
+        if isinstance(html, bytes):
+            self._send(html, "text/html", status, headers, static=True)
+        else:
+            self._send(html.encode("utf-8"), "text/html", status, headers)
+
+    def _asset(self, body, content_type):
+        """Static dashboard asset; the ?v= tag in its URL changes whenever the bytes do."""
+        self._send(body, content_type, headers={"Cache-Control": "public, max-age=31536000, immutable"},
+                   static=True)
+
     def do_GET(self):
         parsed = urlparse(self.path)
         path = parsed.path.rstrip("/") or "/"
@@ -3576,7 +4067,24 @@ class ScreenerHandler(BaseHTTPRequestHandler):
 
         # ── Serve dashboard ──
         if path == "/":
-            self._html(self.server.dashboard_html)
+            # The page only changes on restart, so reloads revalidate and usually get a 304
+            etag = getattr(self.server, "dashboard_etag", None)
+            if etag and _etag_matches(self.headers.get("If-None-Match"), etag):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            self._html(self.server.dashboard_html,
+                       headers={"ETag": etag, "Cache-Control": "no-cache"} if etag else None)
+            return
+        if path == "/dashboard.css":
+            self._asset(_DASHBOARD_CSS.encode("utf-8"), "text/css")
+            return
+        if path == "/dashboard.js":
+            self._asset(_DASHBOARD_JS.encode("utf-8"), "application/javascript")
+            return
+        if path == "/plotly.js" and plotly is not None:
+            self._asset(_plotly_js(), "application/javascript")
             return
 
         # ── Ping (for detecting server mode) ──
@@ -3590,11 +4098,14 @@ class ScreenerHandler(BaseHTTPRequestHandler):
             if len(q) < 2:
                 self._json({"results": []})
                 return
+            key = q.lower()
+            hit = _SEARCH_CACHE.get(key)
+            if hit is not None and time.monotonic() - hit[0] < SEARCH_CACHE_TTL_SECS:
+                self._json({"results": hit[1]})
+                return
             try:
-                r = requests.get(
-                    f"https://www.screener.in/api/company/search/?q={q}",
-                    headers=HEADERS, timeout=5
-                )
+                # Typeahead proxy: skip the fetch slots so a search never queues behind page scrapes
+                r = _SESSION.get("https://www.screener.in/api/company/search/", params={"q": q}, timeout=5)
                 items = r.json() if r.status_code == 200 else []
                 results = []
                 for item in items[:10]:
@@ -3602,60 +4113,56 @@ class ScreenerHandler(BaseHTTPRequestHandler):
                     name = item.get("name", "")
                     url = item.get("url", "")
                     # Extract ticker from URL like /company/RELIANCE/consolidated/
-                    ticker_match = re.search(r"/company/([^/]+)/", url)
+                    ticker_match = _RE_PEER_TICKER.search(url)
                     ticker = ticker_match.group(1) if ticker_match else name
                     results.append({"ticker": ticker.upper(), "name": name})
+                if r.status_code == 200:
+                    _cache_put(_SEARCH_CACHE, key, (time.monotonic(), results), _SEARCH_CACHE_MAX)
                 self._json({"results": results})
             except Exception as e:
                 self._json({"results": [], "error": str(e)})
             return
 
         # ── Analyze a ticker ──
+        # /api/analyze/<T>/meta answers with the tab-button fields as soon as the
+        # fetch is analysed; /api/analyze/<T> then adds the charts and pane HTML.
         if path.startswith("/api/analyze/"):
-            ticker = path.split("/api/analyze/")[1].strip().upper()
-            if not ticker or not re.match(r"^[A-Z0-9&]+$", ticker):
+            ticker, _, phase = path[len("/api/analyze/"):].partition("/")
+            ticker = ticker.strip().upper()
+            if not ticker or not _RE_TICKER_SYMBOL.match(ticker) or phase not in ("", "meta"):
                 self._json({"error": "Invalid ticker"}, 400)
                 return
             try:
                 consolidated = not getattr(self.server, "standalone", False)
-                data = fetch_full_company_data(ticker, consolidated=consolidated)
-                analysis = analyze(data)
+                data, analysis = _fetch_analyzed(ticker, consolidated)
+                if phase == "meta":
+                    self._json(_tab_meta(ticker, data, analysis))
+                    return
+                key = (ticker, datetime.now().strftime("%Y-%m-%d"),
+                       _digest({k: v for k, v in data.items() if k != "fetched_at"}))
+                cached = _PANE_CACHE.get(key)
+                if cached is not None:
+                    self._json(cached)
+                    return
                 # Generate charts
                 try:
                     charts = _generate_charts(data, ticker=ticker)
                 except Exception:
                     charts = {}
-                # Generate Sankey
-                sankey_html = ""
-                try:
-                    sys.path.insert(0, str(Path(__file__).parent))
-                    from income_sankey import get_period_data, build_sankey
-                    sankey_data = dict(data)
-                    sankey_data["annual"] = sankey_data.get("profit_loss", {})
-                    pl_sankey = get_period_data(sankey_data, "annual")
-                    fig = build_sankey(
-                        pl_sankey, data["company_name"], ticker,
-                        data["is_consolidated"], "",
-                        data.get("segments"), data.get("expense_breakdown"),
-                    )
-                    sankey_html = fig.to_html(full_html=False, include_plotlyjs=False)
-                except Exception:
-                    pass
+                charts_ok = _charts_key(data, ticker) in _CHART_CACHE
+                # Generate Sankey (only drawable from an annual P&L)
+                sankey_html, sankey_ok = "", True
+                if (data.get("profit_loss") or {}).get("periods"):
+                    try:
+                        sankey_html = _sankey_html(data, ticker)
+                    except Exception:
+                        sankey_ok = False
                 # Build the pane HTML
                 pane_html = _build_stock_pane(data, analysis, charts, sankey_html, active=False)
-                # Get price and grade for tab button
-                g = analysis["quality"]["grade"]
-                gc = {"A+": "#10B981", "A": "#22C55E", "B+": "#F59E0B",
-                      "B": "#F59E0B", "C": "#EF4444", "D": "#DC2626"}.get(g, "#64748B")
-                price = analysis.get("current_price", 0)
-                self._json({
-                    "ticker": ticker,
-                    "name": data.get("company_name", ticker),
-                    "price": f"₹{price:,.0f}" if price else "",
-                    "grade": g,
-                    "grade_color": gc,
-                    "pane_html": pane_html,
-                })
+                payload = {**_tab_meta(ticker, data, analysis), "pane_html": pane_html}
+                if charts_ok and sankey_ok:
+                    _cache_put(_PANE_CACHE, key, payload, _PANE_CACHE_MAX)
+                self._json(payload)
             except Exception as e:
                 self._json({"error": str(e)}, 500)
             return
@@ -3667,10 +4174,14 @@ class ScreenerHandler(BaseHTTPRequestHandler):
 def run_server(stocks, port=8765, standalone=False, no_open=False, sections=None):
     """Start the live server with pre-loaded dashboard."""
     print(f"\n{C.CYAN}{C.BOLD}🚀 Generating dashboard...{C.RESET}")
-    html = generate_dashboard(stocks, sections=sections)
+    html = generate_dashboard(stocks, sections=sections, linked_assets=True)
 
     server = ThreadingHTTPServer(("127.0.0.1", port), ScreenerHandler)
-    server.dashboard_html = html
+    # Encoded once; every GET / writes these bytes straight to the socket
+    server.dashboard_html = html.encode("utf-8")
+    # Weak: the gzip and identity bodies share this tag, so they're equivalent, not byte-identical
+    server.dashboard_etag = f'W/"{hashlib.blake2b(server.dashboard_html, digest_size=16).hexdigest()}"'
+    _gzipped(server.dashboard_html)  # compress up front so the first page load doesn't wait on it
     server.standalone = standalone
 
     print(f"\n{C.GREEN}{C.BOLD}✅ Live server running at: http://localhost:{port}{C.RESET}")
@@ -3681,6 +4192,7 @@ def run_server(stocks, port=8765, standalone=False, no_open=False, sections=None
     print(f"   • Press Ctrl+C to stop{C.RESET}\n")
 
     if not no_open:
+        import webbrowser
         threading.Timer(0.5, lambda: webbrowser.open(f"http://localhost:{port}")).start()
 
     try:
@@ -3690,6 +4202,23 @@ def run_server(stocks, port=8765, standalone=False, no_open=False, sections=None
         server.server_close()
 
 
+def _attach_visuals(s: dict):
+    """Fill in s["charts"] and s["sankey_html"] for one stock; failures leave them empty."""
+    t = s["ticker"]
+    try:
+        s["charts"] = _generate_charts(s["data"], ticker=t)
+        print(f"{C.GREEN}📊 Charts: {t}{C.RESET}")
+    except Exception as e:
+        print(f"{C.GREY}   ⚠ Charts skipped for {t}: {e}{C.RESET}")
+        s["charts"] = {}
+    try:
+        s["sankey_html"] = _sankey_html(s["data"], t)
+        print(f"{C.GREEN}📈 Sankey: {t}{C.RESET}")
+    except Exception as e:
+        print(f"{C.GREY}   ⚠ Sankey skipped for {t}: {e}{C.RESET}")
+        s["sankey_html"] = ""
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Stock Screener Dashboard — Fundamental & Technical Analysis",
@@ -3729,9 +4258,18 @@ Examples:
                         help="Accordion sections as NAME:FILE pairs, e.g. 'Nifty 50:nifty50.txt' 'My Stocks:watchlist.txt'")
     parser.add_argument("--demo", type=str, metavar="DIR", default=None,
                         help="Generate split-file demo site in DIR (index.html + panes/)")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Tickers to fetch concurrently (default: 4)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Clear the on-disk page and price caches and fetch everything fresh")
 
     args = parser.parse_args()
 
+    if args.no_cache:
+        if requests_cache is not None:
+            _SESSION.cache.clear()
+        shutil.rmtree(PRICE_CACHE_DIR, ignore_errors=True)
+
     # Build ticker list: CLI args + watchlist file (both can be combined)
     tickers = [t.upper() for t in (args.tickers or [])]
     if args.watchlist:
@@ -3762,28 +4300,20 @@ Examples:
                 sys.exit(1)
 
     # Deduplicate while preserving order
-    seen = set()
-    unique_tickers = []
-    for t in tickers:
-        if t not in seen:
-            seen.add(t)
-            unique_tickers.append(t)
-    tickers = unique_tickers
+    tickers = list(dict.fromkeys(tickers))
 
     if not tickers:
         parser.error("No tickers provided. Use positional args or --watchlist/-w file.")
 
-    # Fetch and analyze all stocks
+    # Fetch all stocks concurrently, then analyze in watchlist order
+    print(f"\n{C.CYAN}{C.BOLD}🔍 Screening {len(tickers)} stock{'s' if len(tickers) != 1 else ''}...{C.RESET}")
+    print(f"{C.GREY}   Fetching data from screener.in{C.RESET}")
+    fetched = fetch_many(tickers, consolidated=not args.standalone, max_workers=args.workers)
     stocks = []
-    for idx, ticker in enumerate(tickers):
-        if idx > 0:
-            time.sleep(1.5)  # polite delay to avoid rate-limiting
-        print(f"\n{C.CYAN}{C.BOLD}🔍 Screening {ticker} [{idx+1}/{len(tickers)}]...{C.RESET}")
-        print(f"{C.GREY}   Fetching data from screener.in{C.RESET}")
-        try:
-            data = fetch_full_company_data(ticker, consolidated=not args.standalone)
-        except Exception as e:
-            print(f"{C.RED}❌ Error fetching {ticker}: {e}{C.RESET}")
+    for ticker in tickers:
+        data = fetched[ticker]
+        if isinstance(data, Exception):
+            print(f"{C.RED}❌ Error fetching {ticker}: {data}{C.RESET}")
             continue
         print(f"{C.GREEN}✅ {data['company_name']}{C.RESET} "
               f"({'Consolidated' if data['is_consolidated'] else 'Standalone'})")
@@ -3794,32 +4324,12 @@ Examples:
         print(f"\n{C.RED}❌ No stocks could be fetched.{C.RESET}")
         sys.exit(1)
 
-    # Generate charts and Sankey for HTML/serve/demo modes
+    # Generate charts and Sankey for HTML/serve/demo modes.
+    # Each stock's price history download overlaps with the others' figure building.
     if args.html or args.serve or args.demo:
-        for s in stocks:
-            t = s["ticker"]
-            try:
-                s["charts"] = _generate_charts(s["data"], ticker=t)
-                print(f"{C.GREEN}📊 Charts: {t}{C.RESET}")
-            except Exception as e:
-                print(f"{C.GREY}   ⚠ Charts skipped for {t}: {e}{C.RESET}")
-                s["charts"] = {}
-            try:
-                sys.path.insert(0, str(Path(__file__).parent))
-                from income_sankey import get_period_data, build_sankey
-                sankey_data = dict(s["data"])
-                sankey_data["annual"] = sankey_data.get("profit_loss", {})
-                pl_sankey = get_period_data(sankey_data, "annual")
-                fig = build_sankey(
-                    pl_sankey, s["data"]["company_name"], t,
-                    s["data"]["is_consolidated"], "",
-                    s["data"].get("segments"), s["data"].get("expense_breakdown"),
-                )
-                s["sankey_html"] = fig.to_html(full_html=False, include_plotlyjs=False)
-                print(f"{C.GREEN}📈 Sankey: {t}{C.RESET}")
-            except Exception as e:
-                print(f"{C.GREY}   ⚠ Sankey skipped for {t}: {e}{C.RESET}")
-                s["sankey_html"] = ""
+        sys.path.insert(0, str(Path(__file__).parent))
+        with ThreadPoolExecutor(max_workers=max(1, min(args.workers, len(stocks)))) as ex:
+            list(ex.map(_attach_visuals, stocks))
 
     # ── DEMO SITE MODE ──
     if args.demo:
@@ -3839,9 +4349,13 @@ Examples:
         for s in stocks:
             t = s["ticker"]
             out_path = str(out_dir / f"screener_{t}.json")
-            export = {"data": s["data"], "analysis": s["analysis"]}
-            with open(out_path, "w", encoding="utf-8") as f:
-                json.dump(export, f, indent=2, ensure_ascii=False, default=str)
+            export = {"data": s["data"], "analysis": asdict(s["analysis"])}
+            if orjson:
+                with open(out_path, "wb") as f:
+                    f.write(orjson.dumps(export, default=str, option=orjson.OPT_INDENT_2))
+            else:
+                with open(out_path, "w", encoding="utf-8") as f:
+                    json.dump(export, f, indent=2, ensure_ascii=False, default=str)
             print(f"{C.GREEN}📁 JSON: {out_path}{C.RESET}")
         return
 
@@ -3858,11 +4372,11 @@ Examples:
         else:
             out_path = args.output or str(out_dir / "screener_dashboard.html")
 
-        html = generate_dashboard(stocks, sections=sections)
         with open(out_path, "w", encoding="utf-8") as f:
-            f.write(html)
+            f.writelines(_dashboard_chunks(stocks, sections=sections))
         print(f"\n{C.GREEN}✅ Dashboard saved: {out_path}{C.RESET}")
         if not args.no_open:
+            import webbrowser
             webbrowser.open(f"file:///{os.path.abspath(out_path)}")
             print(f"{C.BLUE}🌐 Opened in browser{C.RESET}")
 
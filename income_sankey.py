@@ -14,22 +14,34 @@ Usage:
 """
 
 import argparse
-import os
+import base64
+import hashlib
+import pickle
 import re
 import sys
-import webbrowser
-from datetime import datetime
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from functools import lru_cache
 from pathlib import Path
 
+import lxml.html
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-try:
-    import plotly.graph_objects as go
-    from plotly.subplots import make_subplots
-except ImportError:
-    print("ERROR: plotly not installed. Run: pip install plotly kaleido")
-    sys.exit(1)
+
+def _require_plotly():
+    """
+    plotly.graph_objects, imported on first use so callers that only fetch/parse
+    (and `--help`) never load plotly's validators.
+    """
+    try:
+        import plotly.graph_objects as go
+    except ImportError:
+        print("ERROR: plotly not installed. Run: pip install plotly kaleido")
+        sys.exit(1)
+    return go
 
 
 # ─── Constants ───────────────────────────────────────────────────────────────
@@ -43,6 +55,26 @@ HEADERS = {
     )
 }
 
+# One keep-alive pool for a run's page, segment and schedule calls; retries transient 5xx
+_SESSION = requests.Session()
+_SESSION.headers.update(HEADERS)
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4, pool_maxsize=8,
+    max_retries=Retry(total=2, backoff_factor=0.3, raise_on_status=False,
+                      status_forcelist=[502, 503, 504]),
+))
+_XHR = {"X-Requested-With": "XMLHttpRequest"}
+
+# Parsed company data is pickled here and reused for the rest of the day
+DATA_CACHE_DIR = Path(__file__).parent / ".sankey_cache"
+
+
+_RE_PL_SECTION = re.compile(rb'(?i)\bid\s*=\s*["\']?profit-loss(?![\w-])')
+_RE_COMPANY_ID = re.compile(rb'/api/company/(\d+)/')
+_RE_NON_WORD = re.compile(r'[^\w]')
+# A comma after every digit followed by 3, 5, 7, ... digits: last group of 3, then pairs
+_RE_INDIAN_GROUPS = re.compile(r'(\d)(?=(?:\d\d)+\d$)')
+
 # Color palette inspired by "How They Make Money" / App Economy Insights
 COLORS = {
     "revenue":      "#2563EB",   # Blue
@@ -60,6 +92,9 @@ COLORS = {
 
 LINK_OPACITY = 0.35
 
+# Expense categories below this share of total expenses are merged into "Other Cost"
+EXPENSE_MIN_SHARE = 0.02
+
 
 # ─── Data Fetching ───────────────────────────────────────────────────────────
 
@@ -74,72 +109,105 @@ def parse_number(text: str) -> float:
         return 0.0
 
 
-def fetch_company_data(ticker: str, consolidated: bool = True) -> dict:
+def _cache_path(ticker: str, consolidated: bool) -> Path:
+    return DATA_CACHE_DIR / f"{_RE_NON_WORD.sub('_', ticker.upper())}_{int(consolidated)}.pkl"
+
+
+def fetch_company_data(ticker: str, consolidated: bool = True,
+                       use_cache: bool = True) -> dict:
     """
     Fetch company financial data from screener.in.
     Returns dict with company info and P&L data for all available periods.
+    Results are cached in DATA_CACHE_DIR until the end of the day unless use_cache is False.
     """
+    path = _cache_path(ticker, consolidated)
+    today = date.today().isoformat()
+    if use_cache:
+        try:
+            with open(path, "rb") as f:
+                day, data = pickle.load(f)
+            if day == today:
+                return data
+        except Exception:
+            pass  # missing, stale format or unreadable — refetch
+
+    data = _fetch_company_data(ticker, consolidated)
+    try:
+        DATA_CACHE_DIR.mkdir(exist_ok=True)
+        with open(path, "wb") as f:
+            pickle.dump((today, data), f, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        pass
+    return data
+
+
+def _fetch_company_data(ticker: str, consolidated: bool) -> dict:
+    """Download and parse the screener.in page plus the segment/schedule APIs."""
     suffix = "consolidated/" if consolidated else ""
     url = f"{SCREENER_BASE}/{ticker.upper()}/{suffix}"
 
-    resp = requests.get(url, headers=HEADERS, timeout=30)
+    resp = _SESSION.get(url, timeout=(5, 30))
     if resp.status_code == 404:
         # Try without consolidated
         url = f"{SCREENER_BASE}/{ticker.upper()}/"
-        resp = requests.get(url, headers=HEADERS, timeout=30)
+        resp = _SESSION.get(url, timeout=(5, 30))
     
     if resp.status_code != 200:
         raise ValueError(f"Failed to fetch data for {ticker}: HTTP {resp.status_code}")
 
-    soup = BeautifulSoup(resp.text, "html.parser")
-
     # ── If consolidated page has no P&L data, fall back to standalone ──
+    # A page without the section at all is caught by a byte scan, before any parsing
+    tree = annual_data = None
     if consolidated and suffix:
-        test_pl = _parse_pl_section(soup, "profit-loss")
-        if not test_pl.get("periods"):
+        if _RE_PL_SECTION.search(resp.content):
+            tree = _parse_html(resp)
+            annual_data = _parse_pl_section(tree, "profit-loss")
+        if not (annual_data or {}).get("periods"):
             url = f"{SCREENER_BASE}/{ticker.upper()}/"
-            resp = requests.get(url, headers=HEADERS, timeout=30)
-            if resp.status_code == 200:
-                soup = BeautifulSoup(resp.text, "html.parser")
+            fallback = _SESSION.get(url, timeout=(5, 30))
+            if fallback.status_code == 200:
+                resp, tree = fallback, None
+    if tree is None:
+        tree = _parse_html(resp)
+        annual_data = _parse_pl_section(tree, "profit-loss")
 
     # ── Company name ──
-    h1 = soup.find("h1")
-    company_name = h1.get_text(strip=True) if h1 else ticker.upper()
+    h1 = _first(tree, "//h1")
+    company_name = _text(h1) if h1 is not None else ticker.upper()
 
     # ── Check if consolidated data exists ──
     is_consolidated = "consolidated" in resp.url
 
-    # ── Parse Annual P&L ──
-    annual_data = _parse_pl_section(soup, "profit-loss")
-
     # ── Parse Quarterly P&L ──
-    quarterly_data = _parse_pl_section(soup, "quarters")
+    quarterly_data = _parse_pl_section(tree, "quarters")
 
     # ── Try to get sector info ──
     sector = ""
-    sector_links = soup.select("a[href*='/market/']")
+    sector_links = tree.xpath("//a[contains(@href, '/market/')]")
     if sector_links:
-        sector = sector_links[-1].get_text(strip=True)
+        sector = _text(sector_links[-1])
 
     # ── Get key ratios from top card ──
     ratios = {}
-    top_ul = soup.select("#top-ratios li")
+    top_ul = tree.xpath("//*[@id='top-ratios']//li")
     for li in top_ul:
-        name_el = li.find("span", class_="name")
-        val_el = li.find("span", class_="number")
-        if name_el and val_el:
-            ratios[name_el.get_text(strip=True)] = val_el.get_text(strip=True)
+        name_el = _first(li, f".//span[{_has_class('name')}]")
+        val_el = _first(li, f".//span[{_has_class('number')}]")
+        if name_el is not None and val_el is not None:
+            ratios[_text(name_el)] = _text(val_el)
 
     # ── Get company ID for segment/schedule API calls ──
-    company_id = extract_company_id(resp.text)
+    company_id = extract_company_id(resp.content)
 
-    # ── Fetch segment names and expense breakdown ──
+    # ── Fetch segment names and expense breakdown (independent calls, run together) ──
     segments = []
     expense_breakdown = {}
     if company_id:
-        segments = fetch_segments(company_id, "profit-loss", is_consolidated)
-        expense_breakdown = fetch_expense_breakdown(
-            company_id, "profit-loss", is_consolidated)
+        with ThreadPoolExecutor(max_workers=2) as ex:
+            seg_f = ex.submit(fetch_segments, company_id, "profit-loss", is_consolidated)
+            exp_f = ex.submit(fetch_expense_breakdown,
+                              company_id, "profit-loss", is_consolidated)
+            segments, expense_breakdown = seg_f.result(), exp_f.result()
 
     return {
         "ticker": ticker.upper(),
@@ -156,41 +224,57 @@ def fetch_company_data(ticker: str, consolidated: bool = True) -> dict:
     }
 
 
-def _parse_pl_section(soup: BeautifulSoup, section_id: str) -> dict:
-    """Parse a P&L table section (annual or quarterly)."""
-    section = soup.find("section", id=section_id)
-    if not section:
-        return {}
+def _parse_html(resp: requests.Response) -> lxml.html.HtmlElement:
+    """Build an lxml tree straight from the response bytes."""
+    parser = lxml.html.HTMLParser(encoding=resp.encoding or "utf-8")
+    return lxml.html.fromstring(resp.content, parser=parser)
+
+
+def _has_class(name: str) -> str:
+    """XPath predicate matching an element whose class list contains `name`."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def _text(el) -> str:
+    """Stripped text of an element (same result as BeautifulSoup's get_text(strip=True))."""
+    return "".join(t.strip() for t in el.xpath(".//text()"))
+
+
+def _first(el, path: str):
+    """First XPath match under `el`, or None."""
+    found = el.xpath(path)
+    return found[0] if found else None
 
-    table = section.find("table")
-    if not table:
+
+def _parse_pl_section(tree: lxml.html.HtmlElement, section_id: str) -> dict:
+    """Parse a P&L table section (annual or quarterly)."""
+    table = _first(tree, f"//section[@id='{section_id}']//table")
+    if table is None:
         return {}
 
-    rows = table.find_all("tr")
+    rows = table.xpath(".//tr")
     if not rows:
         return {}
 
     # ── Header row → period labels ──
-    header_cells = rows[0].find_all(["th", "td"])
+    header_cells = rows[0].xpath(".//th | .//td")
     periods = []
     for cell in header_cells[1:]:  # Skip first (label) column
-        text = cell.get_text(strip=True)
+        text = _text(cell)
         if text:
             periods.append(text)
 
     # ── Data rows ──
     result = {"periods": periods, "rows": {}}
     for row in rows[1:]:
-        cells = row.find_all(["th", "td"])
+        cells = row.xpath(".//th | .//td")
         if not cells:
             continue
-        label = cells[0].get_text(strip=True).rstrip("+").strip()
+        label = _text(cells[0]).rstrip("+").strip()
         if not label:
             continue
 
-        values = []
-        for cell in cells[1:]:
-            values.append(cell.get_text(strip=True))
+        values = [_text(cell) for cell in cells[1:]]
 
         result["rows"][label] = values
 
@@ -207,22 +291,18 @@ def fetch_segments(company_id: str, section: str = "profit-loss",
     url = (f"https://www.screener.in/api/segments/{company_id}"
            f"/{section}/1/{params}")
     try:
-        resp = requests.get(url, headers={**HEADERS,
-                            "X-Requested-With": "XMLHttpRequest"}, timeout=10)
+        resp = _SESSION.get(url, headers=_XHR, timeout=(5, 10))
         if resp.status_code != 200:
             return []
-        soup = BeautifulSoup(resp.text, "html.parser")
-        sales_body = soup.find("tbody", attrs={"data-segment-line": "Sales"})
-        if not sales_body:
-            return []
-        inner_table = sales_body.find("table")
-        if not inner_table:
+        inner_table = _first(_parse_html(resp),
+                             "//tbody[@data-segment-line='Sales']//table")
+        if inner_table is None:
             return []
         segments = []
         skip = {"Sales", "Less: Intersegment", "Unallocated",
                 "Reconciling Items", "Reconciline Items"}
-        for tr in inner_table.find_all("tr"):
-            cells = [td.get_text(strip=True) for td in tr.find_all("td")]
+        for tr in inner_table.xpath(".//tr"):
+            cells = [_text(td) for td in tr.xpath(".//td")]
             if cells and cells[0] and cells[0] not in skip:
                 segments.append(cells[0])
         return segments
@@ -242,8 +322,7 @@ def fetch_expense_breakdown(company_id: str, section: str = "profit-loss",
         params += "&consolidated"
     url = f"https://www.screener.in/api/company/{company_id}/schedules/{params}"
     try:
-        resp = requests.get(url, headers={**HEADERS,
-                            "X-Requested-With": "XMLHttpRequest"}, timeout=10)
+        resp = _SESSION.get(url, headers=_XHR, timeout=(5, 10))
         if resp.status_code != 200:
             return {}
         import json
@@ -266,10 +345,10 @@ def fetch_expense_breakdown(company_id: str, section: str = "profit-loss",
         return {}
 
 
-def extract_company_id(html_text: str) -> str:
-    """Extract company ID from screener.in page HTML."""
-    m = re.search(r'/api/company/(\d+)/', html_text)
-    return m.group(1) if m else ""
+def extract_company_id(html: bytes) -> str:
+    """Extract company ID from screener.in page HTML (raw bytes; no need to decode the page)."""
+    m = _RE_COMPANY_ID.search(html)
+    return m.group(1).decode() if m else ""
 
 
 def get_period_data(data: dict, period_type: str = "annual",
@@ -307,25 +386,30 @@ def get_period_data(data: dict, period_type: str = "annual",
     chosen_period = periods[idx]
 
     # ── Extract values ──
+    # Row labels lower-cased and this column's cells parsed once; rows without a
+    # value for the column can't match
+    lowered = [(k.lower(), vals) for k, vals in rows.items()]
+    in_period = [(lk, parse_number(vals[idx])) for lk, vals in lowered if idx < len(vals)]
+    exact = {}
+    for lk, value in in_period:
+        exact.setdefault(lk.strip(), value)
+
+    found = {}
+
     def get_val(label: str) -> float:
-        for key, vals in rows.items():
-            if label.lower() in key.lower():
-                if idx < len(vals):
-                    return parse_number(vals[idx])
-        return 0.0
+        label = label.lower()
+        if label not in found:
+            found[label] = next((value for lk, value in in_period if label in lk), 0.0)
+        return found[label]
 
     def get_exact(label: str) -> float:
         """Exact match (for 'Interest' vs 'Other Interest')."""
-        for key, vals in rows.items():
-            if key.strip().lower() == label.lower():
-                if idx < len(vals):
-                    return parse_number(vals[idx])
-        return 0.0
+        return exact.get(label.lower(), 0.0)
 
     # ── Detect if this is a bank/NBFC (has "Revenue" but no "Sales") ──
-    has_sales = any("sales" in k.lower() for k in rows.keys())
-    has_revenue = any("revenue" in k.lower() and "sales" not in k.lower() for k in rows.keys())
-    has_financing = any("financing" in k.lower() for k in rows.keys())
+    has_sales = any("sales" in lk for lk, _ in lowered)
+    has_revenue = any("revenue" in lk and "sales" not in lk for lk, _ in lowered)
+    has_financing = any("financing" in lk for lk, _ in lowered)
     is_bank = (has_revenue and not has_sales) or has_financing
 
     if is_bank:
@@ -407,30 +491,24 @@ def get_period_data(data: dict, period_type: str = "annual",
     ebitda_margin = opm
     
     # Try to get previous period for YoY comparison
-    prev_sales = 0
-    prev_net_profit = 0
+    # One pass picks the first row containing each label
+    search_key = "revenue" if is_bank else "sales"
+    prev = {}
     if idx > 0:
-        search_key = "revenue" if is_bank else "sales"
-        for key, vals in rows.items():
-            if search_key in key.lower():
-                if idx - 1 < len(vals):
-                    prev_sales = parse_number(vals[idx - 1])
-                break
-        for key, vals in rows.items():
-            if "net profit" in key.lower():
-                if idx - 1 < len(vals):
-                    prev_net_profit = parse_number(vals[idx - 1])
+        targets = (search_key, "net profit", "other income")
+        for lk, vals in lowered:
+            for t in targets:
+                if t not in prev and t in lk:
+                    prev[t] = parse_number(vals[idx - 1]) if idx - 1 < len(vals) else 0
+            if len(prev) == len(targets):
                 break
+    prev_sales = prev.get(search_key, 0)
+    prev_net_profit = prev.get("net profit", 0)
 
     # For banks, use total_income for YoY if available
     if is_bank and prev_sales > 0:
         # prev_sales is just revenue; add prev other_income for fair comparison
-        prev_oi = 0
-        for key, vals in rows.items():
-            if "other income" in key.lower():
-                if idx - 1 < len(vals):
-                    prev_oi = parse_number(vals[idx - 1])
-                break
+        prev_oi = prev.get("other income", 0)
         prev_total = prev_sales + prev_oi
         yoy_sales = ((sales / prev_total - 1) * 100) if prev_total > 0 else 0
     else:
@@ -470,25 +548,10 @@ def get_period_data(data: dict, period_type: str = "annual",
 
 def fmt_indian(value: float) -> str:
     """Format number with Indian comma system (12,34,567)."""
-    s = f"{int(abs(value)):,}"
-    # Convert Western commas to Indian: 1,234,567 → 12,34,567
-    parts = s.split(",")
-    if len(parts) <= 2:
-        return s
-    # Last group stays 3 digits, rest become 2-digit groups
-    last = parts[-1]  # "567"
-    middle = ",".join(parts[:-1])  # "1,234"
-    # Re-split middle into 2-digit groups from right
-    mid_num = middle.replace(",", "")
-    indian_parts = []
-    while len(mid_num) > 2:
-        indian_parts.insert(0, mid_num[-2:])
-        mid_num = mid_num[:-2]
-    if mid_num:
-        indian_parts.insert(0, mid_num)
-    return ",".join(indian_parts) + "," + last
+    return _RE_INDIAN_GROUPS.sub(r"\1,", str(int(abs(value))))
 
 
+@lru_cache(maxsize=256)
 def fmt_cr(value: float) -> str:
     """Format value in Crores with Indian notation."""
     abs_val = abs(value)
@@ -514,6 +577,7 @@ def fmt_pct(value: float) -> str:
     return f"{sign}{value:.0f}%"
 
 
+@lru_cache(maxsize=256)
 def fmt_yoy(value: float) -> str:
     """Format YoY change."""
     if value == 0:
@@ -524,9 +588,42 @@ def fmt_yoy(value: float) -> str:
 
 # ─── Sankey Diagram Builder ─────────────────────────────────────────────────
 
+@lru_cache(maxsize=256)
+def _rgba(hex_color: str, alpha: float = LINK_OPACITY) -> str:
+    """'#2563EB' → 'rgba(37,99,235,0.35)' (link colors repeat, so each is converted once)."""
+    r, g, b = bytes.fromhex(hex_color[1:7])
+    return f"rgba({r},{g},{b},{alpha})"
+
+
+def _collapse_small_expenses(cats: dict, max_nodes: int = None) -> dict:
+    """
+    Merge thin expense categories into "Other Cost" so the diagram isn't cluttered
+    with hairline links: anything under EXPENSE_MIN_SHARE of the total (when at
+    least two are that small), then the smallest beyond max_nodes (>= 2, counting Other).
+    """
+    total = sum(cats.values())
+    if total <= 0:
+        return cats
+    ranked = sorted(cats.items(), key=lambda x: -x[1])
+    small = [k for k, v in ranked if v / total < EXPENSE_MIN_SHARE and k != "Other Cost"]
+    if len(small) < 2:
+        small = []
+    if max_nodes is not None and max_nodes < 2:
+        raise ValueError(f"max_nodes must be at least 2, got {max_nodes}")
+    if max_nodes:
+        kept = [k for k, _ in ranked if k not in small and k != "Other Cost"]
+        small += kept[max_nodes - 1:]
+    if not small:
+        return cats
+    merged = {k: v for k, v in cats.items() if k not in small}
+    merged["Other Cost"] = merged.get("Other Cost", 0) + sum(cats[k] for k in small)
+    return merged
+
+
 def build_sankey(pl: dict, company_name: str, ticker: str, 
                  is_consolidated: bool, sector: str = "",
-                 segments: list = None, expense_breakdown: dict = None) -> go.Figure:
+                 segments: list = None, expense_breakdown: dict = None,
+                 max_expense_nodes: int = None) -> "go.Figure":
     """
     Build a Sankey diagram from P&L data.
     Handles both standard companies and banks/NBFCs.
@@ -538,13 +635,15 @@ def build_sankey(pl: dict, company_name: str, ticker: str,
     else:
         return _build_standard_sankey(pl, company_name, ticker, is_consolidated,
                                      segments=segments or [],
-                                     expense_breakdown=expense_breakdown or {})
+                                     expense_breakdown=expense_breakdown or {},
+                                     max_expense_nodes=max_expense_nodes)
 
 
 def _build_standard_sankey(pl: dict, company_name: str, ticker: str,
                            is_consolidated: bool,
                            segments: list = None,
-                           expense_breakdown: dict = None) -> go.Figure:
+                           expense_breakdown: dict = None,
+                           max_expense_nodes: int = None) -> "go.Figure":
     """
     Standard company Sankey — strict vertical zoning to prevent overlap.
 
@@ -579,6 +678,7 @@ def _build_standard_sankey(pl: dict, company_name: str, ticker: str,
         if computed_total > 0 and abs(computed_total - expenses) > 1:
             scale = expenses / computed_total
             exp_cats = {k: v * scale for k, v in exp_cats.items()}
+        exp_cats = _collapse_small_expenses(exp_cats, max_expense_nodes)
 
     has_segments = len(segments) >= 2
     n_seg = len(segments) if has_segments else 0
@@ -621,17 +721,17 @@ def _build_standard_sankey(pl: dict, company_name: str, ticker: str,
     Y_EXP_BOT = 0.97    # Expense breakdown ends
 
     # ── Node helpers ──
-    nodes = []
+    # Trace columns are filled in place and handed straight to go.Sankey
+    node = {"label": [], "color": [], "x": [], "y": []}
     node_idx = {}
 
     def add_node(name, color, x, y, label=None):
-        idx = len(nodes)
+        idx = len(node["label"])
         node_idx[name] = idx
-        nodes.append({
-            "label": label or name, "color": color,
-            "x": max(0.001, min(0.999, x)),
-            "y": max(0.001, min(0.999, y)),
-        })
+        node["label"].append(label or name)
+        node["color"].append(color)
+        node["x"].append(max(0.001, min(0.999, x)))
+        node["y"].append(max(0.001, min(0.999, y)))
         return idx
 
     has_other_income = other_income > 0
@@ -721,18 +821,15 @@ def _build_standard_sankey(pl: dict, company_name: str, ticker: str,
                  f"Minority\nInterest\n({fmt_cr(minority)})")
 
     # ═══════ LINKS ═══════
-    links = []
+    link = {"source": [], "target": [], "value": [], "color": []}
 
     def add_link(src, tgt, value, color_key=None, color_hex=None):
         if value <= 0 or src not in node_idx or tgt not in node_idx:
             return
-        hex_color = color_hex or COLORS.get(color_key, "#888888")
-        r, g, b = int(hex_color[1:3], 16), int(hex_color[3:5], 16), int(hex_color[5:7], 16)
-        links.append({
-            "source": node_idx[src], "target": node_idx[tgt],
-            "value": value,
-            "color": f"rgba({r},{g},{b},{LINK_OPACITY})",
-        })
+        link["source"].append(node_idx[src])
+        link["target"].append(node_idx[tgt])
+        link["value"].append(value)
+        link["color"].append(_rgba(color_hex or COLORS.get(color_key, "#888888")))
 
     # Segments → Revenue
     if has_segments:
@@ -773,36 +870,35 @@ def _build_standard_sankey(pl: dict, company_name: str, ticker: str,
         add_link("PBT", "Minority", minority, "minority")
 
     # ═══════ FIGURE ═══════
-    fig = go.Figure(data=[go.Sankey(
+    go = _require_plotly()
+    return go.Figure(data=[go.Sankey(
         arrangement="snap",
         node=dict(
             pad=28, thickness=28,
             line=dict(color="#E5E7EB", width=1),
-            label=[n["label"] for n in nodes],
-            color=[n["color"] for n in nodes],
-            x=[n["x"] for n in nodes],
-            y=[n["y"] for n in nodes],
+            **node,
             hovertemplate="%{label}<extra></extra>",
         ),
         link=dict(
-            source=[l["source"] for l in links],
-            target=[l["target"] for l in links],
-            value=[l["value"] for l in links],
-            color=[l["color"] for l in links],
+            **link,
             hovertemplate=(
                 "%{source.label} → %{target.label}<br>"
                 "₹%{value:,.0f} Cr<extra></extra>"
             ),
         ),
         textfont=dict(size=12, color="#1F2937", family="Segoe UI, Arial"),
-    )])
+        _validate=False,
+    )], layout=_sankey_layout(pl, company_name, ticker, is_consolidated, sales),
+        _validate=False)
 
-    return _apply_layout(fig, pl, company_name, ticker, is_consolidated, sales)
 
-
-def _apply_layout(fig: go.Figure, pl: dict, company_name: str, ticker: str,
-                  is_consolidated: bool, sales: float) -> go.Figure:
-    """Apply shared layout to the Sankey figure."""
+def _sankey_layout(pl: dict, company_name: str, ticker: str,
+                   is_consolidated: bool, sales: float) -> dict:
+    """
+    Shared layout for the Sankey figure. The builders construct the trace and figure
+    with validation off (re-validating these fixed dicts was most of the build time),
+    so keys are spelled out in full rather than as magic-underscore shorthands.
+    """
     period_label = pl["period"]
     cons_label = "Consolidated" if is_consolidated else "Standalone"
     
@@ -818,7 +914,7 @@ def _apply_layout(fig: go.Figure, pl: dict, company_name: str, ticker: str,
     rev_label = "Total Income" if pl.get("is_bank") else "Revenue"
     margin_label = "Op. Margin" if pl.get("is_bank") else "EBITDA Margin"
 
-    fig.update_layout(
+    return dict(
         title=dict(
             text=(
                 f"<b style='font-size:30px'>{company_name}</b> "
@@ -863,11 +959,10 @@ def _apply_layout(fig: go.Figure, pl: dict, company_name: str, ticker: str,
             ),
         ],
     )
-    return fig
 
 
 def _build_bank_sankey(pl: dict, company_name: str, ticker: str,
-                       is_consolidated: bool) -> go.Figure:
+                       is_consolidated: bool) -> "go.Figure":
     """
     Bank/NBFC Sankey diagram.
     
@@ -892,35 +987,26 @@ def _build_bank_sankey(pl: dict, company_name: str, ticker: str,
     # NII + Other Income - Expenses = Pre-provision profit
     pre_provision = nii + other_income - expenses
     
-    nodes = []
+    node = {"label": [], "color": [], "x": [], "y": []}
     node_idx = {}
-    links = []
+    link = {"source": [], "target": [], "value": [], "color": []}
     
     def add_node(name, color, x, y, label=None):
-        idx = len(nodes)
+        idx = len(node["label"])
         node_idx[name] = idx
-        nodes.append({
-            "label": label or name,
-            "color": color,
-            "x": max(0.001, min(0.999, x)),
-            "y": max(0.001, min(0.999, y)),
-        })
+        node["label"].append(label or name)
+        node["color"].append(color)
+        node["x"].append(max(0.001, min(0.999, x)))
+        node["y"].append(max(0.001, min(0.999, y)))
         return idx
 
     def add_link(src, tgt, value, color_key):
         if value <= 0 or src not in node_idx or tgt not in node_idx:
             return
-        hex_color = COLORS.get(color_key, "#888888")
-        r = int(hex_color[1:3], 16)
-        g = int(hex_color[3:5], 16)
-        b = int(hex_color[5:7], 16)
-        rgba = f"rgba({r},{g},{b},{LINK_OPACITY})"
-        links.append({
-            "source": node_idx[src],
-            "target": node_idx[tgt],
-            "value": value,
-            "color": rgba,
-        })
+        link["source"].append(node_idx[src])
+        link["target"].append(node_idx[tgt])
+        link["value"].append(value)
+        link["color"].append(_rgba(COLORS.get(color_key, "#888888")))
 
     # ── Nodes ──
     yoy_str = f"\n{fmt_yoy(pl['yoy_sales'])}" if pl['yoy_sales'] else ""
@@ -992,37 +1078,75 @@ def _build_bank_sankey(pl: dict, company_name: str, ticker: str,
         add_link("PBT", "Minority", minority, "minority")
 
     # ── Create figure ──
-    fig = go.Figure(data=[go.Sankey(
+    go = _require_plotly()
+    return go.Figure(data=[go.Sankey(
         arrangement="snap",
         node=dict(
             pad=30, thickness=30,
             line=dict(color="#E5E7EB", width=1),
-            label=[n["label"] for n in nodes],
-            color=[n["color"] for n in nodes],
-            x=[n["x"] for n in nodes],
-            y=[n["y"] for n in nodes],
+            **node,
             hovertemplate="%{label}<extra></extra>",
         ),
         link=dict(
-            source=[l["source"] for l in links],
-            target=[l["target"] for l in links],
-            value=[l["value"] for l in links],
-            color=[l["color"] for l in links],
+            **link,
             hovertemplate="%{source.label} → %{target.label}<br>₹%{value:,.0f} Cr<extra></extra>",
         ),
         textfont=dict(size=12, color="#1F2937", family="Segoe UI, Arial"),
-    )])
-
-    return _apply_layout(fig, pl, company_name, ticker, is_consolidated, total_income)
+        _validate=False,
+    )], layout=_sankey_layout(pl, company_name, ticker, is_consolidated, total_income),
+        _validate=False)
 
 
 # ─── HTML Wrapper (for richer output) ────────────────────────────────────────
 
-def create_html_report(fig: go.Figure, pl: dict, company_name: str,
-                       ticker: str, output_path: str) -> str:
-    """Create a standalone HTML with the Sankey chart + summary table."""
+def _plotly_src(output_path: str, plotlyjs: str) -> str:
+    """
+    plotly.js URL for a report: the CDN, or ("directory") a versioned copy written
+    once beside the report so every report in that folder shares one cached file.
+    """
+    from plotly.offline import get_plotlyjs, get_plotlyjs_version
+    name = f"plotly-{get_plotlyjs_version()}.min.js"
+    if plotlyjs != "directory":
+        return f"https://cdn.plot.ly/{name}"
+    js_path = Path(output_path).resolve().parent / name
+    if not js_path.exists():
+        js_path.write_text(get_plotlyjs(), encoding="utf-8")
+    return name
+
+
+@lru_cache(maxsize=1)
+def _plotly_sri() -> str:
+    """Subresource Integrity hash of the bundled plotly.js, as to_html computes it for the CDN tag."""
+    from plotly.offline import get_plotlyjs
+    digest = hashlib.sha256(get_plotlyjs().encode("utf-8")).digest()
+    return "sha256-" + base64.b64encode(digest).decode("ascii")
+
+
+def _figure_html(fig: "go.Figure", plotly_src: str) -> str:
+    """
+    plotly.js tag, chart div and Plotly.newPlot call — what
+    fig.to_html(include_plotlyjs=...) emits, minus its per-call templating.
+    """
+    div_id = uuid.uuid4().hex
+    height, width = fig.layout.height, fig.layout.width
+    outer = (f"height:{f'{height}px' if height else '100%'}; "
+             f"width:{f'{width}px' if width else '100%'};")
+    sri = (f' integrity="{_plotly_sri()}" crossorigin="anonymous"'
+           if plotly_src.startswith("https://") else "")
+    return (f'<script charset="utf-8" src="{plotly_src}"{sri}>'
+            f'</script><div style="{outer}"><div id="{div_id}" class="plotly-graph-div" '
+            f'style="height:100%; width:100%;"></div><script>(function(f){{Plotly.newPlot("{div_id}", '
+            f'f.data, f.layout, {{"responsive": true}});}})({fig.to_json(validate=False)});</script></div>')
+
+
+def create_html_report(fig: "go.Figure", pl: dict, company_name: str,
+                       ticker: str, output_path: str, plotlyjs: str = "cdn") -> str:
+    """
+    Create a standalone HTML with the Sankey chart + summary table.
+    plotlyjs is "cdn" or "directory" (see _plotly_src).
+    """
     
-    sankey_html = fig.to_html(full_html=False, include_plotlyjs="cdn")
+    sankey_html = _figure_html(fig, _plotly_src(output_path, plotlyjs))
     
     html = f"""<!DOCTYPE html>
 <html lang="en">
@@ -1114,6 +1238,10 @@ def create_html_report(fig: go.Figure, pl: dict, company_name: str,
             border-radius: 4px;
             min-width: 4px;
         }}
+        .wf-label {{ flex: 1; }}
+        .wf-value {{ width: 100px; text-align: right; }}
+        .wf-pct {{ width: 70px; text-align: right; color: #6B7280; font-size: 12px; }}
+        .wf-bar-wrap {{ width: 120px; padding-left: 12px; }}
     </style>
 </head>
 <body>
@@ -1195,20 +1323,16 @@ def _build_waterfall_html(pl: dict) -> str:
         bar_width = min(pct_of_rev * 2, 100)  # Scale for visual
         sign = "" if value >= 0 else "-"
         css_class = "waterfall-row total" if is_total else "waterfall-row"
-        bar_color = "#16A34A" if value >= 0 else "#DC2626"
+        # .green / .red text matches the bar colour
+        tone, bar_color = ("green", "#16A34A") if value >= 0 else ("red", "#DC2626")
         
         html_parts.append(f"""
             <div class="{css_class}">
-                <span style="flex:1">{label}</span>
-                <span style="width:100px; text-align:right; color:{bar_color}">
-                    {sign}₹{abs_val:,.0f}
-                </span>
-                <span style="width:70px; text-align:right; color:#6B7280; font-size:12px">
-                    {pct_of_rev:.1f}%
-                </span>
-                <span style="width:120px; padding-left:12px">
-                    <div class="waterfall-bar" 
-                         style="width:{bar_width}%; background:{bar_color}"></div>
+                <span class="wf-label">{label}</span>
+                <span class="wf-value {tone}">{sign}₹{abs_val:,.0f}</span>
+                <span class="wf-pct">{pct_of_rev:.1f}%</span>
+                <span class="wf-bar-wrap">
+                    <div class="waterfall-bar" style="width:{bar_width}%; background:{bar_color}"></div>
                 </span>
             </div>""")
 
@@ -1217,7 +1341,17 @@ def _build_waterfall_html(pl: dict) -> str:
 
 # ─── Main CLI ────────────────────────────────────────────────────────────────
 
-def main():
+def _node_cap(value: str) -> int:
+    """argparse type for --max-expense-nodes: one slot is always Other Cost, so N must be >= 2."""
+    n = int(value)
+    if n < 2:
+        raise argparse.ArgumentTypeError(f"must be at least 2 (got {n})")
+    return n
+
+
+@lru_cache(maxsize=1)
+def _build_parser() -> argparse.ArgumentParser:
+    """The CLI parser, built once so in-process callers of main() reuse it."""
     parser = argparse.ArgumentParser(
         description="Generate Income Statement Sankey diagrams for Indian companies",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -1246,13 +1380,27 @@ Examples:
                         help="Output file path (default: auto-generated)")
     parser.add_argument("--no-open", action="store_true",
                         help="Don't auto-open in browser")
+    parser.add_argument("--max-expense-nodes", type=_node_cap, default=None, metavar="N",
+                        help="Show at most N expense categories, merging the rest into Other")
+    parser.add_argument("--plotlyjs", choices=["cdn", "directory"], default="cdn",
+                        help="Load plotly.js from the CDN (default) or from one shared "
+                             "copy written next to the report")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Ignore today's cached data and fetch fresh from screener.in")
 
-    args = parser.parse_args()
+    return parser
+
+
+def main():
+    args = _build_parser().parse_args()
+    if not args.list:
+        _require_plotly()  # fail before the fetch; --list never draws
     ticker = args.ticker.upper()
 
     print(f"📊 Fetching data for {ticker} from screener.in...")
     try:
-        data = fetch_company_data(ticker, consolidated=not args.standalone)
+        data = fetch_company_data(ticker, consolidated=not args.standalone,
+                                  use_cache=not args.no_cache)
     except Exception as e:
         print(f"❌ Error: {e}")
         sys.exit(1)
@@ -1284,27 +1432,37 @@ Examples:
     # ── Build Sankey ──
     fig = build_sankey(pl, company, ticker, data["is_consolidated"], data["sector"],
                        segments=data.get("segments"),
-                       expense_breakdown=data.get("expense_breakdown"))
+                       expense_breakdown=data.get("expense_breakdown"),
+                       max_expense_nodes=args.max_expense_nodes)
 
     # ── Output ──
     if args.output:
         out_path = args.output
     else:
-        safe_name = re.sub(r'[^\w]', '_', ticker)
-        period_safe = re.sub(r'[^\w]', '_', pl['period'])
+        safe_name = _RE_NON_WORD.sub('_', ticker)
+        period_safe = _RE_NON_WORD.sub('_', pl['period'])
         out_dir = Path(__file__).parent / "reports"
         out_dir.mkdir(exist_ok=True)
         out_path = str(out_dir / f"sankey_{safe_name}_{period_safe}.html")
 
+    # PNG export starts first: Kaleido's browser start-up takes seconds, so let it
+    # run while the HTML report is written (on its own copy of the figure)
+    png_future = None
+    if args.png:
+        import plotly.io as pio
+        png_path = out_path.replace(".html", ".png")
+        png_pool = ThreadPoolExecutor(max_workers=1)
+        png_future = png_pool.submit(pio.write_image, fig.to_dict(), png_path,
+                                     width=1400, height=700, scale=2)
+        png_pool.shutdown(wait=False)
+
     # Create rich HTML report
-    create_html_report(fig, pl, company, ticker, out_path)
+    create_html_report(fig, pl, company, ticker, out_path, args.plotlyjs)
     print(f"✅ Report saved: {out_path}")
 
-    # PNG export
-    if args.png:
-        png_path = out_path.replace(".html", ".png")
+    if png_future is not None:
         try:
-            fig.write_image(png_path, width=1400, height=700, scale=2)
+            png_future.result()
             print(f"📸 PNG saved: {png_path}")
         except Exception as e:
             print(f"⚠️  PNG export failed: {e}")
@@ -1312,7 +1470,8 @@ Examples:
 
     # Open in browser
     if not args.no_open:
-        webbrowser.open(f"file:///{os.path.abspath(out_path)}")
+        import webbrowser
+        webbrowser.open(Path(out_path).resolve().as_uri())
         print("🌐 Opened in browser")
 
 